@@ -0,0 +1,242 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Awaitable, Callable
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:  # Optional; falls back to a characters-per-token estimate
+    _encoding = None
+
+
+SESSIONS_DIR = os.environ.get("CHAT_SESSIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_sessions"))
+HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", "3000"))  # Summary plus recent turns sent per request
+SUMMARY_TOKEN_LIMIT = 400  # Rolling summary is asked to stay under this
+MIN_RECENT_MESSAGES = 4  # Always sent verbatim, even over budget
+MAX_SESSIONS_IN_MEMORY = int(os.environ.get("CHAT_MAX_SESSIONS_IN_MEMORY", "1000"))
+SESSION_IDLE_SECONDS = int(os.environ.get("CHAT_SESSION_IDLE_SECONDS", "1800"))  # Dropped from memory (kept on disk) after this
+SESSION_TTL_SECONDS = int(os.environ.get("CHAT_SESSION_TTL_SECONDS", str(7 * 86400)))  # Deleted from disk after this
+SWEEP_INTERVAL = 60
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    # Role and message framing cost a few tokens on top of the content
+    return count_tokens(message["content"]) + 4
+
+
+class ChatSession:
+    """
+    One conversation kept server-side.
+
+    messages holds the turns not yet folded into summary, oldest first;
+    summary is a rolling digest of everything older.
+    """
+
+    def __init__(self, session_id: str, messages: Optional[List[Dict[str, str]]] = None,
+                 summary: str = "", summarized_messages: int = 0,
+                 created_at: Optional[float] = None, updated_at: Optional[float] = None):
+        self.id = session_id
+        self.messages = messages or []
+        self.summary = summary
+        self.summarized_messages = summarized_messages
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        self.lock = asyncio.Lock()
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "messages": self.messages,
+            "summary": self.summary,
+            "summarized_messages": self.summarized_messages,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ChatSession":
+        return cls(data["id"], data.get("messages"), data.get("summary", ""), data.get("summarized_messages", 0),
+                   data.get("created_at"), data.get("updated_at"))
+
+    def add(self, role: str, content: str) -> None:
+        self.messages.append({"role": role, "content": content})
+        self.updated_at = time.time()
+
+    def history_tokens(self) -> int:
+        return sum(message_tokens(m) for m in self.messages)
+
+    def context(self, budget: int = HISTORY_TOKEN_BUDGET) -> List[Dict[str, str]]:
+        """
+        Messages to send: the summary as a system message, then as many of the
+        most recent turns as fit in the budget (sliding window). Whatever falls
+        out of the window is covered by the summary once summarize() catches up.
+        """
+        context = []
+        if self.summary:
+            context.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+            budget -= message_tokens(context[0])
+
+        recent = []
+        for message in reversed(self.messages):
+            cost = message_tokens(message)
+            if len(recent) >= MIN_RECENT_MESSAGES and cost > budget:
+                break
+            recent.append(message)
+            budget -= cost
+        return context + list(reversed(recent))
+
+    def needs_summary(self, budget: int = HISTORY_TOKEN_BUDGET) -> bool:
+        return len(self.messages) > MIN_RECENT_MESSAGES and self.history_tokens() > budget
+
+    async def summarize(self, summarizer: Callable[[str, List[Dict[str, str]]], Awaitable[str]],
+                        budget: int = HISTORY_TOKEN_BUDGET) -> None:
+        """
+        Fold the oldest turns into the rolling summary until the remaining
+        history is at most half the budget, so it is not redone every turn.
+        """
+        if not self.needs_summary(budget):
+            return
+        keep_tokens = 0
+        keep_from = len(self.messages)
+        while keep_from > 0:
+            cost = message_tokens(self.messages[keep_from - 1])
+            if len(self.messages) - keep_from >= MIN_RECENT_MESSAGES and keep_tokens + cost > budget // 2:
+                break
+            keep_tokens += cost
+            keep_from -= 1
+        # Fold whole exchanges so a question is never split from its answer
+        while keep_from < len(self.messages) and self.messages[keep_from]["role"] != "user":
+            keep_from += 1
+        if keep_from == 0 or keep_from >= len(self.messages):
+            return
+
+        old = self.messages[:keep_from]
+        summary = await summarizer(self.summary, old)
+        if not summary:
+            return
+        # Turns may have been added while summarizing; only drop the ones summarized
+        self.messages = self.messages[len(old):]
+        self.summary = summary
+        self.summarized_messages += len(old)
+
+
+class SessionStore:
+    """
+    Chat sessions by conversation id: an LRU of at most max_in_memory sessions
+    backed by one JSON file per session. Sessions idle for idle_seconds leave
+    memory (they reload from disk on the next turn); files untouched for
+    ttl_seconds are deleted.
+    """
+
+    def __init__(self, directory: str = SESSIONS_DIR, max_in_memory: int = MAX_SESSIONS_IN_MEMORY,
+                 idle_seconds: int = SESSION_IDLE_SECONDS, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.directory = directory
+        self.max_in_memory = max_in_memory
+        self.idle_seconds = idle_seconds
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._last_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    @staticmethod
+    def valid_id(session_id: str) -> bool:
+        return bool(re.fullmatch(r"[A-Za-z0-9_-]{1,64}", session_id))
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        self._sweep()
+        if not self.valid_id(session_id):
+            return None
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._load(session_id)
+            if session is None:
+                return None
+            self._remember(session)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def create(self, session_id: Optional[str] = None) -> ChatSession:
+        session = ChatSession(session_id or uuid.uuid4().hex)
+        self._remember(session)
+        return session
+
+    def get_or_create(self, session_id: Optional[str]) -> ChatSession:
+        if session_id:
+            if not self.valid_id(session_id):
+                raise ValueError(f"Invalid conversation id: {session_id}")
+            return self.get(session_id) or self.create(session_id)
+        return self.create()
+
+    def delete(self, session_id: str) -> bool:
+        if not self.valid_id(session_id):
+            return False
+        existed = self._sessions.pop(session_id, None) is not None
+        try:
+            os.remove(self._path(session_id))
+            existed = True
+        except FileNotFoundError:
+            pass
+        return existed
+
+    def save(self, session: ChatSession) -> None:
+        path = self._path(session.id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(session.to_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save chat session {session.id}: {e}")
+
+    def _load(self, session_id: str) -> Optional[ChatSession]:
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return ChatSession.from_dict(json.load(f))
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            print(f"Ignoring unreadable chat session {path}: {e}")
+            return None
+
+    def _remember(self, session: ChatSession) -> None:
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_in_memory:
+            _, evicted = self._sessions.popitem(last=False)
+            self.save(evicted)
+
+    def _sweep(self) -> None:
+        """Drop idle sessions from memory and expired ones from disk, at most every SWEEP_INTERVAL"""
+        now = time.time()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for session_id, session in list(self._sessions.items()):
+            if now - session.updated_at > self.idle_seconds and not session.lock.locked():
+                del self._sessions[session_id]
+        try:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith(".json") and now - os.path.getmtime(path) > self.ttl_seconds:
+                    self._sessions.pop(name[:-5], None)
+                    os.remove(path)
+        except OSError as e:
+            print(f"Chat session sweep failed: {e}")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
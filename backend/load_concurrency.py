@@ -0,0 +1,95 @@
+"""
+Many simultaneous chat streams against one server process.
+
+Run the app with a single worker, pointed at the fake OpenAI server so the
+numbers measure this app rather than OpenAI:
+
+    uvicorn fake_openai:app --port 8101 --app-dir ../backend_prod/benchmarks
+    OPENAI_BASE_URL=http://127.0.0.1:8101/v1 uvicorn main:app --workers 1
+    python load_concurrency.py 50
+
+If the event loop were blocked by stream reads the streams would run one
+after another and the wall time would be roughly N times a single stream;
+served concurrently it stays close to a single stream.
+"""
+import asyncio
+import sys
+import time
+import aiohttp
+from datetime import datetime
+
+URL = 'http://localhost:8000/chat/'
+
+
+def make_payload(i):
+    return {
+        "messages": [
+            {
+                "role": "user",
+                "content": f"Concurrency test {i}: write a short story about a robot learning to paint",
+                "timestamp": datetime.now().isoformat()
+            }
+        ],
+        "model": "gpt-4",
+        "temperature": 0.7,
+        "max_tokens": 200,
+        "stream": True
+    }
+
+
+async def run_stream(session, i, stop_after=None):
+    """Read one stream; returns (time to first token, total time, tokens, finished)"""
+    start = time.perf_counter()
+    first_token = None
+    tokens = 0
+    finished = False
+    async with session.post(URL, json=make_payload(i)) as response:
+        if response.status != 200:
+            print(f"Stream {i}: status {response.status}: {await response.text()}")
+            return None, time.perf_counter() - start, 0, False
+        event = "message"
+        async for line in response.content:
+            text = line.decode('utf-8').rstrip('\n')
+            if text.startswith('event:'):
+                event = text[6:].strip()
+            elif text.startswith('data:'):
+                if event == "message":
+                    tokens += 1
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    if stop_after and tokens >= stop_after:
+                        break  # Leaving the block drops the connection mid-stream
+                elif event == "done":
+                    finished = True
+                elif event == "error":
+                    print(f"Stream {i}: error {text[5:]}")
+            elif not text:
+                event = "message"
+    return first_token, time.perf_counter() - start, tokens, finished
+
+
+async def run_concurrent_streams(count):
+    async with aiohttp.ClientSession() as session:
+        print("Single stream baseline...")
+        _, baseline, tokens, _ = await run_stream(session, 0)
+        print(f"  {tokens} tokens in {baseline:.2f}s")
+
+        print(f"Starting {count} streams at once...")
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_stream(session, i) for i in range(count)))
+        wall = time.perf_counter() - start
+
+        ttfts = sorted(r[0] for r in results if r[0] is not None)
+        finished = sum(1 for r in results if r[3])
+        print(f"  {finished}/{count} streams finished in {wall:.2f}s wall time "
+              f"({wall / baseline:.1f}x a single stream)")
+        if ttfts:
+            print(f"  time to first token: p50 {ttfts[len(ttfts) // 2]:.2f}s, max {ttfts[-1]:.2f}s")
+
+        print("Disconnecting 10 clients after 3 tokens (server log should show the streams stopping)...")
+        results = await asyncio.gather(*(run_stream(session, i, stop_after=3) for i in range(10)))
+        print(f"  {sum(1 for r in results if r[2] == 3)}/10 clients disconnected early")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_concurrent_streams(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -2,16 +2,26 @@ from fastapi import APIRouter, Body, Request
 from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
-from typing import List, Optional, AsyncGenerator
+from typing import List, Optional, AsyncGenerator, Awaitable, Callable, Dict
 from datetime import datetime
 import json
 import asyncio
-from openai import OpenAI
+import os
+from openai import AsyncOpenAI
 from config import settings
 from fastapi import HTTPException
+from chat_sessions import SessionStore, ChatSession, HISTORY_TOKEN_BUDGET, SUMMARY_TOKEN_LIMIT, message_tokens
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.openai_api_key)
+# Initialize OpenAI client. Async so a stream waiting on OpenAI never blocks the event loop;
+# OPENAI_BASE_URL is honoured by the SDK (e.g. benchmarks/fake_openai.py for load tests)
+client = AsyncOpenAI(api_key=settings.openai_api_key)
+
+HEARTBEAT_SECONDS = float(os.environ.get("CHAT_HEARTBEAT_SECONDS", "15"))  # Comment line sent when no token arrived for this long
+SUMMARY_MODEL = os.environ.get("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+
+# Conversation history lives here, so clients send only the new message each turn
+sessions = SessionStore()
+background_tasks = set()  # Keeps summary tasks referenced until they finish
 
 templates = None
 
@@ -32,7 +42,8 @@ class Message(BaseModel):
     timestamp: Optional[datetime] = Field(default_factory=datetime.now)
 
 class ChatRequest(BaseModel):
-    messages: List[Message]
+    messages: List[Message]  # With a conversation_id, only the new user message
+    conversation_id: Optional[str] = None
     model: str = "gpt-4"
     temperature: float = 0.7
     max_tokens: int = 500
@@ -41,35 +52,164 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: Message
     usage: Optional[dict] = None
+    conversation_id: Optional[str] = None
+
+def sse_event(data, event: Optional[str] = None) -> str:
+    """One Server-Sent Events message; data is JSON-encoded so newlines in tokens survive"""
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
 
-async def stream_chat_response(messages: List[dict], model: str, temperature: float, max_tokens: int) -> AsyncGenerator[str, None]:
+async def stream_chat_response(messages: List[dict], model: str, temperature: float, max_tokens: int,
+                               request: Optional[Request] = None,
+                               on_complete: Optional[Callable[[str], Awaitable[None]]] = None,
+                               done_data: Optional[dict] = None) -> AsyncGenerator[str, None]:
+    """
+    Stream a completion as SSE: a data event per token, then "done" (with usage)
+    or "error".
+
+    Tokens are read from the OpenAI stream by a separate task so a ": heartbeat"
+    comment can be sent whenever nothing arrived for HEARTBEAT_SECONDS, keeping
+    proxies from closing an idle connection. If the client goes away the reader
+    task is cancelled and the upstream stream closed, so OpenAI stops generating.
+    on_complete gets the full reply of a stream that finished; done_data is
+    added to the "done" event.
+    """
     print(f"Starting stream with model {model}")
+    queue: asyncio.Queue = asyncio.Queue()
+    stream = None
+
+    async def read_stream():
+        nonlocal stream
+        try:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            usage = None
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage.model_dump()
+                if chunk.choices and chunk.choices[0].delta.content:
+                    await queue.put(("token", chunk.choices[0].delta.content))
+            await queue.put(("done", usage))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in stream: {str(e)}")
+            await queue.put(("error", str(e)))
+
+    reader = asyncio.create_task(read_stream())
+    reply = []
     try:
-        print("Creating chat completion stream...")
-        stream = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=True
-        )
-        print("Stream created, starting iteration...")
+        while True:
+            try:
+                kind, value = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if request is not None and await request.is_disconnected():
+                    print("Client disconnected, stopping stream")
+                    break
+                yield ": heartbeat\n\n"
+                continue
 
-        # Convert the stream iterator to async generator
-        for chunk in stream:
-            if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content:
-                response = chunk.choices[0].delta.content
-                #print(f"Yielding: {response.strip()}")
-                yield response
-                await asyncio.sleep(0)  # Allow other tasks to run
+            if kind == "token":
+                reply.append(value)
+                yield sse_event({"content": value})
+            elif kind == "done":
+                print("Stream completed successfully")
+                if on_complete is not None:
+                    await on_complete("".join(reply))
+                yield sse_event({"usage": value, **(done_data or {})}, event="done")
+                break
+            else:
+                yield sse_event({"error": value}, event="error")
+                break
+    finally:
+        # Runs on normal completion and when Starlette cancels the response on disconnect
+        reader.cancel()
+        if stream is not None:
+            await stream.close()
 
-        print("Stream completed successfully")
+async def summarize_history(summary: str, messages: List[Dict[str, str]]) -> str:
+    """Fold older turns into the rolling summary with a small model"""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        f"Update the summary of a conversation with the turns below. Keep facts, names, decisions, "
+        f"open questions and user preferences; drop pleasantries. Stay under {SUMMARY_TOKEN_LIMIT} tokens.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    response = await client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=SUMMARY_TOKEN_LIMIT,
+    )
+    return response.choices[0].message.content
 
-    except Exception as e:
-        print(f"Error in stream: {str(e)}")
-        error_response = f"Error: {str(e)}\n"
-        print(f"Yielding error: {error_response.strip()}")
-        yield error_response
+async def summarize_session(session: ChatSession):
+    """Background: compress old turns once the history is over budget"""
+    async with session.lock:
+        try:
+            await session.summarize(summarize_history)
+            sessions.save(session)
+        except Exception as e:
+            # The sliding window still bounds the prompt; summarizing is retried next turn
+            print(f"Error summarizing chat session {session.id}: {str(e)}")
+
+async def finish_turn(session: ChatSession, new_messages: List[Dict[str, str]], reply: str):
+    """Record a completed turn: the request's new messages and the reply, together"""
+    for message in new_messages:
+        session.add(message["role"], message["content"])
+    session.add("assistant", reply)
+    sessions.save(session)
+    if session.needs_summary() and not session.lock.locked():
+        task = asyncio.create_task(summarize_session(session))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+def start_turn(request: ChatRequest):
+    """
+    The request's session and its new messages. The messages are recorded only
+    by finish_turn, so a failed or abandoned turn leaves no unanswered message
+    behind for a retry to duplicate.
+    """
+    try:
+        session = sessions.get_or_create(request.conversation_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not session.messages and not session.summary:
+        # New conversation: take everything the client sent (older clients send full history)
+        new_messages = request.messages
+    else:
+        new_messages = [msg for msg in request.messages if msg.role == "user"][-1:]
+    if not new_messages:
+        raise HTTPException(status_code=400, detail="No user message in request")
+    return session, [{"role": msg.role, "content": msg.content} for msg in new_messages]
+
+def turn_context(session: ChatSession, new_messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Summary plus the recent turns that fit the token budget, then the new messages"""
+    budget = HISTORY_TOKEN_BUDGET - sum(message_tokens(m) for m in new_messages)
+    return session.context(budget) + new_messages
+
+@router.get("/sessions/{conversation_id}")
+async def get_session(conversation_id: str):
+    session = sessions.get(conversation_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {
+        **session.to_dict(),
+        "history_tokens": session.history_tokens(),
+    }
+
+@router.delete("/sessions/{conversation_id}")
+async def delete_session(conversation_id: str):
+    if not sessions.delete(conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"deleted": conversation_id}
 
 @router.get("/", response_class=HTMLResponse)
 async def chat_page(request: Request):
@@ -79,13 +219,11 @@ async def chat_page(request: Request):
     )
 
 @router.post("/")
-async def generate_chat_response(request: ChatRequest = Body(...)):
+async def generate_chat_response(http_request: Request, request: ChatRequest = Body(...)):
+    session, new_messages = start_turn(request)
     try:
-        # Format messages for OpenAI API
-        formatted_messages = [
-            {"role": msg.role, "content": msg.content}
-            for msg in request.messages
-        ]
+        # Summary plus the recent turns that fit the token budget, not the whole history
+        formatted_messages = turn_context(session, new_messages)
 
         if request.stream:
             # Return streaming response
@@ -94,17 +232,22 @@ async def generate_chat_response(request: ChatRequest = Body(...)):
                     messages=formatted_messages,
                     model=request.model,
                     temperature=request.temperature,
-                    max_tokens=request.max_tokens
+                    max_tokens=request.max_tokens,
+                    request=http_request,
+                    on_complete=lambda reply: finish_turn(session, new_messages, reply),
+                    done_data={"conversation_id": session.id}
                 ),
                 media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
-                    "Connection": "keep-alive"
+                    "Connection": "keep-alive",
+                    "X-Accel-Buffering": "no",
+                    "X-Conversation-Id": session.id
                 }
             )
         
         # Non-streaming response
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=request.model,
             messages=formatted_messages,
             temperature=request.temperature,
@@ -113,6 +256,7 @@ async def generate_chat_response(request: ChatRequest = Body(...)):
         
         # Extract the response
         assistant_message = response.choices[0].message.content
+        await finish_turn(session, new_messages, assistant_message)
         
         # Create a new Message object for the response
         response_message = Message(
@@ -127,7 +271,8 @@ async def generate_chat_response(request: ChatRequest = Body(...)):
                 "prompt_tokens": response.usage.prompt_tokens,
                 "completion_tokens": response.usage.completion_tokens,
                 "total_tokens": response.usage.total_tokens
-            }
+            },
+            conversation_id=session.id
         )
     
     except Exception as e:
@@ -0,0 +1,129 @@
+"""
+Concurrent chat streams served in-process against a stubbed AsyncOpenAI.
+
+Run with pytest from this directory. Every stream waits on its (fake) upstream
+between tokens, so if the event loop were blocked the streams would run one
+after another; served concurrently, many streams take about as long as one.
+"""
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import httpx
+
+from chat_sessions import SessionStore
+from main import app
+from routers import chat
+
+TOKENS = ["Once ", "upon ", "a ", "time ", "a ", "robot ", "learned ", "to ", "paint", "."]
+TOKEN_DELAY = 0.05
+STREAMS = 25
+
+
+class FakeStream:
+    """Async iterator of completion chunks, like the SDK's AsyncStream"""
+
+    def __init__(self):
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for token in TOKENS:
+            await asyncio.sleep(TOKEN_DELAY)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        usage = {"prompt_tokens": 12, "completion_tokens": len(TOKENS), "total_tokens": 12 + len(TOKENS)}
+        yield SimpleNamespace(usage=SimpleNamespace(model_dump=lambda: usage), choices=[])
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.streams = []
+
+    async def create(self, **kwargs):
+        assert kwargs["stream"]
+        stream = FakeStream()
+        self.streams.append(stream)
+        return stream
+
+
+def parse_sse(body: str):
+    """(event, data) pairs of an SSE body; comments are skipped"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:])
+        if data is not None:
+            events.append((event, data))
+    return events
+
+
+async def post_stream(client: httpx.AsyncClient, i: int):
+    payload = {"messages": [{"role": "user", "content": f"Story {i}"}], "stream": True}
+    response = await client.post("/chat/", json=payload)
+    assert response.status_code == 200
+    return response.headers["x-conversation-id"], parse_sse(response.text)
+
+
+def test_concurrent_streams(tmp_path, monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(chat, "sessions", SessionStore(str(tmp_path)))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(post_stream(client, i) for i in range(STREAMS)))
+            return results, time.perf_counter() - start
+
+    results, wall = asyncio.run(run())
+
+    single_stream = len(TOKENS) * TOKEN_DELAY
+    # Sequential streams would take STREAMS * single_stream
+    assert wall < single_stream * 5, f"{STREAMS} streams took {wall:.2f}s, one takes {single_stream:.2f}s"
+
+    assert len({conversation_id for conversation_id, _ in results}) == STREAMS
+    for conversation_id, events in results:
+        tokens = [data["content"] for event, data in events if event == "message"]
+        assert "".join(tokens) == "".join(TOKENS)
+        event, data = events[-1]
+        assert event == "done"
+        assert data["conversation_id"] == conversation_id
+        assert data["usage"]["completion_tokens"] == len(TOKENS)
+        session = chat.sessions.get(conversation_id)
+        assert [m["role"] for m in session.messages] == ["user", "assistant"]
+        assert session.messages[-1]["content"] == "".join(TOKENS)
+    assert all(stream.closed for stream in completions.streams)
+
+
+def test_failed_stream_leaves_session_unchanged(tmp_path, monkeypatch):
+    class FailingCompletions:
+        async def create(self, **kwargs):
+            raise RuntimeError("upstream unavailable")
+
+    monkeypatch.setattr(chat, "client", SimpleNamespace(chat=SimpleNamespace(completions=FailingCompletions())))
+    monkeypatch.setattr(chat, "sessions", SessionStore(str(tmp_path)))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await post_stream(client, 0)
+
+    conversation_id, events = asyncio.run(run())
+    assert events[-1][0] == "error"
+    # A retry must not find the unanswered message already in the history
+    session = chat.sessions.get(conversation_id)
+    assert session is None or session.messages == []
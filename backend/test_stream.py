@@ -33,16 +33,26 @@ async def test_chat_stream():
                     return
                 
                 print("Connected to stream. Receiving tokens:\n")
+                event = "message"
                 async for line in response.content:
-                    if line:
-                        try:
-                            text = line.decode('utf-8')
-                            if text.startswith('Error:'):
-                                print(text, end='')
+                    try:
+                        text = line.decode('utf-8').rstrip('\n')
+                        if not text:
+                            event = "message"
+                        elif text.startswith(':'):
+                            pass  # heartbeat
+                        elif text.startswith('event:'):
+                            event = text[6:].strip()
+                        elif text.startswith('data:'):
+                            data = json.loads(text[5:])
+                            if event == "error":
+                                print(f"\nError: {data['error']}")
+                            elif event == "done":
+                                print(f"\n\nUsage: {data['usage']}")
                             else:
-                                print(text, end='', flush=True)
-                        except Exception as e:
-                            print(f"\nError processing response: {e}")
+                                print(data['content'], end='', flush=True)
+                    except Exception as e:
+                        print(f"\nError processing response: {e}")
                 print("\n\nStream completed.")
     except aiohttp.ClientError as e:
         print(f"Connection error: {e}")
@@ -0,0 +1,180 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import metrics
+
+
+QUEUE_DEPTH = metrics.registry.gauge("work_queue_depth", "Jobs waiting for a worker", ["pool"])
+QUEUE_WAIT = metrics.registry.histogram("work_queue_wait_seconds", "Time jobs spent queued before starting", ["pool"])
+QUEUE_REJECTED = metrics.registry.counter("work_queue_rejected_total", "Jobs refused at admission", ["pool", "reason"])
+QUEUE_SHED = metrics.registry.counter("work_queue_shed_total", "Queued jobs dropped to admit higher-priority work", ["pool"])
+
+
+class QueueFull(Exception):
+    """Raised when a job is not admitted; retry_after is a suggested wait in seconds."""
+
+    def __init__(self, pool: str, retry_after: int, reason: str = "full"):
+        super().__init__(f"{pool} queue is {reason}, retry in {retry_after}s")
+        self.pool = pool
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "client_id", "priority", "seq", "enqueued_at", "on_shed")
+
+    def __init__(self, fn, args, kwargs, client_id, priority, seq, on_shed):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.client_id = client_id
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.on_shed = on_shed
+
+
+class AdmissionExecutor:
+    """
+    Thread pool with a bounded queue, admission policy and per-client fairness.
+
+    Jobs wait in one queue per client; idle workers take the highest-priority
+    head job and rotate between clients on ties, so one client submitting many
+    jobs cannot starve the others. When the queue is full the policy decides:
+
+    - "reject": refuse the new job with QueueFull (callers answer 503 + Retry-After
+      or downgrade, e.g. to transcript-only).
+    - "shed": drop the lowest-priority queued job (its on_shed callback runs and
+      its future is cancelled) if the new job outranks it, else refuse.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, max_per_client: Optional[int] = None, policy: str = "reject"):
+        if policy not in ("reject", "shed"):
+            raise ValueError(f"Unknown admission policy: {policy}")
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client or max_queue
+        self.policy = policy
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._queued = 0
+        self._seq = itertools.count()
+        self._avg_runtime = 10.0  # Seconds; smoothed job duration used for Retry-After
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable, *args, client_id: str = "anonymous", priority: int = 0,
+               on_shed: Optional[Callable[[], None]] = None, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs); raises QueueFull when the job is not admitted"""
+        shed_job = None
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError(f"{self.name} executor is shut down")
+            queue = self._queues.get(client_id)
+            if queue is not None and len(queue) >= self.max_per_client:
+                QUEUE_REJECTED.inc(pool=self.name, reason="client_limit")
+                raise QueueFull(self.name, self.retry_after(), reason="at its per-client limit")
+            if self._queued >= self.max_queue:
+                shed_job = self._pick_shed_victim(priority) if self.policy == "shed" else None
+                if shed_job is None:
+                    QUEUE_REJECTED.inc(pool=self.name, reason="full")
+                    raise QueueFull(self.name, self.retry_after())
+                self._remove(shed_job)
+            job = _Job(fn, args, kwargs, client_id, priority, next(self._seq), on_shed)
+            self._queues.setdefault(client_id, deque()).append(job)
+            self._queued += 1
+            QUEUE_DEPTH.set(self._queued, pool=self.name)
+            self._cond.notify()
+
+        if shed_job is not None:
+            QUEUE_SHED.inc(pool=self.name)
+            shed_job.future.cancel()
+            if shed_job.on_shed is not None:
+                try:
+                    shed_job.on_shed()
+                except Exception as e:
+                    print(f"on_shed callback failed in {self.name}: {e}")
+        return job.future
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up"""
+        waves = self._queued / max(self.max_workers, 1) + 1
+        return max(1, int(waves * self._avg_runtime))
+
+    def depth(self) -> int:
+        with self._cond:
+            return self._queued
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _pick_shed_victim(self, priority: int) -> Optional[_Job]:
+        """Lowest-priority queued job, newest first, from the client with most queued. Caller holds the lock."""
+        candidates = [job for queue in self._queues.values() for job in queue if job.priority < priority]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda job: (job.priority, -len(self._queues[job.client_id]), -job.seq))
+
+    def _remove(self, job: _Job) -> None:
+        """Drop a queued job. Caller holds the lock."""
+        queue = self._queues[job.client_id]
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.client_id]
+        self._queued -= 1
+
+    def _next_job(self) -> Optional[_Job]:
+        """Highest-priority head job; ties go to the client served least recently. Caller holds the lock."""
+        best_client = None
+        best_priority = None
+        for client_id, queue in self._queues.items():
+            if best_priority is None or queue[0].priority > best_priority:
+                best_client, best_priority = client_id, queue[0].priority
+        if best_client is None:
+            return None
+        queue = self._queues[best_client]
+        job = queue.popleft()
+        # Served clients go to the back of the rotation
+        del self._queues[best_client]
+        if queue:
+            self._queues[best_client] = queue
+        self._queued -= 1
+        return job
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queued and not self._shutdown:
+                    self._cond.wait()
+                if self._shutdown and not self._queued:
+                    return
+                job = self._next_job()
+                QUEUE_DEPTH.set(self._queued, pool=self.name)
+            if job is None or not job.future.set_running_or_notify_cancel():
+                continue
+            QUEUE_WAIT.observe(time.monotonic() - job.enqueued_at, pool=self.name)
+            start = time.monotonic()
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                self._avg_runtime = 0.8 * self._avg_runtime + 0.2 * (time.monotonic() - start)
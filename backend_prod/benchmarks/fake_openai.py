@@ -0,0 +1,123 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Answers /v1/chat/completions (streaming and non-streaming) after a configurable
+time-to-first-token and per-token delay, with usage numbers filled in. Quiz
+prompts (response_format json_object) get a schema-valid quiz back.
+
+    FAKE_OPENAI_TTFT=0.3 FAKE_OPENAI_TOKEN_LATENCY=0.01 \
+        uvicorn fake_openai:app --port 8101 --app-dir benchmarks
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+TTFT = float(os.environ.get("FAKE_OPENAI_TTFT", "0.3"))  # Seconds before the first token
+TOKEN_LATENCY = float(os.environ.get("FAKE_OPENAI_TOKEN_LATENCY", "0.01"))  # Seconds per generated token
+COMPLETION_TOKENS = int(os.environ.get("FAKE_OPENAI_TOKENS", "120"))  # Tokens per text answer
+
+app = FastAPI(title="Fake OpenAI")
+
+WORDS = ("the model uses attention to weigh each token against the others and "
+         "fine tuning adapts the pretrained weights to the new dataset").split()
+
+
+def count_tokens(messages) -> int:
+    """Rough token count (about 4 characters per token) of a message list"""
+    total = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        total += len(str(content)) // 4 + 4
+    return total
+
+
+def fake_quiz(num_questions: int) -> str:
+    quiz = []
+    for i in range(num_questions):
+        options = [f"Option {chr(65 + j)} for question {i + 1}" for j in range(4)]
+        quiz.append({
+            "id": f"q{i + 1}",
+            "question": f"Benchmark question {i + 1} about concept {uuid.uuid4().hex[:8]}?",
+            "options": options,
+            "answer": options[i % 4],
+            "explanation": "Stated in the transcript.",
+        })
+    return json.dumps({"metadata": {"num_questions": num_questions}, "quiz": quiz})
+
+
+def fake_text(num_tokens: int) -> str:
+    return " ".join(WORDS[i % len(WORDS)] for i in range(num_tokens))
+
+
+def split_tokens(text: str):
+    """Split text into token-sized pieces that concatenate back to the original"""
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    messages = body.get("messages", [])
+    prompt_tokens = count_tokens(messages)
+
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        match = re.search(r"Total questions: (\d+)", json.dumps(messages))
+        text = fake_quiz(int(match.group(1)) if match else 5)
+    else:
+        text = fake_text(min(COMPLETION_TOKENS, body.get("max_tokens") or COMPLETION_TOKENS))
+    pieces = split_tokens(text)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(pieces),
+        "total_tokens": prompt_tokens + len(pieces),
+    }
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(TTFT + TOKEN_LATENCY * len(pieces))
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta, finish_reason=None, chunk_usage=None, choices=True):
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+        }
+        if chunk_usage is not None:
+            data["usage"] = chunk_usage
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def event_stream():
+        await asyncio.sleep(TTFT)
+        yield chunk({"role": "assistant", "content": ""})
+        for piece in pieces:
+            yield chunk({"content": piece})
+            await asyncio.sleep(TOKEN_LATENCY)
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk({}, chunk_usage=usage, choices=False)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -0,0 +1,95 @@
+"""
+Local stand-in for the RapidAPI hosts and YouTube oEmbed used by the backend.
+
+Point the backend at it with RAPIDAPI_BASE_URL=http://host:port (calls arrive as
+/{rapidapi-host}/{path}) and YOUTUBE_OEMBED_URL=http://host:port/oembed.
+Transcripts are seeded from output.json, with every subtitle prefixed by the
+video id so each video's chunks are distinct (the backend checkpoints
+formatted chunks by content); ids starting with SHARED_PREFIX all get the
+unprefixed seed, for measuring checkpoint reuse. Downloads serve the
+synthetic MP4 fixture from fixtures.py.
+
+    FAKE_RAPIDAPI_LATENCY=0.2 uvicorn fake_rapidapi:app --port 8102 --app-dir benchmarks
+"""
+import asyncio
+import copy
+import json
+import os
+from urllib.parse import parse_qs, urlsplit
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from fixtures import ensure_video_fixture
+
+
+LATENCY = float(os.environ.get("FAKE_RAPIDAPI_LATENCY", "0.2"))  # Seconds per API call
+SEED_FILE = os.environ.get("FAKE_RAPIDAPI_SEED", os.path.join(os.path.dirname(__file__), "..", "output.json"))
+FIXTURE_PATH = ensure_video_fixture()
+
+app = FastAPI(title="Fake RapidAPI")
+
+SHARED_PREFIX = "shr"
+
+with open(SEED_FILE, "r", encoding="utf-8") as f:
+    SEED = json.load(f)
+
+
+def transcription_for(video_id: str):
+    items = copy.deepcopy(SEED[0]["transcription"])
+    if not video_id.startswith(SHARED_PREFIX):
+        for item in items:
+            item["subtitle"] = f"{video_id} {item['subtitle']}"
+    return items
+
+
+def transcript_for(video_id: str):
+    data = copy.deepcopy(SEED)
+    data[0]["title"] = f"{data[0]['title']} [{video_id}]"
+    data[0]["transcription"] = transcription_for(video_id)
+    return data
+
+
+@app.get("/youtube-transcriptor.p.rapidapi.com/transcript")
+async def transcriptor(video_id: str, lang: str = "en"):
+    await asyncio.sleep(LATENCY)
+    return transcript_for(video_id)
+
+
+@app.get("/youtube-transcript3.p.rapidapi.com/api/transcript")
+async def transcript3(videoId: str):
+    await asyncio.sleep(LATENCY)
+    items = transcription_for(videoId)
+    return {
+        "success": True,
+        "transcript": [{"text": item["subtitle"], "offset": item["start"], "duration": item["dur"]} for item in items],
+    }
+
+
+@app.get("/youtube-media-downloader.p.rapidapi.com/v2/video/details")
+async def video_details(request: Request, videoId: str):
+    await asyncio.sleep(LATENCY)
+    return {
+        "title": SEED[0]["title"],
+        "videos": {"items": [{"url": str(request.base_url) + f"files/{videoId}.mp4"}]},
+    }
+
+
+@app.get("/youtube-info-download-api.p.rapidapi.com/ajax/download.php")
+async def download_php(request: Request, url: str):
+    await asyncio.sleep(LATENCY)
+    video_id = parse_qs(urlsplit(url).query).get("v", ["video"])[0]
+    return {"title": SEED[0]["title"], "url": str(request.base_url) + f"files/{video_id}.mp4"}
+
+
+@app.get("/files/{name}")
+async def serve_file(name: str):
+    if not name.endswith(".mp4"):
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(FIXTURE_PATH, media_type="video/mp4")
+
+
+@app.get("/oembed")
+async def oembed(url: str, format: str = "json"):
+    await asyncio.sleep(LATENCY / 2)
+    return {"title": SEED[0]["title"], "author_name": "Benchmark", "type": "video"}
@@ -0,0 +1,45 @@
+"""Synthetic video fixture for the offline benchmarks."""
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+
+DEFAULT_FIXTURE_PATH = os.path.join(tempfile.gettempdir(), "vidya_bench_fixture.mp4")
+
+
+def make_video_fixture(path: str, duration: int = 120, fps: int = 5, size=(320, 240), scene_length: int = 10) -> str:
+    """
+    Write an MP4 with a new solid-colour "slide" every scene_length seconds.
+
+    Each frame is stamped with its timestamp so extracted frames can be checked by eye.
+    """
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for {path}")
+    rng = np.random.default_rng(0)  # Fixed seed keeps the fixture identical across runs
+    try:
+        colours = rng.integers(0, 256, size=(duration // scene_length + 1, 3))
+        for index in range(duration * fps):
+            second = index // fps
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[:] = colours[second // scene_length]
+            cv2.putText(frame, f"slide {second // scene_length}  t={second}s", (10, height // 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def ensure_video_fixture(path: str = DEFAULT_FIXTURE_PATH) -> str:
+    """Create the fixture on first use and return its path"""
+    if not os.path.exists(path) or os.path.getsize(path) < 10000:
+        make_video_fixture(path)
+    return path
+
+
+if __name__ == "__main__":
+    print(f"Fixture written to {make_video_fixture(DEFAULT_FIXTURE_PATH)}")
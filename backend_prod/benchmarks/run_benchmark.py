@@ -0,0 +1,269 @@
+"""
+Offline load benchmark for youtube_backend.
+
+Starts the fake OpenAI and RapidAPI servers plus the real backend (each as a
+uvicorn subprocess, the backend with a scratch working and data directory), then runs
+repeatable load scenarios against it and reports p50/p95/p99 latency and
+throughput. No network access or API keys are needed.
+
+    cd backend_prod
+    python benchmarks/run_benchmark.py --requests 50 --concurrency 10
+    python benchmarks/run_benchmark.py --scenarios query,quiz --json results.json
+
+Scenarios:
+    info         POST /api/youtube/info for fresh video ids (fast path only; the transcript
+                 fetch and title lookup run in the background and are not measured)
+    query        POST /api/query/video, text question
+    image_query  POST /api/query/video, frame question at varying timestamps
+    quiz         POST /api/quiz/generate
+    formatting   POST /api/youtube/info for a fresh id, then poll until formatting completes
+                 (each id has its own transcript text, so every chunk is formatted)
+    formatting_checkpointed
+                 The same for fresh ids that share one transcript, formatted once
+                 beforehand, so every chunk comes from the formatting checkpoints
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+BENCH_VIDEO_ID = "OxfeK423y2I"  # The video output.json was captured from
+SCENARIOS = ["info", "query", "image_query", "quiz", "formatting", "formatting_checkpointed"]
+SHARED_TRANSCRIPT_PREFIX = "shr"  # fake_rapidapi serves these ids one identical transcript
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: str, app_dir: str, port: int, env: dict, cwd: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", app_dir, "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def fresh_video_id(prefix: str, index: int) -> str:
+    """Deterministic 11-character id distinct from the warm-up video"""
+    return f"{prefix}{index:0{11 - len(prefix)}d}"
+
+
+async def run_requests(client: httpx.AsyncClient, make_call, total: int, concurrency: int):
+    """Run make_call(i) total times with bounded concurrency; return (latencies, errors, wall seconds)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await make_call(client, i)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def check(response: httpx.Response) -> dict:
+    response.raise_for_status()
+    return response.json()
+
+
+def make_scenarios(poll_interval: float):
+    async def info(client, i):
+        video_id = fresh_video_id("info", i)
+        await check(await client.post("/api/youtube/info", json={"url": f"https://www.youtube.com/watch?v={video_id}"}))
+
+    async def query(client, i):
+        await check(await client.post("/api/query/video", json={
+            "video_id": BENCH_VIDEO_ID, "query": f"What is explained about fine tuning? ({i})"}))
+
+    async def image_query(client, i):
+        data = await check(await client.post("/api/query/video", json={
+            "video_id": BENCH_VIDEO_ID, "query": "What is shown on screen?",
+            "timestamp": float(5 + (i * 7) % 100), "is_image_query": True}))
+        if data.get("query_type") != "image":
+            raise RuntimeError(f"Unexpected query type {data.get('query_type')}")
+
+    async def quiz(client, i):
+        await check(await client.post("/api/quiz/generate", json={
+            "video_id": BENCH_VIDEO_ID, "num_questions": 5, "difficulty": ["easy", "medium", "hard"][i % 3]}))
+
+    async def format_video(client, video_id):
+        await check(await client.post("/api/youtube/info", json={"url": f"https://www.youtube.com/watch?v={video_id}"}))
+        while True:
+            status = await check(await client.get(f"/api/youtube/formatting-status/{video_id}"))
+            if status["status"] == "completed":
+                return
+            if status["status"] == "failed":
+                raise RuntimeError(status.get("error"))
+            await asyncio.sleep(poll_interval)
+
+    async def formatting(client, i):
+        await format_video(client, fresh_video_id("fmt", i))
+
+    async def formatting_checkpointed(client, i):
+        await format_video(client, fresh_video_id(SHARED_TRANSCRIPT_PREFIX, i + 1))
+
+    async def prime_checkpoints(client):
+        # Formats the shared transcript once (id 0), untimed
+        await format_video(client, fresh_video_id(SHARED_TRANSCRIPT_PREFIX, 0))
+
+    return ({"info": info, "query": query, "image_query": image_query, "quiz": quiz, "formatting": formatting,
+             "formatting_checkpointed": formatting_checkpointed},
+            {"formatting_checkpointed": prime_checkpoints})
+
+
+async def warm_up(client: httpx.AsyncClient, timeout: float = 120.0) -> None:
+    """Ingest the benchmark video and wait for its download so image queries can run"""
+    await check(await client.post("/api/youtube/info", json={"url": f"https://www.youtube.com/watch?v={BENCH_VIDEO_ID}"}))
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = await check(await client.get(f"/api/youtube/download-status/{BENCH_VIDEO_ID}"))
+        if status["status"] == "completed":
+            return
+        if status["status"] == "failed":
+            raise RuntimeError(f"Warm-up download failed: {status.get('message')}")
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Warm-up download timed out")
+
+
+async def run_benchmark(base_url: str, scenarios, total: int, concurrency: int, poll_interval: float):
+    calls, primers = make_scenarios(poll_interval)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0) as client:
+        await warm_up(client)
+        for name in scenarios:
+            if name in primers:
+                await primers[name](client)
+            latencies, errors, wall = await run_requests(client, calls[name], total, concurrency)
+            latencies.sort()
+            results[name] = {
+                "requests": total,
+                "concurrency": concurrency,
+                "errors": len(errors),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "throughput_rps": len(latencies) / wall if wall else 0.0,
+                "sample_errors": errors[:3],
+            }
+    return results
+
+
+def print_report(results: dict) -> None:
+    print(f"\n{'scenario':<24} {'reqs':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    print("-" * 74)
+    for name, r in results.items():
+        print(f"{name:<24} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['throughput_rps']:>8.2f}")
+        for error in r["sample_errors"]:
+            print(f"    ! {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark for youtube_backend")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=30, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--openai-ttft", type=float, default=0.3, help="Fake OpenAI time to first token (s)")
+    parser.add_argument("--openai-token-latency", type=float, default=0.01, help="Fake OpenAI delay per token (s)")
+    parser.add_argument("--openai-tokens", type=int, default=120, help="Fake OpenAI tokens per text answer")
+    parser.add_argument("--rapidapi-latency", type=float, default=0.2, help="Fake RapidAPI delay per call (s)")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="Formatting status poll interval (s)")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the scratch dir with server logs")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="vidya_bench_")
+    openai_port, rapidapi_port, backend_port = free_port(), free_port(), free_port()
+    base_env = dict(os.environ)
+    fake_env = dict(base_env,
+                    FAKE_OPENAI_TTFT=str(args.openai_ttft),
+                    FAKE_OPENAI_TOKEN_LATENCY=str(args.openai_token_latency),
+                    FAKE_OPENAI_TOKENS=str(args.openai_tokens),
+                    FAKE_RAPIDAPI_LATENCY=str(args.rapidapi_latency))
+    backend_env = dict(base_env,
+                       OPENAI_API_KEY="bench",
+                       OPENAI_BASE_URL=f"http://127.0.0.1:{openai_port}/v1",
+                       RAPIDAPI_BASE_URL=f"http://127.0.0.1:{rapidapi_port}",
+                       YOUTUBE_OEMBED_URL=f"http://127.0.0.1:{rapidapi_port}/oembed",
+                       VIDYA_DATA_DIR=workdir)
+
+    servers = []
+    try:
+        servers.append(start_server("fake_openai:app", BENCH_DIR, openai_port, fake_env, workdir,
+                                    os.path.join(workdir, "fake_openai.log")))
+        servers.append(start_server("fake_rapidapi:app", BENCH_DIR, rapidapi_port, fake_env, workdir,
+                                    os.path.join(workdir, "fake_rapidapi.log")))
+        servers.append(start_server("youtube_backend:app", BACKEND_DIR, backend_port, backend_env, workdir,
+                                    os.path.join(workdir, "backend.log")))
+        wait_until_up(f"http://127.0.0.1:{openai_port}/docs")
+        wait_until_up(f"http://127.0.0.1:{rapidapi_port}/docs")
+        wait_until_up(f"http://127.0.0.1:{backend_port}/")
+
+        results = asyncio.run(run_benchmark(f"http://127.0.0.1:{backend_port}", scenarios,
+                                            args.requests, args.concurrency, args.poll_interval))
+        print_report(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"config": vars(args), "results": results}, f, indent=2)
+            print(f"\nResults written to {args.json}")
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if args.keep_workdir:
+            print(f"Server logs kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
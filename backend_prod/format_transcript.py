@@ -1,8 +1,14 @@
+import hashlib
 import json
 import os
+import threading
+import time
 from openai import OpenAI
-from typing import List, Dict
+from ml_models import create_chat_completion
+from resilience import UpstreamUnavailable
+from typing import Callable, List, Dict, Optional
 import sys
+import metrics
 
 
 # Initialize OpenAI client (reads OPENAI_API_KEY from environment)
@@ -43,7 +49,8 @@ def group_subtitles(transcription: List[Dict], group_duration: float = 10.0) ->
             groups.append({
                 'start': current_start,
                 'end': current_end,
-                'text': ' '.join([subtitle['subtitle'] for subtitle in current_group])
+                'text': ' '.join([subtitle['subtitle'] for subtitle in current_group]),
+                'size': len(current_group)
             })
             
             # Start new group
@@ -56,14 +63,122 @@ def group_subtitles(transcription: List[Dict], group_duration: float = 10.0) ->
         groups.append({
             'start': current_start,
             'end': current_end,
-            'text': ' '.join([subtitle['subtitle'] for subtitle in current_group])
+            'text': ' '.join([subtitle['subtitle'] for subtitle in current_group]),
+            'size': len(current_group)
         })
     
     return groups
 
+FORMAT_MODEL = "gpt-3.5-turbo"
+FORMAT_SYSTEM_PROMPT = """You are a transcript formatter. Your task is to:
+1. Add proper punctuation (periods, commas, question marks, exclamation marks)
+2. Capitalize the first letter of sentences
+3. Fix common transcription errors
+4. Make the text readable while preserving the original meaning
+5. Do not add or remove content, only format it properly
+6. Return only the formatted text without any additional comments"""
+FORMAT_USER_TEMPLATE = "Format this transcript text with proper punctuation and capitalization: {chunk}"
+# Changes whenever the model or prompts change, so checkpoints made with an older prompt are redone
+FORMAT_PROMPT_VERSION = hashlib.sha256(
+    "\x1f".join([FORMAT_MODEL, FORMAT_SYSTEM_PROMPT, FORMAT_USER_TEMPLATE]).encode("utf-8")).hexdigest()[:16]
+
+FORMAT_CHUNK_ATTEMPTS = 3
+FORMAT_RETRY_BASE_DELAY = 1.0  # Seconds, doubled per attempt
+FORMAT_MAX_RETRY_WAIT = 30.0  # Longest wait honoured for a rate-limit Retry-After
+
+FORMAT_CHUNKS = metrics.registry.counter(
+    "transcript_format_chunks_total", "Transcript chunks by how their formatted text was obtained", ["outcome"])
+
+
+class FormatCheckpoints:
+    """
+    Formatted chunks on disk, keyed by hash(prompt version + chunk text).
+
+    A chunk is checkpointed as soon as it is formatted, so a restarted or
+    retried job only formats what is missing, a prompt change re-formats
+    everything (new keys), and identical chunks in different videos (intros,
+    outros, sponsor reads) are formatted once.
+    """
+
+    def __init__(self, root_dir: str, prompt_version: str = FORMAT_PROMPT_VERSION):
+        self.root_dir = root_dir
+        self.prompt_version = prompt_version
+        os.makedirs(root_dir, exist_ok=True)
+
+    def key(self, chunk: str) -> str:
+        return hashlib.sha256(f"{self.prompt_version}\x1f{chunk}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], f"{key}.json")
+
+    def get(self, chunk: str) -> Optional[str]:
+        path = self._path(self.key(chunk))
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)["text"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable format checkpoint {path}: {e}")
+            return None
+
+    def put(self, chunk: str, formatted_text: str) -> None:
+        path = self._path(self.key(chunk))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"text": formatted_text, "prompt_version": self.prompt_version, "created_at": time.time()}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save format checkpoint {path}: {e}")
+
+
+format_checkpoints = FormatCheckpoints(os.environ.get(
+    "FORMAT_CHECKPOINT_DIR",
+    os.path.join(os.environ.get("VIDYA_DATA_DIR", os.path.dirname(os.path.abspath(__file__))), "format_chunks")))
+
+
+def format_chunk(chunk: str) -> str:
+    """Format one chunk with OpenAI, retrying transient failures; raises if every attempt fails"""
+    for attempt in range(FORMAT_CHUNK_ATTEMPTS):
+        try:
+            response = create_chat_completion(
+                client, "format_transcript",
+                model=FORMAT_MODEL,
+                messages=[
+                    {"role": "system", "content": FORMAT_SYSTEM_PROMPT},
+                    {"role": "user", "content": FORMAT_USER_TEMPLATE.format(chunk=chunk)}
+                ],
+                max_tokens=500,
+                temperature=0.3
+            )
+            formatted_text = (response.choices[0].message.content or "").strip()
+            if not formatted_text:
+                raise ValueError("Empty formatting response")
+            return formatted_text
+        except Exception as e:
+            if attempt == FORMAT_CHUNK_ATTEMPTS - 1:
+                raise
+            if isinstance(e, UpstreamUnavailable):
+                delay = min(e.retry_after, FORMAT_MAX_RETRY_WAIT)
+            else:
+                delay = FORMAT_RETRY_BASE_DELAY * 2 ** attempt
+            print(f"Retrying chunk in {delay:.0f}s after: {e}")
+            time.sleep(delay)
+
 # REPLACE the existing format_with_openai function with this:
-def format_with_openai(text_chunks: List[str], video_id: str = None) -> List[str]:
-    """Use OpenAI to format text with proper punctuation and progress tracking"""
+def format_with_openai(text_chunks: List[str], video_id: str = None,
+                       on_chunk: Optional[Callable[[int, str, bool], None]] = None,
+                       checkpoints: Optional[FormatCheckpoints] = format_checkpoints) -> List[str]:
+    """
+    Use OpenAI to format text with proper punctuation and progress tracking.
+
+    Chunks already in checkpoints are reused without a call. A chunk that still
+    fails after retries keeps its original text and is not checkpointed, so the
+    next run retries just that chunk. on_chunk(i, text, formatted) sees each
+    chunk as it is done; formatted is False for such fallbacks.
+    """
     formatted_chunks = []
     total_chunks = len(text_chunks)
     
@@ -92,43 +207,40 @@ def format_with_openai(text_chunks: List[str], video_id: str = None) -> List[str
             except:
                 pass  # Continue without progress updates if there's an error
         
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are a transcript formatter. Your task is to:
-1. Add proper punctuation (periods, commas, question marks, exclamation marks)
-2. Capitalize the first letter of sentences
-3. Fix common transcription errors
-4. Make the text readable while preserving the original meaning
-5. Do not add or remove content, only format it properly
-6. Return only the formatted text without any additional comments"""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Format this transcript text with proper punctuation and capitalization: {chunk}"
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            formatted_text = response.choices[0].message.content.strip()
-            formatted_chunks.append(formatted_text)
-            print(f"✓ Chunk {i+1} formatted successfully")
-            
-        except Exception as e:
-            print(f"✗ Error formatting chunk {i+1}: {e}")
-            formatted_chunks.append(chunk)  # Use original if formatting fails
+        formatted_text = checkpoints.get(chunk) if checkpoints is not None else None
+        ok = True
+        if formatted_text is not None:
+            FORMAT_CHUNKS.inc(outcome="checkpoint")
+        else:
+            try:
+                formatted_text = format_chunk(chunk)
+                FORMAT_CHUNKS.inc(outcome="formatted")
+                if checkpoints is not None:
+                    checkpoints.put(chunk, formatted_text)
+                print(f"✓ Chunk {i+1} formatted successfully")
+            except Exception as e:
+                print(f"✗ Error formatting chunk {i+1}: {e}")
+                FORMAT_CHUNKS.inc(outcome="failed")
+                formatted_text = chunk  # Use original; retried on the next run
+                ok = False
+        formatted_chunks.append(formatted_text)
+        
+        if on_chunk is not None:
+            on_chunk(i, formatted_text, ok)
     
     
     return formatted_chunks
 
 
-def create_formatted_transcript(transcript_data: Dict, output_file: str = "formatted_transcript.txt", video_id: str = None):
-    """Create formatted transcript with timestamps"""
+def format_transcript_segments(transcript_data: Dict, video_id: str = None,
+                               on_segment: Optional[Callable[[Dict, int, bool], None]] = None) -> List[Dict]:
+    """
+    Group subtitles, format each group with OpenAI and return [{start, end, text}] segments.
+
+    on_segment(segment, subtitle_count, formatted) is called as each segment is
+    done, in order, with the number of raw subtitles the segment covers and
+    whether formatting succeeded (False: original text kept).
+    """
     print(f"transcript_data: {transcript_data[0]}")
     
     # Group subtitles into manageable chunks
@@ -139,20 +251,41 @@ def create_formatted_transcript(transcript_data: Dict, output_file: str = "forma
     
     # Format with OpenAI
     print("Formatting text with OpenAI...")
-    formatted_chunks = format_with_openai(text_chunks, video_id)
+    def publish(i: int, formatted_text: str, formatted: bool):
+        group = groups[i]
+        on_segment({'start': group['start'], 'end': group['end'], 'text': formatted_text}, group['size'], formatted)
     
-    # Create final formatted transcript
+    formatted_chunks = format_with_openai(text_chunks, video_id, publish if on_segment else None)
+    
+    return [
+        {'start': group['start'], 'end': group['end'], 'text': formatted_text}
+        for group, formatted_text in zip(groups, formatted_chunks)
+    ]
+
+
+def render_formatted_transcript(transcript_data: Dict, segments: List[Dict]) -> List[str]:
+    """Lay out formatted segments as the text transcript (title, duration, "MM:SS - MM:SS" blocks)"""
     formatted_transcript = []
     formatted_transcript.append(f"Title: {transcript_data[0]['title']}\n")
     formatted_transcript.append(f"Duration: {transcript_data[0]['lengthInSeconds']} seconds\n")
     formatted_transcript.append("="*80 + "\n")
     
-    for i, (group, formatted_text) in enumerate(zip(groups, formatted_chunks)):
-        start_time = format_time(group['start'])
-        end_time = format_time(group['end'])
+    for segment in segments:
+        start_time = format_time(segment['start'])
+        end_time = format_time(segment['end'])
         
         formatted_transcript.append(f"{start_time} - {end_time}\n")
-        formatted_transcript.append(f"{formatted_text}\n\n")
+        formatted_transcript.append(f"{segment['text']}\n\n")
+    
+    return formatted_transcript
+
+
+def create_formatted_transcript(transcript_data: Dict, output_file: str = None, video_id: str = None):
+    """Create formatted transcript with timestamps; written per video unless output_file is given"""
+    if output_file is None:
+        output_file = f"formatted_transcript_{video_id}.txt" if video_id else "formatted_transcript.txt"
+    segments = format_transcript_segments(transcript_data, video_id)
+    formatted_transcript = render_formatted_transcript(transcript_data, segments)
     
     # Save to file
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, Any, Optional
+
+import metrics
+from http_utils import content_hash
+from keyframes import signature_distance
+
+
+NEAR_DUPLICATE_BITS = 6  # dHash bits two frames may differ by and still count as the same picture
+NEAR_DUPLICATE_COLOUR = 16  # Largest mean-colour channel difference for the same picture
+MAX_GROUPS_PER_VIDEO = 500
+MAX_ANSWERS_PER_GROUP = 50
+
+FRAME_CACHE_HITS = metrics.registry.counter("frame_cache_hits_total", "Vision results reused for near-identical frames", ["kind"])
+
+
+def normalize_query(query: str) -> str:
+    """Case- and punctuation-insensitive key for reusing answers to the same question"""
+    return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+
+def answer_key(query: str, context: str) -> str:
+    """The same question about the same picture, asked with the same transcript context"""
+    return f"{normalize_query(query)}\x1f{content_hash(context)}"
+
+
+class FrameAnswerCache:
+    """
+    Perceptual-hash index of extracted frames with reusable vision results.
+
+    Frames of one video whose signatures (dHash plus mean colour, see
+    keyframes.frame_signature) are within NEAR_DUPLICATE_BITS and
+    NEAR_DUPLICATE_COLOUR share a group (e.g. every second of one slide). Each group keeps the
+    vision answers given for it, keyed by normalized question and a hash of
+    the transcript context it was answered with, and optionally
+    a detailed description of the picture. Per-video state is persisted as
+    {video_id}.hashes.json next to the frame files.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self._videos: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.root_dir, f"{os.path.basename(video_id)}.hashes.json")
+
+    def _load(self, video_id: str) -> Dict[str, Any]:
+        """Per-video state, loaded from disk on first use. Caller holds the lock."""
+        state = self._videos.get(video_id)
+        if state is None:
+            state = {"frames": {}, "groups": []}
+            path = self._path(video_id)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Ignoring unreadable frame hash cache {path}: {e}")
+            self._videos[video_id] = state
+        return state
+
+    def _save(self, video_id: str) -> None:
+        """Caller holds the lock"""
+        path = self._path(video_id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._videos[video_id], f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save frame hash cache for {video_id}: {e}")
+
+    def frame_signature(self, video_id: str, frame_filename: str) -> Optional[str]:
+        """Signature recorded for an extracted frame file, if any"""
+        with self._lock:
+            return self._load(video_id)["frames"].get(frame_filename)
+
+    def add_frame(self, video_id: str, frame_filename: str, signature: str) -> None:
+        """Record a frame's hash, starting a new group unless a near-identical frame has one"""
+        with self._lock:
+            state = self._load(video_id)
+            state["frames"][frame_filename] = signature
+            group_id = self._find_group(state, signature)
+            if group_id is None:
+                if len(state["groups"]) >= MAX_GROUPS_PER_VIDEO:
+                    # Oldest group makes room; its frames fall back to fresh vision calls
+                    state["groups"].pop(0)
+                state["groups"].append({"signature": signature, "answers": {}, "description": None})
+            self._save(video_id)
+
+    def _find_group(self, state: Dict[str, Any], signature: str) -> Optional[int]:
+        """Closest group within the near-duplicate limits. Caller holds the lock."""
+        best, best_distance = None, None
+        for i, group in enumerate(state["groups"]):
+            bits, colour = signature_distance(signature, group["signature"])
+            if bits <= NEAR_DUPLICATE_BITS and colour <= NEAR_DUPLICATE_COLOUR:
+                if best_distance is None or (bits, colour) < best_distance:
+                    best, best_distance = i, (bits, colour)
+        return best
+
+    def answer(self, video_id: str, signature: str, query: str, context: str) -> Optional[str]:
+        """Vision answer already given to this question, with this context, for a near-identical frame"""
+        with self._lock:
+            state = self._load(video_id)
+            group_id = self._find_group(state, signature)
+            if group_id is None:
+                return None
+            response = state["groups"][group_id]["answers"].get(answer_key(query, context))
+            if response is not None:
+                FRAME_CACHE_HITS.inc(kind="answer")
+            return response
+
+    def answer_count(self, video_id: str, signature: str) -> int:
+        with self._lock:
+            state = self._load(video_id)
+            group_id = self._find_group(state, signature)
+            return 0 if group_id is None else len(state["groups"][group_id]["answers"])
+
+    def store_answer(self, video_id: str, signature: str, query: str, context: str, response: str) -> None:
+        with self._lock:
+            state = self._load(video_id)
+            group_id = self._find_group(state, signature)
+            if group_id is None:
+                return
+            answers = state["groups"][group_id]["answers"]
+            if len(answers) >= MAX_ANSWERS_PER_GROUP:
+                answers.pop(next(iter(answers)))
+            answers[answer_key(query, context)] = response
+            self._save(video_id)
+
+    def description(self, video_id: str, signature: str) -> Optional[str]:
+        with self._lock:
+            state = self._load(video_id)
+            group_id = self._find_group(state, signature)
+            description = None if group_id is None else state["groups"][group_id]["description"]
+            if description is not None:
+                FRAME_CACHE_HITS.inc(kind="description")
+            return description
+
+    def store_description(self, video_id: str, signature: str, description: str) -> None:
+        with self._lock:
+            state = self._load(video_id)
+            group_id = self._find_group(state, signature)
+            if group_id is not None:
+                state["groups"][group_id]["description"] = description
+                self._save(video_id)
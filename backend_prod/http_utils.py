@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import json
+import os
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is used when brotli is not installed
+    brotli = None
+
+
+MIN_COMPRESS_BYTES = 1024  # Smaller bodies are sent as-is
+
+
+def content_hash(*parts: Any) -> str:
+    """Stable hex digest of the given parts, used as a content version"""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+
+
+def strong_etag(*parts: Any) -> str:
+    """Quoted strong ETag from the given parts (content hashes, versions, query params)"""
+    return f'"{content_hash(*parts)}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if If-None-Match lists etag (or is *)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def choose_encoding(request: Request) -> Optional[str]:
+    """Best content coding the client accepts: br if available, then gzip"""
+    accepted = set()
+    for token in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = token.partition(";")
+        quality = params.strip()
+        try:
+            if quality.startswith("q=") and float(quality[2:]) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def cached_json_response(request: Request, payload: Dict[str, Any], etag: str,
+                         cache_control: str = "no-cache") -> Response:
+    """
+    JSON response with a strong ETag, 304 on If-None-Match, and gzip/brotli.
+
+    Each encoding is a different representation, so it gets its own ETag
+    (suffixed) as strong validators require.
+    """
+    encoding = choose_encoding(request)
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(body) < MIN_COMPRESS_BYTES:
+        encoding = None
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """If-None-Match wins when present; otherwise compare If-Modified-Since to mtime"""
+    if request.headers.get("if-none-match"):
+        return etag_matches(request, etag)
+    since = request.headers.get("if-modified-since")
+    if not since:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def conditional_file_response(request: Request, path: str, media_type: str, cache_control: str,
+                              etag: Optional[str] = None) -> Response:
+    """
+    FileResponse with validators, 304s and cache headers.
+
+    FileResponse already answers Range/If-Range (206/416, multipart for several
+    ranges) by seeking straight to the requested offset, and hands whole-file
+    responses to the server's zero-copy path (ASGI pathsend) where supported.
+    This adds If-None-Match/If-Modified-Since handling and Cache-Control.
+    etag replaces the mtime/size ETag, e.g. with a content version that the
+    same resource also carries when it is generated instead of read from disk.
+    """
+    stat_result = os.stat(path)
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    response = FileResponse(path, media_type=media_type, stat_result=stat_result, headers=headers)
+    if not_modified(request, response.headers["etag"], stat_result.st_mtime):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"],
+            "Last-Modified": response.headers["last-modified"],
+            "Cache-Control": cache_control,
+        })
+    return response
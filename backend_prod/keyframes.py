@@ -0,0 +1,200 @@
+import json
+import os
+from bisect import bisect_right
+from typing import Dict, Any, List, Optional
+
+import cv2
+import numpy as np
+
+
+SAMPLE_INTERVAL = 1.0  # Seconds between sampled frames
+BATCH_SIZE = 64  # Samples compared per vectorized batch
+HIST_BINS = 4  # Per colour channel, so 64-bin colour histograms
+HIST_THRESHOLD = 0.35  # Total-variation distance between histograms that counts as a cut
+HASH_THRESHOLD = 14  # Differing dHash bits (of 64) that count as a cut
+MIN_SCENE_SECONDS = 2.0  # Ignore cuts closer together than this (fades, flicker)
+MAX_SCENE_SECONDS = 120.0  # Force a keyframe after this long without a cut
+THUMBNAIL_WIDTH = 640
+INDEX_FILENAME = "index.json"
+
+
+def dhash_bits(gray_frames: np.ndarray) -> np.ndarray:
+    """64-bit difference hashes for a stack of (N, 8, 9) grayscale frames, as (N, 64) bools"""
+    return (gray_frames[:, :, 1:] > gray_frames[:, :, :-1]).reshape(len(gray_frames), 64)
+
+
+def dhash_small(frame: np.ndarray) -> np.ndarray:
+    """A BGR frame shrunk to the (8, 9) grayscale grid dhash_bits expects"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+
+
+def dhash(frame: np.ndarray) -> int:
+    """64-bit difference hash of one BGR frame"""
+    bits = dhash_bits(dhash_small(frame)[np.newaxis])[0]
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def frame_signature(frame: np.ndarray) -> str:
+    """dHash plus mean BGR colour as hex; dHash alone cannot tell same-layout slides of different colour apart"""
+    mean = np.asarray(cv2.mean(frame)[:3]).round().astype(int)
+    return f"{dhash(frame):016x}" + "".join(f"{channel:02x}" for channel in mean)
+
+
+def signature_distance(a: str, b: str):
+    """(differing dHash bits, largest mean-colour channel difference) between two signatures"""
+    bits = hamming(int(a[:16], 16), int(b[:16], 16))
+    colour = max(abs(int(a[i:i + 2], 16) - int(b[i:i + 2], 16)) for i in range(16, 22, 2))
+    return bits, colour
+
+
+def colour_histograms(small_frames: np.ndarray) -> np.ndarray:
+    """Normalized HIST_BINS^3 colour histograms for a stack of (N, H, W, 3) uint8 frames"""
+    count = len(small_frames)
+    shift = 8 - int(np.log2(HIST_BINS))
+    quantized = (small_frames >> shift).astype(np.int64)
+    bins = (quantized[..., 0] * HIST_BINS + quantized[..., 1]) * HIST_BINS + quantized[..., 2]
+    per_frame = HIST_BINS ** 3
+    offsets = (np.arange(count) * per_frame)[:, None, None]
+    hist = np.bincount((bins + offsets).ravel(), minlength=count * per_frame).reshape(count, per_frame)
+    return hist / hist.sum(axis=1, keepdims=True)
+
+
+def scene_change_scores(hists: np.ndarray, hashes: np.ndarray):
+    """Histogram distance and dHash bit difference between each sample and the one before it"""
+    hist_diff = 0.5 * np.abs(hists[1:] - hists[:-1]).sum(axis=1)
+    hash_diff = (hashes[1:] != hashes[:-1]).sum(axis=1)
+    return hist_diff, hash_diff
+
+
+def _thumbnail(frame: np.ndarray) -> np.ndarray:
+    height, width = frame.shape[:2]
+    if width <= THUMBNAIL_WIDTH:
+        return frame
+    return cv2.resize(frame, (THUMBNAIL_WIDTH, int(height * THUMBNAIL_WIDTH / width)), interpolation=cv2.INTER_AREA)
+
+
+def extract_keyframes(video_path: str, output_dir: str, sample_interval: float = SAMPLE_INTERVAL) -> Dict[str, Any]:
+    """
+    Sample a video every sample_interval seconds and keep the first frame of each scene.
+
+    Frames are decoded sequentially (grab() skips the unsampled ones without
+    converting them) and compared in batches: colour histograms and dHashes are
+    computed for the whole batch with NumPy, and a cut is a large histogram
+    distance or dHash difference from the previous sample. Keyframe thumbnails
+    and index.json are written to output_dir; the index is returned.
+    """
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise RuntimeError(f"Could not open video {video_path}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    keyframes: List[Dict[str, Any]] = []
+    try:
+        fps = video.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, int(round(fps * sample_interval)))
+        previous = None  # (histogram, hash bits) of the last sample of the previous batch
+        last_keyframe_at = None
+        frame_number = 0
+        done = False
+
+        while not done:
+            batch_frames, batch_times = [], []
+            while len(batch_frames) < BATCH_SIZE:
+                if not video.grab():
+                    done = True
+                    break
+                if frame_number % step == 0:
+                    ok, frame = video.retrieve()
+                    if ok:
+                        batch_frames.append(frame)
+                        batch_times.append(frame_number / fps)
+                frame_number += 1
+            if not batch_frames:
+                break
+
+            small = np.stack([cv2.resize(f, (64, 36), interpolation=cv2.INTER_AREA) for f in batch_frames])
+            hists = colour_histograms(small)
+            hashes = dhash_bits(np.stack([dhash_small(f) for f in small]))
+            if previous is not None:
+                hists = np.concatenate([previous[0][None], hists])
+                hashes = np.concatenate([previous[1][None], hashes])
+            hist_diff, hash_diff = scene_change_scores(hists, hashes)
+            if previous is None:
+                # The very first sample always opens a scene
+                hist_diff = np.concatenate([[1.0], hist_diff])
+                hash_diff = np.concatenate([[64], hash_diff])
+
+            for i, timestamp in enumerate(batch_times):
+                is_cut = hist_diff[i] > HIST_THRESHOLD or hash_diff[i] > HASH_THRESHOLD
+                since_last = None if last_keyframe_at is None else timestamp - last_keyframe_at
+                if since_last is None or (is_cut and since_last >= MIN_SCENE_SECONDS) or since_last >= MAX_SCENE_SECONDS:
+                    filename = f"kf_{int(timestamp * 1000):09d}.jpg"
+                    cv2.imwrite(os.path.join(output_dir, filename), _thumbnail(batch_frames[i]), [cv2.IMWRITE_JPEG_QUALITY, 80])
+                    keyframes.append({
+                        "timestamp": round(timestamp, 3),
+                        "thumbnail": filename,
+                        "dhash": f"{int(np.packbits(hashes[-len(batch_times) + i]).view('>u8')[0]):016x}",
+                        "score": round(float(hist_diff[i]), 3),
+                    })
+                    last_keyframe_at = timestamp
+            previous = (hists[-1], hashes[-1])
+
+        index = {
+            "duration": round(frame_number / fps, 3),
+            "sample_interval": sample_interval,
+            "keyframes": keyframes,
+        }
+    finally:
+        video.release()
+
+    tmp_path = os.path.join(output_dir, INDEX_FILENAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(output_dir, INDEX_FILENAME))
+    return index
+
+
+class KeyframeIndex:
+    """Keyframes of one video loaded from index.json, looked up by time without decoding"""
+
+    def __init__(self, directory: str, index: Dict[str, Any]):
+        self.directory = directory
+        self.duration = index.get("duration", 0.0)
+        self.keyframes = index.get("keyframes", [])
+        self.times = [kf["timestamp"] for kf in self.keyframes]
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["KeyframeIndex"]:
+        path = os.path.join(directory, INDEX_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(directory, json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.keyframes)
+
+    def path(self, keyframe: Dict[str, Any]) -> str:
+        return os.path.join(self.directory, keyframe["thumbnail"])
+
+    def scene_at(self, timestamp: float) -> Optional[Dict[str, Any]]:
+        """Keyframe of the scene playing at timestamp"""
+        i = bisect_right(self.times, timestamp) - 1
+        return self.keyframes[max(i, 0)] if self.keyframes else None
+
+    def nearest(self, timestamp: float, count: int = 3) -> List[Dict[str, Any]]:
+        """The count keyframes closest in time to timestamp, in time order"""
+        ranked = sorted(range(len(self.keyframes)), key=lambda i: abs(self.times[i] - timestamp))[:count]
+        return [self.keyframes[i] for i in sorted(ranked)]
+
+    def spread(self, count: int) -> List[Dict[str, Any]]:
+        """count keyframes evenly spaced across the video, for whole-video questions"""
+        if len(self.keyframes) <= count:
+            return list(self.keyframes)
+        positions = np.linspace(0, len(self.keyframes) - 1, count).round().astype(int)
+        return [self.keyframes[i] for i in positions]
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+METADATA_TTL_SECONDS = int(os.environ.get("VIDEO_METADATA_TTL", str(7 * 86400)))  # Served without refresh for this long
+MAX_ENTRIES_IN_MEMORY = 10000
+
+
+def placeholder_title(video_id: str) -> str:
+    """Title shown when none is known; never cached"""
+    return f"YouTube Video ({video_id})"
+
+
+class VideoMetadataCache:
+    """
+    Video titles and basic metadata with stale-while-revalidate semantics.
+
+    Entries are fresh for ttl seconds; after that lookup() still returns them
+    but flags them stale so the caller refreshes in the background. Nothing
+    expires outright, titles almost never change. Entries are stored as one
+    JSON file per video under cache_dir and kept in a bounded in-memory LRU.
+    """
+
+    def __init__(self, cache_dir: str, ttl: int = METADATA_TTL_SECONDS, max_entries: int = MAX_ENTRIES_IN_MEMORY):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{os.path.basename(video_id)}.json")
+
+    def _load(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Caller holds the lock"""
+        entry = self._entries.get(video_id)
+        if entry is None:
+            path = self._path(video_id)
+            if not os.path.exists(path):
+                return None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ignoring unreadable metadata cache entry {path}: {e}")
+                return None
+        self._entries[video_id] = entry
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def lookup(self, video_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(entry, stale); (None, False) when nothing is cached"""
+        with self._lock:
+            entry = self._load(video_id)
+        if entry is None:
+            return None, False
+        return entry, time.time() - entry.get("fetched_at", 0) > self.ttl
+
+    def title(self, video_id: str) -> Optional[str]:
+        entry, _ = self.lookup(video_id)
+        return entry.get("title") if entry else None
+
+    def update(self, video_id: str, source: str, **fields: Any) -> None:
+        """Merge fields (None values ignored) into the entry and mark it fresh"""
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if not fields:
+            return
+        with self._lock:
+            entry = dict(self._load(video_id) or {})
+            entry.update(fields)
+            entry["source"] = source
+            entry["fetched_at"] = time.time()
+            self._entries[video_id] = entry
+            path = self._path(video_id)
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Could not save metadata for {video_id}: {e}")
+
+    def update_from_transcript(self, video_id: str, json_data: Any) -> None:
+        """
+        Prefill from a normalized transcript, whose entry carries title and
+        lengthInSeconds when the provider knows them (providers without a title
+        use the placeholder, which is not cached).
+        """
+        if not json_data or not isinstance(json_data, list):
+            return
+        entry = json_data[0]
+        title = entry.get("title")
+        if not title or title == placeholder_title(video_id):
+            return
+        try:
+            length_seconds = int(float(entry.get("lengthInSeconds")))
+        except (TypeError, ValueError):
+            length_seconds = None
+        self.update(video_id, "transcript", title=title, length_seconds=length_seconds)
@@ -0,0 +1,216 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Latency buckets in seconds, from fast cache hits to long downloads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# USD per 1M tokens as (prompt, completion); unknown models are costed at 0
+OPENAI_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that can go up and down (queue depth, in-flight work)."""
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, series):
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {bucket_count}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Holds every metric so /metrics can render them in one pass."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_DURATION = registry.histogram(
+    "video_pipeline_stage_duration_seconds", "Time spent in each video pipeline stage", ["stage", "outcome"])
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency per endpoint", ["method", "path", "status"])
+OPENAI_REQUEST_DURATION = registry.histogram(
+    "openai_request_duration_seconds", "OpenAI API call latency", ["model", "operation"])
+OPENAI_TOKENS = registry.counter(
+    "openai_tokens_total", "OpenAI tokens used", ["model", "operation", "kind"])
+OPENAI_COST = registry.counter(
+    "openai_estimated_cost_usd_total", "Estimated OpenAI spend in USD", ["model", "operation"])
+OPENAI_ERRORS = registry.counter(
+    "openai_errors_total", "OpenAI calls that raised, including ones refused by the rate limiter or circuit breaker", ["model", "operation"])
+RAPIDAPI_REQUEST_DURATION = registry.histogram(
+    "rapidapi_request_duration_seconds", "RapidAPI call latency", ["host"])
+RAPIDAPI_REQUESTS = registry.counter(
+    "rapidapi_requests_total", "RapidAPI calls by HTTP status", ["host", "status"])
+RAPIDAPI_ERRORS = registry.counter(
+    "rapidapi_errors_total", "RapidAPI calls that failed or returned a non-2xx status", ["host"])
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time a pipeline stage (title_fetch, transcript_fetch, download, ...) into STAGE_DURATION."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage, outcome=outcome)
+
+
+def estimate_openai_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of one call; dated model snapshots use their base model's price."""
+    pricing = OPENAI_PRICING.get(model)
+    if pricing is None:
+        # e.g. "gpt-4o-2024-08-06" -> "gpt-4o"; longest prefix wins so gpt-4o is not priced as gpt-4
+        matches = [name for name in OPENAI_PRICING if model.startswith(name + "-")]
+        if not matches:
+            return 0.0
+        pricing = OPENAI_PRICING[max(matches, key=len)]
+    return (prompt_tokens * pricing[0] + completion_tokens * pricing[1]) / 1_000_000
+
+
+def observe_openai(model: str, operation: str, seconds: float, usage=None) -> None:
+    """Record latency, token usage and estimated cost for one OpenAI call."""
+    OPENAI_REQUEST_DURATION.observe(seconds, model=model, operation=operation)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    OPENAI_TOKENS.inc(prompt_tokens, model=model, operation=operation, kind="prompt")
+    OPENAI_TOKENS.inc(completion_tokens, model=model, operation=operation, kind="completion")
+    # Prompt tokens served from OpenAI's prefix cache (stable prompt prefixes, e.g. video chat)
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    if cached_tokens:
+        OPENAI_TOKENS.inc(cached_tokens, model=model, operation=operation, kind="cached_prompt")
+    OPENAI_COST.inc(estimate_openai_cost(model, prompt_tokens, completion_tokens), model=model, operation=operation)
+
+
+def observe_rapidapi(host: str, seconds: float, status: Optional[int] = None) -> None:
+    """Record one RapidAPI call; status None means the request raised before a response."""
+    RAPIDAPI_REQUEST_DURATION.observe(seconds, host=host)
+    RAPIDAPI_REQUESTS.inc(host=host, status=status if status is not None else "exception")
+    if status is None or not 200 <= status < 300:
+        RAPIDAPI_ERRORS.inc(host=host)
@@ -1,16 +1,82 @@
 import os
+import openai
 from openai import OpenAI
 import base64
 from dotenv import load_dotenv
 import httpx
 from system_prompt import SYSTEM_PROMPT_FORMATTED, SYSTEM_PROMPT_INITIAL
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional
 import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import OPENAI_ERRORS, observe_openai
+from resilience import UpstreamUnavailable, get_upstream, parse_retry_after
 # Removed google.generativeai import - using OpenAI instead
 
 # Load environment variables
 load_dotenv()
 
+# Transcripts longer than this are quizzed section by section in parallel
+QUIZ_SECTION_CHARS = 12000
+QUIZ_MAX_SECTION_WORKERS = 6
+
+# Per-model quota shared by every OpenAI caller in the process
+OPENAI_RATE_PER_SEC = float(os.environ.get("OPENAI_RATE_PER_SEC", "8"))
+OPENAI_BURST = float(os.environ.get("OPENAI_BURST", "16"))
+
+QUIZ_SYSTEM_PROMPT = "You are a quiz generation assistant. Generate only valid JSON responses that match the provided schema exactly."
+
+
+def openai_upstream(model: str):
+    """Shared rate limiter and circuit breaker for one OpenAI model"""
+    return get_upstream(f"openai:{model}", OPENAI_RATE_PER_SEC, OPENAI_BURST)
+
+def is_openai_overload(error: Exception) -> bool:
+    """Errors that mean OpenAI is over quota or unhealthy, as opposed to a bad request"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def guarded_openai_call(model: str, call):
+    """
+    Run call() under the model's rate limiter and circuit breaker.
+
+    Raises UpstreamUnavailable without calling OpenAI when the model is over
+    quota or its circuit is open; 429s, 5xx and connection errors trip the breaker,
+    other errors (bad requests) leave it unchanged.
+    """
+    upstream = openai_upstream(model)
+    upstream.admit()
+    try:
+        result = call()
+    except Exception as e:
+        if is_openai_overload(e):
+            record_openai_overload(model, e)
+        else:
+            upstream.release()
+        raise
+    upstream.record_success()
+    return result
+
+def record_openai_overload(model: str, error: Exception):
+    """Trip the model's circuit breaker for an overload error, honouring its Retry-After"""
+    response = getattr(error, "response", None)
+    openai_upstream(model).record_failure(parse_retry_after(response.headers.get("retry-after")) if response is not None else None)
+
+def create_chat_completion(client, operation: str, **kwargs):
+    """Call chat.completions.create and record latency, tokens and cost under `operation`"""
+    start = time.perf_counter()
+    response = None
+    try:
+        response = guarded_openai_call(kwargs["model"], lambda: client.chat.completions.create(**kwargs))
+        return response
+    except Exception:
+        OPENAI_ERRORS.inc(model=kwargs["model"], operation=operation)
+        raise
+    finally:
+        observe_openai(kwargs["model"], operation, time.perf_counter() - start, getattr(response, "usage", None))
+
 class OpenAIVisionClient:
     def __init__(self):
         """Initialize the OpenAI client with API key from environment variables"""
@@ -40,7 +106,8 @@ class OpenAIVisionClient:
                 {"role": "user", "content": f"Context: {context}\n\nQuestion: {prompt}"}
             ]
 
-            response = self.client.chat.completions.create(
+            response = create_chat_completion(
+                self.client, "ask_text_only",
                 model="gpt-3.5-turbo",
                 messages=messages,
                 max_tokens=1000,  # Increased for detailed responses
@@ -48,10 +115,46 @@ class OpenAIVisionClient:
             )
             
             return response.choices[0].message.content
+        except UpstreamUnavailable:
+            # Callers answer 503 + Retry-After instead of an "Error:" reply
+            raise
         except Exception as e:
             return f"Error: {str(e)}"
         
         
+    def ask_in_conversation(self, prompt, context, history):
+        """
+        Ask a follow-up question in a video chat.
+
+        The system prompt and transcript context come first and unchanged on
+        every turn, so OpenAI's prompt caching reuses that prefix; the compressed
+        history and the new question follow it.
+        """
+        try:
+            has_timestamps = any(":" in line and " - " in line for line in context.split('\n') if line.strip())
+            system_prompt = SYSTEM_PROMPT_FORMATTED if has_timestamps else SYSTEM_PROMPT_INITIAL
+
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Context: {context}"},
+                {"role": "assistant", "content": "I have read the transcript. What would you like to know?"},
+                *history,
+                {"role": "user", "content": prompt}
+            ]
+
+            response = create_chat_completion(
+                self.client, "ask_in_conversation",
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.3
+            )
+            return response.choices[0].message.content
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            return f"Error: {str(e)}"
+
     def ask_with_image(self, prompt, image_path, context=""):
         """Ask a question with both text prompt and image with the appropriate system prompt"""
         try:
@@ -67,7 +170,8 @@ class OpenAIVisionClient:
             # Encode the image
             base64_image = self._encode_image(image_path)
             
-            response = self.client.chat.completions.create(
+            response = create_chat_completion(
+                self.client, "ask_with_image",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -90,13 +194,16 @@ class OpenAIVisionClient:
                 max_tokens=1000  # Increased for detailed responses
             )
             return response.choices[0].message.content
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return f"Error: {str(e)}"
     
     def ask_with_image_url(self, prompt, image_url):
         """Ask a question with a text prompt and an image URL"""
         try:
-            response = self.client.chat.completions.create(
+            response = create_chat_completion(
+                self.client, "ask_with_image_url",
                 model=self.model,
                 messages=[
                     {
@@ -118,6 +225,71 @@ class OpenAIVisionClient:
                 max_tokens=500
             )
             return response.choices[0].message.content
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def describe_frame(self, image_path):
+        """Detailed, question-independent description of a video frame, reusable for later questions"""
+        try:
+            response = create_chat_completion(
+                self.client, "describe_frame",
+                model=self.model,
+                messages=[{
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Describe this video frame in detail so that questions about it can be answered without seeing it. Transcribe all visible text, code and formulas exactly, and describe diagrams, charts, people and layout."
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": f"data:image/jpeg;base64,{self._encode_image(image_path)}"}
+                        }
+                    ]
+                }],
+                max_tokens=1000
+            )
+            return response.choices[0].message.content
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def ask_with_keyframes(self, prompt, image_paths, context=""):
+        """Ask a question about several video keyframes (sent at low detail) plus the transcript"""
+        try:
+            has_timestamps = False
+            if context and isinstance(context, str):
+                has_timestamps = any(":" in line and " - " in line for line in context.split('\n') if line.strip())
+            system_prompt = SYSTEM_PROMPT_FORMATTED if has_timestamps else SYSTEM_PROMPT_INITIAL
+
+            content = [{
+                "type": "text",
+                "text": f"Context (Video Transcript): {context}\n\nThe images are keyframes from the video, one per scene, in time order. Use them together with the transcript to answer the following question: {prompt}"
+            }]
+            for image_path in image_paths:
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{self._encode_image(image_path)}",
+                        "detail": "low"  # Fixed small token cost per keyframe
+                    }
+                })
+
+            response = create_chat_completion(
+                self.client, "ask_with_keyframes",
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": content}
+                ],
+                max_tokens=1000
+            )
+            return response.choices[0].message.content
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return f"Error: {str(e)}"
 
@@ -134,59 +306,219 @@ class OpenAIQuizClient:
         difficulty: str = "medium",
         include_explanations: bool = True,
         language: str = "en",
+        sectioned: Optional[bool] = None,
     ) -> Dict[str, Any]:
         """
         Generate a quiz as structured JSON from a transcript.
 
+        Long transcripts (or sectioned=True) are split into sections that are
+        quizzed concurrently and merged, see generate_quiz_sectioned.
+
         Returns a dict following the response schema.
         """
         if not transcript or not transcript.strip():
             raise ValueError("Transcript is empty")
 
-        # JSON Schema for structured output
-        response_schema: Dict[str, Any] = {
-            "type": "object",
-            "properties": {
-                "metadata": {
-                    "type": "object",
-                    "properties": {
-                        "video_context_excerpt": {"type": "string"},
-                        "num_questions": {"type": "integer"},
-                        "difficulty": {"type": "string"},
-                        "language": {"type": "string"},
-                    },
-                    "required": [
-                        "num_questions",
-                        "difficulty",
-                        "language",
-                    ],
-                },
-                "quiz": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "id": {"type": "string"},
-                            "difficulty": {"type": "string"},
-                            "question": {"type": "string"},
-                            "options": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "minItems": 3,
-                                "maxItems": 5
-                            },
-                            "answer": {
-                                "type": "string"
-                            },
-                            "explanation": {"type": "string"},
-                        },
-                        "required": ["id", "question", "options", "answer"],
-                    },
-                },
-            },
-            "required": ["quiz", "metadata"],
-        }
+        if sectioned is None:
+            sectioned = len(transcript) > QUIZ_SECTION_CHARS
+        if sectioned:
+            return self.generate_quiz_sectioned(
+                transcript,
+                num_questions=num_questions,
+                difficulty=difficulty,
+                include_explanations=include_explanations,
+                language=language,
+            )
+
+        try:
+            data = self._request_quiz(transcript, num_questions, difficulty, include_explanations, language)
+
+            # Enrich metadata if missing
+            self._enrich_metadata(data, transcript, num_questions, difficulty, language)
+
+            # Best-effort normalization to ensure MCQ-only with answers present
+            quiz_items = data.get("quiz", []) if isinstance(data, dict) else []
+            if isinstance(data, dict):
+                data["quiz"] = normalize_quiz_items(quiz_items)
+            return data
 
+        except Exception as e:
+            print(f"Error generating quiz: {e}")
+            raise
+
+    def generate_quiz_sectioned(
+        self,
+        transcript: str,
+        num_questions: int = 5,
+        difficulty: str = "medium",
+        include_explanations: bool = True,
+        language: str = "en",
+        section_chars: int = QUIZ_SECTION_CHARS,
+        max_workers: int = QUIZ_MAX_SECTION_WORKERS,
+    ) -> Dict[str, Any]:
+        """
+        Generate a quiz by quizzing transcript sections in parallel.
+
+        Each section gets its share of the questions (plus one spare for
+        deduplication); results are merged round-robin across sections so
+        coverage stays balanced, deduplicated, and trimmed to num_questions.
+        Latency is bounded by the slowest section rather than total length.
+        """
+        if not transcript or not transcript.strip():
+            raise ValueError("Transcript is empty")
+
+        sections = split_transcript_sections(transcript, section_chars, max_sections=num_questions)
+        quotas = _section_quotas(num_questions, len(sections))
+        print(f"Generating sectioned quiz: {len(sections)} sections, quotas {quotas}")
+
+        section_items: List[List[Dict[str, Any]]] = [[] for _ in sections]
+        unavailable: Optional[UpstreamUnavailable] = None
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(sections))) as executor:
+            futures = {
+                executor.submit(
+                    self._request_quiz, section, quota + 1, difficulty, include_explanations, language
+                ): index
+                for index, (section, quota) in enumerate(zip(sections, quotas))
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    data = future.result()
+                    items = data.get("quiz", []) if isinstance(data, dict) else []
+                    section_items[index] = normalize_quiz_items(items)
+                except UpstreamUnavailable as e:
+                    unavailable = e
+                    print(f"Skipping quiz section {index + 1}: {e}")
+                except Exception as e:
+                    # A failed section costs coverage, not the whole quiz
+                    print(f"Error generating quiz for section {index + 1}: {e}")
+
+        if not any(section_items):
+            if unavailable is not None:
+                raise unavailable
+            raise RuntimeError("Quiz generation failed for every transcript section")
+
+        merged = merge_quiz_sections(section_items, num_questions)
+        for index, item in enumerate(merged):
+            item["id"] = f"q{index+1}"
+
+        data: Dict[str, Any] = {"quiz": merged, "metadata": {"sections": len(sections)}}
+        self._enrich_metadata(data, transcript, num_questions, difficulty, language)
+        return data
+
+    def stream_quiz(
+        self,
+        transcript: str,
+        num_questions: int = 5,
+        difficulty: str = "medium",
+        include_explanations: bool = True,
+        language: str = "en",
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Generate a quiz and yield each normalized item as soon as it is complete.
+
+        Each completion is streamed and fed to a QuizStreamParser, so the first
+        question is available long before the full JSON body has arrived. Long
+        transcripts are quizzed section by section, one after another, with
+        the quotas of generate_quiz_sectioned; near-duplicates are skipped.
+        """
+        if not transcript or not transcript.strip():
+            raise ValueError("Transcript is empty")
+
+        if len(transcript) > QUIZ_SECTION_CHARS:
+            sections = split_transcript_sections(transcript, max_sections=num_questions)
+        else:
+            sections = [transcript]
+        quotas = _section_quotas(num_questions, len(sections))
+
+        emitted: List[Dict[str, Any]] = []
+        unavailable: Optional[UpstreamUnavailable] = None
+        for index, (section, quota) in enumerate(zip(sections, quotas)):
+            section_count = 0
+            # A spare question per section makes up for a dropped duplicate
+            requested = quota + 1 if len(sections) > 1 else quota
+            items = self._stream_quiz_section(section, requested, difficulty, include_explanations, language)
+            try:
+                for item in items:
+                    if not merge_quiz_sections([[item]], 1, exclude=emitted):
+                        continue
+                    item["id"] = f"q{len(emitted)+1}"
+                    emitted.append(item)
+                    yield item
+                    section_count += 1
+                    if section_count >= quota:
+                        break
+            except Exception as e:
+                if len(sections) == 1:
+                    raise
+                # A failed section costs coverage, not the whole quiz
+                if isinstance(e, UpstreamUnavailable):
+                    unavailable = e
+                print(f"Error streaming quiz for section {index + 1}: {e}")
+            finally:
+                # Stop the section's completion once its quota is met
+                items.close()
+
+        if len(sections) > 1 and not emitted:
+            if unavailable is not None:
+                raise unavailable
+            raise RuntimeError("Quiz generation failed for every transcript section")
+
+    def _stream_quiz_section(
+        self,
+        transcript: str,
+        num_questions: int,
+        difficulty: str,
+        include_explanations: bool,
+        language: str,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream one quiz completion, yielding normalized items; the upstream stream is always closed."""
+        full_prompt = self._build_prompt(transcript, num_questions, difficulty, include_explanations, language)
+        start = time.perf_counter()
+        stream = None
+        parser = QuizStreamParser()
+        try:
+            stream = guarded_openai_call(self.model, lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": QUIZ_SYSTEM_PROMPT},
+                    {"role": "user", "content": full_prompt}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=4000,
+                temperature=0.3,
+                stream=True,
+                stream_options={"include_usage": True}
+            ))
+            for chunk in stream:
+                if chunk.usage is not None:
+                    # Final chunk carries usage for the whole stream
+                    observe_openai(self.model, "quiz_stream", time.perf_counter() - start, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    for item in parser.feed(delta):
+                        yield item
+        except Exception as e:
+            OPENAI_ERRORS.inc(model=self.model, operation="quiz_stream")
+            # Overload after the request was admitted (a dropped or failed stream) counts against the breaker too
+            if stream is not None and is_openai_overload(e):
+                record_openai_overload(self.model, e)
+            raise
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def _build_prompt(
+        self,
+        transcript: str,
+        num_questions: int,
+        difficulty: str,
+        include_explanations: bool,
+        language: str,
+    ) -> str:
+        """Build the full quiz prompt (instruction + authoring guidelines + transcript)."""
         instruction = (
             "You are generating quizzes for Vidya AI, an app that helps learners study YouTube videos. "
             "Use ONLY the provided transcript as ground truth. Do not invent facts. "
@@ -216,74 +548,237 @@ class OpenAIQuizClient:
             + transcript
         )
 
-        try:
-            # Create the full prompt
-            full_prompt = instruction + "\n" + prompt
-            
-            # Generate content using OpenAI with structured output
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a quiz generation assistant. Generate only valid JSON responses that match the provided schema exactly."},
-                    {"role": "user", "content": full_prompt}
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=4000,
-                temperature=0.3
-            )
+        return instruction + "\n" + prompt
 
-            # Parse JSON text
-            text = response.choices[0].message.content
-            if not text:
-                raise RuntimeError("Empty response from OpenAI")
+    def _request_quiz(
+        self,
+        transcript: str,
+        num_questions: int,
+        difficulty: str,
+        include_explanations: bool,
+        language: str,
+    ) -> Dict[str, Any]:
+        """Run one quiz completion and return the parsed (un-normalized) JSON."""
+        full_prompt = self._build_prompt(transcript, num_questions, difficulty, include_explanations, language)
+
+        # Generate content using OpenAI with structured output
+        response = create_chat_completion(
+            self.client, "quiz",
+            model=self.model,
+            messages=[
+                {"role": "system", "content": QUIZ_SYSTEM_PROMPT},
+                {"role": "user", "content": full_prompt}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=4000,
+            temperature=0.3
+        )
 
-            try:
-                data = json.loads(text)
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}")
-                print(f"Raw response: {text}")
-                raise
+        # Parse JSON text
+        text = response.choices[0].message.content
+        if not text:
+            raise RuntimeError("Empty response from OpenAI")
 
-            # Enrich metadata if missing
-            data.setdefault("metadata", {})
-            data["metadata"].setdefault("num_questions", num_questions)
-            data["metadata"].setdefault("difficulty", difficulty)
-            data["metadata"].setdefault("language", language)
-            excerpt = transcript[:500]
-            data["metadata"].setdefault("video_context_excerpt", excerpt)
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            print(f"JSON decode error: {e}")
+            print(f"Raw response: {text}")
+            raise
 
-            # Best-effort normalization to ensure MCQ-only with answers present
-            quiz_items = data.get("quiz", []) if isinstance(data, dict) else []
-            normalized_items = []
-            for index, item in enumerate(quiz_items):
-                if not isinstance(item, dict):
-                    continue
-                # Ensure id
-                item.setdefault("id", f"q{index+1}")
-                # Ensure options list
-                options = item.get("options") or []
-                if not isinstance(options, list):
-                    options = [str(options)]
-                item["options"] = [str(opt) for opt in options]
-                # Ensure answer present and is string
-                answer = item.get("answer")
-                if isinstance(answer, bool):
-                    # convert boolean to string option if any matches, otherwise stringify
-                    answer = str(answer)
-                if isinstance(answer, list):
-                    answer = answer[0] if answer else ""
-                if answer is None:
-                    # If missing, attempt to infer by heuristic (do nothing reliable); mark empty
-                    answer = ""
-                item["answer"] = str(answer)
-                normalized_items.append(item)
-            if isinstance(data, dict):
-                data["quiz"] = normalized_items
-            return data
+    @staticmethod
+    def _enrich_metadata(
+        data: Dict[str, Any],
+        transcript: str,
+        num_questions: int,
+        difficulty: str,
+        language: str,
+    ) -> None:
+        """Fill in metadata fields the model left out."""
+        data.setdefault("metadata", {})
+        data["metadata"].setdefault("num_questions", num_questions)
+        data["metadata"].setdefault("difficulty", difficulty)
+        data["metadata"].setdefault("language", language)
+        excerpt = transcript[:500]
+        data["metadata"].setdefault("video_context_excerpt", excerpt)
+
+
+def normalize_quiz_item(item: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Normalize one quiz item: ensure id, string options and a string answer."""
+    # Ensure id
+    item.setdefault("id", f"q{index+1}")
+    # Ensure options list
+    options = item.get("options") or []
+    if not isinstance(options, list):
+        options = [str(options)]
+    item["options"] = [str(opt) for opt in options]
+    # Ensure answer present and is string
+    answer = item.get("answer")
+    if isinstance(answer, bool):
+        # convert boolean to string option if any matches, otherwise stringify
+        answer = str(answer)
+    if isinstance(answer, list):
+        answer = answer[0] if answer else ""
+    if answer is None:
+        # If missing, attempt to infer by heuristic (do nothing reliable); mark empty
+        answer = ""
+    item["answer"] = str(answer)
+    return item
+
+
+class QuizStreamParser:
+    """
+    Incremental parser that pulls complete items out of a streamed quiz JSON body.
+
+    Text is fed as it arrives; every object inside the top-level "quiz" array is
+    decoded and normalized once its closing brace is seen. Scanning state is kept
+    between calls, so each character is looked at only once.
+    """
 
-        except Exception as e:
-            print(f"Error generating quiz: {e}")
-            raise
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string = None  # Most recent complete string token (candidate key)
+        self._quiz_depth = None  # Depth inside the "quiz" array once it is found
+        self._item_start = None
+        self._emitted = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume more text and return the quiz items completed by it."""
+        self._buffer += text
+        items = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start:self._pos]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos + 1
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._quiz_depth is None and self._depth == 2 and self._last_string == "quiz":
+                    self._quiz_depth = self._depth
+                elif char == "{" and self._quiz_depth is not None and self._depth == self._quiz_depth + 1:
+                    self._item_start = self._pos
+            elif char in "}]":
+                if char == "}" and self._item_start is not None and self._depth == self._quiz_depth + 1:
+                    item = self._decode(buffer[self._item_start:self._pos + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._item_start = None
+                elif char == "]" and self._depth == self._quiz_depth:
+                    self._quiz_depth = -1  # Array closed; ignore anything after it
+                self._depth -= 1
+            self._pos += 1
+        return items
+
+    def _decode(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            print(f"Skipping undecodable streamed quiz item: {e}")
+            return None
+        if not isinstance(item, dict):
+            return None
+        item = normalize_quiz_item(item, self._emitted)
+        self._emitted += 1
+        return item
+
+
+def normalize_quiz_items(quiz_items: List[Any]) -> List[Dict[str, Any]]:
+    """Best-effort normalization to ensure MCQ-only items with answers present"""
+    normalized_items = []
+    for index, item in enumerate(quiz_items):
+        if not isinstance(item, dict):
+            continue
+        normalized_items.append(normalize_quiz_item(item, index))
+    return normalized_items
+
+
+def split_transcript_sections(transcript: str, section_chars: int = QUIZ_SECTION_CHARS, max_sections: int = 0) -> List[str]:
+    """
+    Split a transcript into roughly equal sections, breaking on sentence ends.
+
+    The section count is derived from section_chars and capped at max_sections
+    (when > 0) so every section can get at least one question.
+    """
+    transcript = transcript.strip()
+    num_sections = max(1, -(-len(transcript) // max(section_chars, 1)))
+    if max_sections > 0:
+        num_sections = min(num_sections, max_sections)
+    if num_sections == 1:
+        return [transcript]
+
+    target = len(transcript) / num_sections
+    sections = []
+    start = 0
+    for n in range(1, num_sections):
+        cut = int(target * n)
+        # Prefer the nearest sentence end after the cut, then any whitespace
+        window = transcript[cut:cut + 500]
+        match = re.search(r"[.!?]\s", window) or re.search(r"\s", window)
+        if match:
+            cut += match.end()
+        if cut <= start:
+            continue
+        sections.append(transcript[start:cut].strip())
+        start = cut
+    sections.append(transcript[start:].strip())
+    return [section for section in sections if section]
+
+
+def _section_quotas(num_questions: int, num_sections: int) -> List[int]:
+    """Spread num_questions as evenly as possible over num_sections."""
+    base, extra = divmod(num_questions, num_sections)
+    return [base + (1 if i < extra else 0) for i in range(num_sections)]
+
+
+def _question_key(item: Dict[str, Any]) -> frozenset:
+    """Word set of a question, used for near-duplicate detection."""
+    return frozenset(re.findall(r"[a-z0-9]+", item.get("question", "").lower()))
+
+
+def merge_quiz_sections(
+    section_items: List[List[Dict[str, Any]]],
+    num_questions: int,
+    similarity: float = 0.8,
+    exclude: Optional[List[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Merge per-section quiz items round-robin, dropping near-duplicate questions.
+
+    Two questions are duplicates when the Jaccard similarity of their word sets
+    is at least `similarity`; items duplicating anything in `exclude` are dropped
+    too. Round-robin order keeps coverage balanced when the result is trimmed
+    to num_questions.
+    """
+    merged: List[Dict[str, Any]] = []
+    seen: List[frozenset] = [key for key in map(_question_key, exclude or []) if key]
+    queues = [list(items) for items in section_items]
+    while len(merged) < num_questions and any(queues):
+        for queue in queues:
+            if not queue or len(merged) >= num_questions:
+                continue
+            item = queue.pop(0)
+            key = _question_key(item)
+            if not key:
+                continue
+            if any(len(key & other) / len(key | other) >= similarity for other in seen):
+                continue
+            seen.append(key)
+            merged.append(item)
+    return merged
 
 # Sample American Civil War transcript for testing
 AMERICAN_CIVIL_WAR_TRANSCRIPT = """
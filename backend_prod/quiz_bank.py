@@ -0,0 +1,139 @@
+import json
+import os
+import random
+import threading
+from typing import Dict, Any, List, Optional
+
+from ml_models import merge_quiz_sections
+
+
+# Questions kept per (video, difficulty, language) bank
+QUIZ_BANK_SIZE = 20
+# Refill once fewer than this many questions have never been served (only while the bank is not full)
+QUIZ_BANK_LOW_WATERMARK = 5
+# Generation calls per bank before background refills stop (e.g. when the model keeps returning duplicates)
+QUIZ_BANK_MAX_FILLS = 3
+
+
+class QuizBank:
+    """
+    Persisted pool of pre-generated quiz questions per video, difficulty and language.
+
+    Banks are stored as one JSON file each under `bank_dir` and cached in memory.
+    Quizzes are served by sampling the least-served questions with shuffled
+    option order, so repeated quiz opens do not hit the model. A bank holds at
+    most bank_size questions; once full it is not refilled, and questions
+    rotate by served count instead.
+    """
+
+    def __init__(self, bank_dir: str, bank_size: int = QUIZ_BANK_SIZE, low_watermark: int = QUIZ_BANK_LOW_WATERMARK,
+                 max_fills: int = QUIZ_BANK_MAX_FILLS):
+        self.bank_dir = bank_dir
+        self.bank_size = bank_size
+        self.low_watermark = low_watermark
+        self.max_fills = max_fills
+        self._banks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(bank_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(video_id: str, difficulty: str, language: str) -> str:
+        return f"{video_id}_{difficulty}_{language}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.bank_dir, f"{key}.json")
+
+    def _load(self, key: str) -> Dict[str, Any]:
+        """Return the bank for key, reading it from disk on first access. Caller holds the lock."""
+        bank = self._banks.get(key)
+        if bank is None:
+            bank = {"questions": []}
+            path = self._path(key)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        bank = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Ignoring unreadable quiz bank {path}: {e}")
+            self._banks[key] = bank
+        return bank
+
+    def _save(self, key: str, bank: Dict[str, Any]) -> None:
+        """Atomically write a bank to disk. Caller holds the lock."""
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(bank, f)
+        os.replace(tmp_path, path)
+
+    def size(self, video_id: str, difficulty: str, language: str) -> int:
+        """Number of questions in the bank."""
+        with self._lock:
+            return len(self._load(self._key(video_id, difficulty, language))["questions"])
+
+    def add_questions(self, video_id: str, difficulty: str, language: str, questions: List[Dict[str, Any]],
+                      min_capacity: int = 0) -> int:
+        """
+        Add newly generated questions, skipping near-duplicates of banked ones,
+        then trim the bank to max(bank_size, min_capacity) questions by dropping
+        the most-served. Returns how many were added.
+        """
+        key = self._key(video_id, difficulty, language)
+        with self._lock:
+            bank = self._load(key)
+            existing = bank["questions"]
+            added = merge_quiz_sections([questions], len(questions), exclude=existing)
+            for question in added:
+                question["served"] = 0
+            merged = existing + added
+            overflow = len(merged) - max(self.bank_size, min_capacity)
+            if overflow > 0:
+                dropped = set(sorted(range(len(merged)), key=lambda i: -merged[i].get("served", 0))[:overflow])
+                merged = [q for i, q in enumerate(merged) if i not in dropped]
+            bank["questions"] = merged
+            bank["fills"] = bank.get("fills", 0) + 1
+            self._save(key, bank)
+            return len(added)
+
+    def needs_refill(self, video_id: str, difficulty: str, language: str, num_questions: int = 0) -> bool:
+        """
+        True when the bank cannot serve num_questions (up to bank_size), or is
+        not yet full and running out of unseen questions. Full banks, and banks
+        filled max_fills times, are not refilled.
+        """
+        with self._lock:
+            bank = self._load(self._key(video_id, difficulty, language))
+            questions = bank["questions"]
+            if len(questions) < min(max(num_questions, 1), self.bank_size):
+                return True
+            if len(questions) >= self.bank_size or bank.get("fills", 0) >= self.max_fills:
+                return False
+            return sum(1 for q in questions if not q.get("served")) < self.low_watermark
+
+    def sample(self, video_id: str, difficulty: str, language: str, num_questions: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Draw num_questions from the bank, least-served first, with options shuffled.
+
+        Returns None when the bank holds fewer than num_questions questions.
+        """
+        key = self._key(video_id, difficulty, language)
+        with self._lock:
+            bank = self._load(key)
+            questions = bank["questions"]
+            if len(questions) < num_questions:
+                return None
+
+            # Random order within each served-count tier
+            order = sorted(range(len(questions)), key=lambda i: (questions[i].get("served", 0), random.random()))
+            picked = []
+            for index in order[:num_questions]:
+                questions[index]["served"] = questions[index].get("served", 0) + 1
+                item = {k: v for k, v in questions[index].items() if k != "served"}
+                # The answer is the option text, so shuffling options keeps it valid
+                item["options"] = random.sample(item["options"], len(item["options"]))
+                picked.append(item)
+            self._save(key, bank)
+
+        for index, item in enumerate(picked):
+            item["id"] = f"q{index+1}"
+        return picked
@@ -2,8 +2,9 @@ import os
 import re
 import requests
 from fastapi import HTTPException
-import time
-import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
 
 
 def download_youtube_video(youtube_url):
@@ -43,23 +44,10 @@ def download_youtube_video(youtube_url):
         print(f"Download URL: {download_url}")
         print(f"Downloading...")
         
-        # Try multiple download strategies
         filename = f"{video_id}.mp4"
         
-        # Strategy 1: Basic download with proper headers
-        success = download_with_headers(download_url, filename)
-        
-        if not success:
-            print("Basic download failed, trying with session...")
-            # Strategy 2: Use session with cookies
-            success = download_with_session(download_url, filename)
-            
-        if not success:
-            print("Session download failed, trying with proxy headers...")
-            # Strategy 3: Mimic browser more closely
-            success = download_with_browser_mimicking(download_url, filename)
-            
-        if not success:
+        # Probe all strategies in parallel and download with the first that gets through
+        if not download_with_fastest_strategy(download_url, filename):
             raise Exception("All download strategies failed")
         
         print(f"***********Downloaded video to: {filename}*******************")
@@ -69,120 +57,135 @@ def download_youtube_video(youtube_url):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def download_with_headers(download_url, filename):
-    """Download with proper headers to mimic a browser"""
+def headers_session():
+    """Strategy 1: plain request with browser headers"""
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Encoding': 'identity',  # Don't use gzip to avoid issues
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'none',
+        'Referer': 'https://www.youtube.com/',
+    })
+    return session
+
+
+def cookie_session():
+    """Strategy 2: session that first picks up YouTube cookies"""
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': '*/*',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'identity',
+        'Connection': 'keep-alive',
+        'Referer': 'https://www.youtube.com/',
+    })
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'identity',  # Don't use gzip to avoid issues
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Referer': 'https://www.youtube.com/',
-        }
-        
-        with requests.get(download_url, headers=headers, stream=True, timeout=30) as video_response:
-            video_response.raise_for_status()
-            
-            with open(filename, 'wb') as f:
-                for chunk in video_response.iter_content(chunk_size=1024*1024):
-                    if chunk:
-                        f.write(chunk)
-                        f.flush()
-            
-            # Verify file size
-            file_size = os.path.getsize(filename)
-            if file_size < 10000:
-                os.remove(filename) if os.path.exists(filename) else None
-                return False
-            
-            return True
-            
-    except Exception as e:
-        print(f"Download with headers failed: {str(e)}")
-        os.remove(filename) if os.path.exists(filename) else None
-        return False
+        session.get('https://www.youtube.com/', timeout=PROBE_TIMEOUT)
+    except Exception:
+        pass  # Continue even if this fails
+    return session
+
 
+def browser_session():
+    """Strategy 3: extensive browser mimicking"""
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'identity',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'Pragma': 'no-cache',
+        'Referer': 'https://www.youtube.com/',
+        'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+        'Sec-Ch-Ua-Mobile': '?0',
+        'Sec-Ch-Ua-Platform': '"Linux"',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'cross-site',
+        'Sec-Fetch-User': '?1',
+        'Upgrade-Insecure-Requests': '1',
+    })
+    return session
 
-def download_with_session(download_url, filename):
-    """Download using a session with cookies"""
+
+# Tried in this order when nothing is known about a host
+DOWNLOAD_STRATEGIES = {
+    "headers": headers_session,
+    "session": cookie_session,
+    "browser": browser_session,
+}
+
+PROBE_TIMEOUT = 10  # Seconds for a probe's connect and first byte
+DOWNLOAD_TIMEOUT = (10, 120)  # Connect, read timeout for the committed download
+PROBE_RANGE = 'bytes=0-1023'
+
+# CDN host -> strategy that last got through, so repeat downloads skip the race
+winning_strategies = {}
+winning_strategies_lock = threading.Lock()
+
+
+def probe_strategy(name, download_url, cancelled):
+    """Open a session for one strategy and check it with a 1 KB ranged request; returns the session or None"""
+    session = DOWNLOAD_STRATEGIES[name]()
+    if cancelled.is_set():
+        session.close()
+        return None
     try:
-        session = requests.Session()
-        
-        # Set headers
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': '*/*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'identity',
-            'Connection': 'keep-alive',
-            'Referer': 'https://www.youtube.com/',
-        })
-        
-        # First, make a request to YouTube to get cookies
-        try:
-            session.get('https://www.youtube.com/', timeout=10)
-            time.sleep(random.uniform(1, 3))  # Random delay
-        except:
-            pass  # Continue even if this fails
-        
-        with session.get(download_url, stream=True, timeout=60) as video_response:
-            video_response.raise_for_status()
-            
-            with open(filename, 'wb') as f:
-                for chunk in video_response.iter_content(chunk_size=1024*1024):
-                    if chunk:
-                        f.write(chunk)
-                        f.flush()
-            
-            # Verify file size
-            file_size = os.path.getsize(filename)
-            if file_size < 10000:
-                os.remove(filename) if os.path.exists(filename) else None
-                return False
-            
-            return True
-            
+        with session.get(download_url, headers={'Range': PROBE_RANGE}, stream=True, timeout=PROBE_TIMEOUT) as response:
+            if response.status_code in (200, 206):
+                return session
+            print(f"Probe for strategy {name} got HTTP {response.status_code}")
     except Exception as e:
-        print(f"Download with session failed: {str(e)}")
-        os.remove(filename) if os.path.exists(filename) else None
-        return False
+        print(f"Probe for strategy {name} failed: {str(e)}")
+    session.close()
+    return None
 
 
-def download_with_browser_mimicking(download_url, filename):
-    """Download with extensive browser mimicking"""
+def close_losing_probe(future):
+    """Close the session of a probe that also succeeded after the race was decided"""
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result().close()
+
+
+def race_strategies(download_url, names):
+    """
+    Probe the given strategies in parallel and return (name, session) for the first
+    that answers 200/206, or (None, None). Losing probes are cancelled or discarded.
+    """
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(names))
+    futures = {executor.submit(probe_strategy, name, download_url, cancelled): name for name in names}
+    winner, winning_session = None, None
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'identity',
-            'Cache-Control': 'no-cache',
-            'Connection': 'keep-alive',
-            'Pragma': 'no-cache',
-            'Referer': 'https://www.youtube.com/',
-            'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-            'Sec-Ch-Ua-Mobile': '?0',
-            'Sec-Ch-Ua-Platform': '"Linux"',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'cross-site',
-            'Sec-Fetch-User': '?1',
-            'Upgrade-Insecure-Requests': '1',
-        }
-        
-        # Add random delay to avoid rate limiting
-        time.sleep(random.uniform(2, 5))
-        
-        with requests.get(download_url, headers=headers, stream=True, timeout=120) as video_response:
-            if video_response.status_code == 403:
-                print(f"Still getting 403. Response headers: {dict(video_response.headers)}")
-                return False
-                
+        for future in as_completed(futures):
+            session = future.result()
+            if session is not None:
+                winner, winning_session = futures[future], session
+                break
+    finally:
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+        for future, name in futures.items():
+            if name != winner:
+                future.add_done_callback(close_losing_probe)
+        executor.shutdown(wait=False)
+    return winner, winning_session
+
+
+def download_with_session(session, download_url, filename):
+    """Stream the whole file with an already probed session; returns True on success"""
+    try:
+        with session.get(download_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as video_response:
             video_response.raise_for_status()
             
             with open(filename, 'wb') as f:
@@ -190,7 +193,6 @@ def download_with_browser_mimicking(download_url, filename):
                 for chunk in video_response.iter_content(chunk_size=1024*1024):
                     if chunk:
                         f.write(chunk)
-                        f.flush()
                         downloaded += len(chunk)
                         if downloaded % (10*1024*1024) == 0:  # Print progress every 10MB
                             print(f"Downloaded: {downloaded / (1024*1024):.1f} MB")
@@ -206,9 +208,48 @@ def download_with_browser_mimicking(download_url, filename):
             return True
             
     except Exception as e:
-        print(f"Download with browser mimicking failed: {str(e)}")
+        print(f"Download failed: {str(e)}")
         os.remove(filename) if os.path.exists(filename) else None
         return False
+    finally:
+        session.close()
+
+
+def download_with_fastest_strategy(download_url, filename):
+    """
+    Download with whichever strategy gets through first.
+
+    The strategy that last worked for this CDN host is tried alone first;
+    otherwise (or if it stops working) the remaining strategies are probed
+    in parallel and the download commits to the first one that answers.
+    """
+    host = urlsplit(download_url).netloc
+    with winning_strategies_lock:
+        remembered = winning_strategies.get(host)
+
+    remaining = list(DOWNLOAD_STRATEGIES)
+    if remembered:
+        remaining.remove(remembered)
+        session = DOWNLOAD_STRATEGIES[remembered]()
+        print(f"Using strategy {remembered} that last worked for {host}")
+        if download_with_session(session, download_url, filename):
+            return True
+        print(f"Strategy {remembered} no longer works for {host}, racing the others")
+        with winning_strategies_lock:
+            winning_strategies.pop(host, None)
+
+    while remaining:
+        winner, session = race_strategies(download_url, remaining)
+        if winner is None:
+            return False
+        print(f"Strategy {winner} won the probe race for {host}")
+        if download_with_session(session, download_url, filename):
+            with winning_strategies_lock:
+                winning_strategies[host] = winner
+            return True
+        # Probe passed but the full download failed; race what is left
+        remaining.remove(winner)
+    return False
 
 
 def extract_youtube_id(url: str) -> str:
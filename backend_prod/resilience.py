@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import metrics
+
+
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "2.0"))  # Seconds a caller may queue for a token
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+CIRCUIT_STATE = metrics.registry.gauge("upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["upstream"])
+UPSTREAM_REJECTED = metrics.registry.counter("upstream_rejected_total", "Upstream calls refused locally before being sent", ["upstream", "reason"])
+UPSTREAM_FAILURES = metrics.registry.counter("upstream_failures_total", "Upstream calls counted as failures by the circuit breaker", ["upstream"])
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was refused locally; retry_after is a suggested wait in seconds."""
+
+    def __init__(self, upstream: str, retry_after: int, reason: str):
+        super().__init__(f"{upstream} unavailable ({reason}), retry in {retry_after}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class RateLimited(UpstreamUnavailable):
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(upstream, retry_after, "rate limited")
+
+
+class CircuitOpen(UpstreamUnavailable):
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(upstream, retry_after, "circuit open")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, up to `burst` banked.
+
+    Callers reserve a token and sleep until it is theirs, so concurrent callers
+    are spaced out instead of all retrying at once. A reservation that would
+    wait longer than max_wait is refused instead of blocking the thread.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token; returns seconds to wait before using it, or None if that exceeds max_wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate if self._tokens < 0 else 0.0, self._paused_until - now)
+            if wait > max_wait:
+                self._tokens += 1
+                return None
+            return wait
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for `seconds`, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; open -> half-open
+    after `reset_timeout` seconds, when `half_open_probes` calls are let through.
+    A successful probe closes the circuit, a failed one re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS, half_open_probes: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = "closed"
+        self._failures = 0
+        self._probes = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, upstream=name)
+
+    def allow(self) -> None:
+        """Admit a call or raise CircuitOpen"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now < self._retry_at:
+                    raise CircuitOpen(self.name, max(1, int(self._retry_at - now + 0.999)))
+                self._set_state("half_open")
+                self._probes = 0
+            if self.state == "half_open":
+                if self._probes >= self.half_open_probes:
+                    raise CircuitOpen(self.name, max(1, int(self.reset_timeout)))
+                self._probes += 1
+
+    def release(self) -> None:
+        """Give back a probe slot for a call that was admitted but never sent"""
+        with self._lock:
+            if self.state == "half_open" and self._probes:
+                self._probes -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self.state != "closed":
+                print(f"Circuit for {self.name} closed")
+                self._set_state("closed")
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        """Count a failure; retry_after (e.g. from a 429) stretches how long the circuit stays open"""
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self._retry_at = time.monotonic() + max(self.reset_timeout, retry_after or 0)
+                if self.state != "open":
+                    print(f"Circuit for {self.name} opened after {self._failures} failures")
+                self._set_state("open")
+
+    def _set_state(self, state: str) -> None:
+        """Caller holds the lock"""
+        self.state = state
+        CIRCUIT_STATE.set(CIRCUIT_STATES[state], upstream=self.name)
+
+
+class Upstream:
+    """
+    Rate limiter plus circuit breaker for one upstream (a RapidAPI host or an OpenAI model).
+
+    Call admit() before each request, then record_success() or
+    record_failure() with the outcome, or release() when the outcome says
+    nothing about the upstream's health (e.g. a 400). admit() may sleep up to
+    max_wait for a token, so call it from worker threads, never the event
+    loop; it raises UpstreamUnavailable instead of queueing for long, so
+    callers can fail fast or serve a degraded response.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name)
+
+    def admit(self, max_wait: float = RATE_LIMIT_MAX_WAIT) -> None:
+        wait = self._reserve(max_wait)
+        if wait:
+            time.sleep(wait)
+
+    def record_success(self) -> None:
+        self.breaker.record_success()
+
+    def release(self) -> None:
+        """Leave the breaker as it is, giving back a half-open probe slot"""
+        self.breaker.release()
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        UPSTREAM_FAILURES.inc(upstream=self.name)
+        if retry_after:
+            self.bucket.pause(retry_after)
+        self.breaker.record_failure(retry_after)
+
+    def _reserve(self, max_wait: float) -> float:
+        try:
+            self.breaker.allow()
+        except CircuitOpen:
+            UPSTREAM_REJECTED.inc(upstream=self.name, reason="circuit_open")
+            raise
+        wait = self.bucket.reserve(max_wait)
+        if wait is None:
+            self.breaker.release()
+            UPSTREAM_REJECTED.inc(upstream=self.name, reason="rate_limited")
+            raise RateLimited(self.name, max(1, int(max_wait + 0.999)))
+        return wait
+
+
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name: str, rate: float, burst: float) -> Upstream:
+    """Shared Upstream for `name`, created with rate/burst on first use"""
+    with _upstreams_lock:
+        upstream = _upstreams.get(name)
+        if upstream is None:
+            upstream = _upstreams[name] = Upstream(name, rate, burst)
+        return upstream
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header in delta-seconds form; HTTP dates are ignored"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
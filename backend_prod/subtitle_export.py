@@ -0,0 +1,108 @@
+import html
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+SUBTITLE_MEDIA_TYPES = {
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "json": "application/json",
+}
+SUBTITLE_EXPORT_VERSION = 1  # Bump when the generated output changes, so stored exports are regenerated
+MAX_CUE_CHARS = 84  # About two subtitle lines; longer (formatted) segments are split
+MIN_CUE_SECONDS = 0.5
+
+
+def cues_from_transcription(transcription: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Cues from raw subtitles ({start, dur, subtitle}). Auto-generated captions
+    overlap their successor, so each cue ends where the next one starts.
+    """
+    cues = []
+    items = [item for item in transcription if (item.get("subtitle") or "").strip()]
+    for i, item in enumerate(items):
+        start = float(item["start"])
+        end = start + float(item.get("dur") or 0)
+        if i + 1 < len(items):
+            next_start = float(items[i + 1]["start"])
+            if next_start > start:
+                end = min(end, next_start)
+        cues.append({"start": start, "end": max(end, start + MIN_CUE_SECONDS),
+                     "text": html.unescape(" ".join(item["subtitle"].split()))})
+    return cues
+
+
+def split_cue(segment: Dict[str, Any], max_chars: int = MAX_CUE_CHARS) -> List[Dict[str, Any]]:
+    """
+    Split a segment whose text is too long to show at once into cues at word
+    boundaries, sharing its time span in proportion to their length.
+    """
+    text = " ".join(segment["text"].split())
+    if len(text) <= max_chars:
+        return [{"start": segment["start"], "end": segment["end"], "text": text}]
+    pieces, current = [], ""
+    for word in text.split(" "):
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+
+    start, end = float(segment["start"]), float(segment["end"])
+    total = sum(len(piece) for piece in pieces)
+    cues, offset = [], 0
+    for piece in pieces:
+        cue_start = start + (end - start) * offset / total
+        offset += len(piece)
+        cues.append({"start": cue_start, "end": start + (end - start) * offset / total, "text": piece})
+    return cues
+
+
+def cues_from_segments(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cues from formatted segments ({start, end, text})"""
+    return [cue for segment in segments if segment["text"].strip() for cue in split_cue(segment)]
+
+
+def timestamp(seconds: float, decimal_separator: str) -> str:
+    """HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (WebVTT)"""
+    millis = int(round(max(seconds, 0.0) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal_separator}{millis:03d}"
+
+
+def iter_srt(cues: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for i, cue in enumerate(cues, start=1):
+        yield f"{i}\n{timestamp(cue['start'], ',')} --> {timestamp(cue['end'], ',')}\n{cue['text']}\n\n"
+
+
+def iter_vtt(cues: Iterable[Dict[str, Any]], title: Optional[str] = None) -> Iterator[str]:
+    yield f"WEBVTT - {' '.join(title.split())}\n\n" if title else "WEBVTT\n\n"
+    for cue in cues:
+        # "-->" would end the cue timing line early; < and & start markup
+        text = cue["text"].replace("&", "&amp;").replace("<", "&lt;").replace("-->", "->")
+        yield f"{timestamp(cue['start'], '.')} --> {timestamp(cue['end'], '.')}\n{text}\n\n"
+
+
+def iter_json(cues: Iterable[Dict[str, Any]], header: Dict[str, Any]) -> Iterator[str]:
+    """{**header, "segments": [...]} written one segment at a time"""
+    opening = json.dumps(header, ensure_ascii=False, separators=(",", ":"))[:-1]
+    yield opening + (',"segments":[' if header else '"segments":[')
+    for i, cue in enumerate(cues):
+        segment = {"start": round(cue["start"], 3), "end": round(cue["end"], 3), "text": cue["text"]}
+        yield ("," if i else "") + json.dumps(segment, ensure_ascii=False, separators=(",", ":"))
+    yield "]}"
+
+
+def iter_subtitles(fmt: str, cues: Iterable[Dict[str, Any]], header: Dict[str, Any]) -> Iterator[str]:
+    """Subtitle file in fmt (a key of SUBTITLE_MEDIA_TYPES), generated cue by cue"""
+    if fmt == "srt":
+        return iter_srt(cues)
+    if fmt == "vtt":
+        return iter_vtt(cues, header.get("title"))
+    if fmt == "json":
+        return iter_json(cues, header)
+    raise ValueError(f"Unsupported subtitle format: {fmt}")
@@ -0,0 +1,73 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional
+
+from format_transcript import format_time
+
+
+# Seconds of transcript on each side of a timestamp used as image-query context
+DEFAULT_WINDOW_BEFORE = 45.0
+DEFAULT_WINDOW_AFTER = 30.0
+
+
+class TranscriptIndex:
+    """
+    Interval index over transcript segments for "what was said around time T".
+
+    Segments are kept sorted by start time in parallel arrays. Subtitles overlap,
+    so a lookup bisects on start and steps back by the longest segment duration
+    (usually a few seconds) to catch segments that began earlier but are still
+    running. Lookups cost O(log n + k) for k returned segments.
+    """
+
+    def __init__(self, segments: List[Dict[str, Any]]):
+        ordered = sorted(segments, key=lambda s: s["start"])
+        self.starts = [float(s["start"]) for s in ordered]
+        self.ends = [float(s["end"]) for s in ordered]
+        self.texts = [s["text"] for s in ordered]
+        self.max_duration = max((end - start for start, end in zip(self.starts, self.ends)), default=0.0)
+
+    @classmethod
+    def from_transcript_json(cls, json_data: Any) -> Optional["TranscriptIndex"]:
+        """Build from the normalized transcript model ([{transcription: [{subtitle, start, dur}]}])"""
+        if not json_data or not isinstance(json_data, list):
+            return None
+        transcription = json_data[0].get("transcription") or []
+        if not transcription:
+            return None
+        return cls([
+            {"start": s["start"], "end": s["start"] + s["dur"], "text": s["subtitle"]}
+            for s in transcription
+        ])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def duration(self) -> float:
+        return max(self.ends, default=0.0)
+
+    def range(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """Segments overlapping [start, end], in time order"""
+        lo = bisect_left(self.starts, start - self.max_duration)
+        hi = bisect_right(self.starts, end)
+        return [
+            {"start": self.starts[i], "end": self.ends[i], "text": self.texts[i]}
+            for i in range(lo, hi)
+            if self.ends[i] >= start
+        ]
+
+    def at(self, timestamp: float) -> List[Dict[str, Any]]:
+        """Segments being spoken at timestamp"""
+        return self.range(timestamp, timestamp)
+
+    def window(self, timestamp: float, before: float = DEFAULT_WINDOW_BEFORE,
+               after: float = DEFAULT_WINDOW_AFTER) -> List[Dict[str, Any]]:
+        return self.range(max(0.0, timestamp - before), timestamp + after)
+
+    def window_text(self, timestamp: float, before: float = DEFAULT_WINDOW_BEFORE,
+                    after: float = DEFAULT_WINDOW_AFTER) -> str:
+        """The window as "MM:SS - MM:SS" blocks, the same layout as formatted transcripts"""
+        return "\n".join(
+            f"{format_time(s['start'])} - {format_time(s['end'])}\n{s['text']}"
+            for s in self.window(timestamp, before, after)
+        )
@@ -0,0 +1,261 @@
+import html
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Tuple
+
+from youtube_transcript_api import YouTubeTranscriptApi
+
+import metrics
+from resilience import UpstreamUnavailable
+from youtube_utils import download_transcript_api, download_transcript_api1
+
+
+# Hedge after this long until a provider has enough samples for its own p90
+DEFAULT_HEDGE_DELAY = float(os.environ.get("TRANSCRIPT_HEDGE_DELAY", "2.0"))
+MIN_HEDGE_DELAY = 0.2
+MIN_SAMPLES_FOR_P90 = 10
+LATENCY_WINDOW = 200  # Recent successful fetches kept per provider
+TRANSCRIPT_FETCH_TIMEOUT = float(os.environ.get("TRANSCRIPT_FETCH_TIMEOUT", "60"))
+
+TRANSCRIPT_PROVIDER_DURATION = metrics.registry.histogram(
+    "transcript_provider_duration_seconds", "Transcript fetch latency per provider", ["provider", "outcome"])
+TRANSCRIPT_HEDGES = metrics.registry.counter(
+    "transcript_hedges_total", "Extra transcript requests started because the previous one was slow or failed", ["provider", "reason"])
+TRANSCRIPT_WINS = metrics.registry.counter(
+    "transcript_provider_wins_total", "Transcript fetches answered by each provider", ["provider"])
+
+transcript_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="transcript")
+
+
+def build_transcript(video_id: str, segments: List[Dict[str, Any]], title: Optional[str] = None,
+                     length_seconds: Optional[Any] = None, extra: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    The one transcript model every provider is normalized to.
+
+    It is the youtube-transcriptor response shape the rest of the backend already
+    reads: a one-element list whose entry has title, lengthInSeconds,
+    transcription ([{subtitle, start, dur}], seconds) and transcriptionAsText.
+    """
+    if length_seconds is None:
+        length_seconds = int(max((s["start"] + s["dur"] for s in segments), default=0))
+    entry = dict(extra or {})
+    entry.update({
+        "title": title or f"YouTube Video ({video_id})",
+        "lengthInSeconds": str(length_seconds),
+        "transcription": segments,
+        "transcriptionAsText": " ".join(s["subtitle"] for s in segments),
+    })
+    return [entry]
+
+
+def _segment(text: Any, start: Any, dur: Any) -> Dict[str, Any]:
+    return {"subtitle": html.unescape(str(text)).replace("\n", " ").strip(), "start": float(start), "dur": float(dur)}
+
+
+class TranscriptProvider(ABC):
+    """One way of getting a transcript. fetch returns the normalized model or None."""
+
+    name = "provider"
+
+    @abstractmethod
+    def fetch(self, video_id: str) -> Optional[List[Dict[str, Any]]]:
+        ...
+
+
+class TranscriptorProvider(TranscriptProvider):
+    """youtube-transcriptor on RapidAPI (download_transcript_api); already in model shape"""
+
+    name = "transcriptor"
+
+    def fetch(self, video_id):
+        transcript_text, json_data = download_transcript_api(video_id)
+        if not transcript_text or not json_data:
+            return None
+        entry = json_data[0]
+        segments = [_segment(s["subtitle"], s["start"], s["dur"]) for s in entry.get("transcription", [])]
+        extra = {key: value for key, value in entry.items() if key not in ("transcription", "transcriptionAsText")}
+        data = build_transcript(video_id, segments, entry.get("title"), entry.get("lengthInSeconds"), extra)
+        # Keep the provider's own text; it is what queries have always used
+        data[0]["transcriptionAsText"] = transcript_text
+        return data
+
+
+class Transcript3Provider(TranscriptProvider):
+    """youtube-transcript3 on RapidAPI (download_transcript_api1): [{text, offset, duration}]"""
+
+    name = "transcript3"
+
+    def fetch(self, video_id):
+        items = download_transcript_api1(video_id)
+        if not items:
+            return None
+        return build_transcript(video_id, [_segment(i["text"], i["offset"], i["duration"]) for i in items])
+
+
+class YouTubeTranscriptApiProvider(TranscriptProvider):
+    """youtube_transcript_api straight against YouTube: [{text, start, duration}]"""
+
+    name = "youtube_transcript_api"
+
+    def fetch(self, video_id):
+        if hasattr(YouTubeTranscriptApi, "get_transcript"):
+            items = YouTubeTranscriptApi.get_transcript(video_id, languages=["en"])
+        else:
+            # youtube-transcript-api >= 1.0
+            items = YouTubeTranscriptApi().fetch(video_id, languages=["en"]).to_raw_data()
+        if not items:
+            return None
+        return build_transcript(video_id, [_segment(i["text"], i["start"], i["duration"]) for i in items])
+
+
+class ProviderStats:
+    """Recent latency and success rate for one provider"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.successes += 1
+                self.latencies.append(seconds)
+            else:
+                self.failures += 1
+
+    def success_rate(self) -> float:
+        # Laplace-smoothed so a new provider starts at 0.5 rather than 0 or 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES_FOR_P90:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def hedge_delay(self) -> float:
+        p90 = self.percentile(90)
+        return DEFAULT_HEDGE_DELAY if p90 is None else max(MIN_HEDGE_DELAY, p90)
+
+    def expected_cost(self) -> float:
+        """Median latency inflated by failure rate; lower is tried first"""
+        p50 = self.percentile(50)
+        return (p50 if p50 is not None else DEFAULT_HEDGE_DELAY) / self.success_rate()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "success_rate": round(self.success_rate(), 3),
+            "p50_seconds": self.percentile(50),
+            "p90_seconds": self.percentile(90),
+        }
+
+
+class HedgedTranscriptFetcher:
+    """
+    Fetch a transcript from the best provider, hedging with the next one when slow.
+
+    Providers are ordered by expected cost (recent median latency over success
+    rate). The first is started immediately; if it has not answered within its
+    own p90 latency, or fails, the next provider is started too. The first
+    non-empty result wins and the slower requests are left to finish in the
+    background, still feeding the latency stats.
+    """
+
+    def __init__(self, providers: List[TranscriptProvider], executor: ThreadPoolExecutor = transcript_executor):
+        self.providers = providers
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats() for p in providers}
+        self.executor = executor
+
+    def ranked_providers(self) -> List[TranscriptProvider]:
+        return sorted(self.providers, key=lambda p: self.stats[p.name].expected_cost())
+
+    def fetch(self, video_id: str, timeout: float = TRANSCRIPT_FETCH_TIMEOUT) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """Normalized transcript and the provider that supplied it, or (None, None) if all failed"""
+        pending_providers = self.ranked_providers()
+        running = {}
+        unavailable: Optional[UpstreamUnavailable] = None
+        deadline = time.monotonic() + timeout
+
+        def start_next(reason: Optional[str]) -> float:
+            """Start the next provider; returns when to hedge it"""
+            provider = pending_providers.pop(0)
+            if reason:
+                TRANSCRIPT_HEDGES.inc(provider=provider.name, reason=reason)
+                print(f"Transcript hedge for {video_id}: starting {provider.name} ({reason})")
+            running[self.executor.submit(self._timed_fetch, provider, video_id)] = provider
+            return time.monotonic() + self.stats[provider.name].hedge_delay()
+
+        hedge_at = start_next(None)
+        while running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait_for = min(hedge_at, deadline) - now if pending_providers else deadline - now
+            done, _ = wait(list(running), timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            if not done:
+                if pending_providers and time.monotonic() >= hedge_at:
+                    hedge_at = start_next("slow")
+                continue
+            for future in done:
+                provider = running.pop(future)
+                try:
+                    data = future.result()
+                except UpstreamUnavailable as e:
+                    unavailable = e
+                    data = None
+                except Exception as e:
+                    print(f"Transcript provider {provider.name} failed for {video_id}: {e}")
+                    data = None
+                if data:
+                    TRANSCRIPT_WINS.inc(provider=provider.name)
+                    return data, provider.name
+            if not running and pending_providers:
+                hedge_at = start_next("failed")
+
+        if unavailable is not None and not running:
+            # Every provider was refused locally; let callers answer 503 / degrade
+            raise unavailable
+        return None, None
+
+    def _timed_fetch(self, provider: TranscriptProvider, video_id: str):
+        start = time.perf_counter()
+        try:
+            data = provider.fetch(video_id)
+        except UpstreamUnavailable:
+            # Refused before any request was sent; says nothing about the provider's latency
+            raise
+        except Exception:
+            self._record(provider, time.perf_counter() - start, False)
+            raise
+        self._record(provider, time.perf_counter() - start, bool(data))
+        return data
+
+    def _record(self, provider: TranscriptProvider, seconds: float, ok: bool) -> None:
+        self.stats[provider.name].record(seconds, ok)
+        TRANSCRIPT_PROVIDER_DURATION.observe(seconds, provider=provider.name, outcome="ok" if ok else "error")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+transcript_fetcher = HedgedTranscriptFetcher([TranscriptorProvider(), Transcript3Provider(), YouTubeTranscriptApiProvider()])
+
+
+def fetch_transcript(video_id: str) -> Tuple[Optional[str], Any]:
+    """
+    Hedged drop-in for download_transcript_api: (plain text, normalized JSON) or (None, {}).
+    """
+    data, provider = transcript_fetcher.fetch(video_id)
+    if not data:
+        return None, {}
+    print(f"Transcript for {video_id} served by {provider}")
+    return data[0]["transcriptionAsText"], data
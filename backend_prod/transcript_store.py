@@ -0,0 +1,95 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+MAX_OPEN_MAPS = 64  # Memory maps kept open; pages are file-backed so the kernel can drop them under pressure
+
+
+class TranscriptStore:
+    """
+    Content-addressed files for formatted transcripts.
+
+    put() writes each distinct content once, as {root}/{digest[:2]}/{digest}{suffix},
+    and returns the digest; callers keep only that reference. Reads go through
+    read-only memory maps, so nothing is held in Python objects between reads,
+    but read_text()/read_json() still copy and decode the content each call;
+    only path(), which lets HTTP responses send the file itself
+    (sendfile/pathsend), avoids the copy. Files are immutable: same digest, same bytes.
+    """
+
+    def __init__(self, root_dir: str, max_open_maps: int = MAX_OPEN_MAPS):
+        self.root_dir = root_dir
+        self.max_open_maps = max_open_maps
+        self._maps: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, ref: str) -> str:
+        """File holding ref; ref is "<digest><suffix>" as returned by put()"""
+        ref = os.path.basename(ref)
+        return os.path.join(self.root_dir, ref[:2], ref)
+
+    def put(self, data: bytes, suffix: str = ".txt") -> str:
+        """Store bytes (no-op if already stored) and return their reference"""
+        ref = self.digest(data) + suffix
+        path = self.path(ref)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return ref
+
+    def put_text(self, text: str) -> str:
+        return self.put(text.encode("utf-8"), ".txt")
+
+    def put_json(self, value: Any) -> str:
+        return self.put(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), ".json")
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self.path(ref))
+
+    def _map(self, ref: str) -> Optional[mmap.mmap]:
+        """Open (or reuse) a read-only map of ref; None for empty content. Caller holds the lock."""
+        mapped = self._maps.get(ref)
+        if mapped is not None:
+            self._maps.move_to_end(ref)
+            return mapped
+        with open(self.path(ref), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[ref] = mapped
+        while len(self._maps) > self.max_open_maps:
+            _, old = self._maps.popitem(last=False)
+            old.close()
+        return mapped
+
+    def read_bytes(self, ref: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        # Sliced under the lock so eviction never closes a map mid-read
+        with self._lock:
+            mapped = self._map(ref)
+            return mapped[start:end] if mapped is not None else b""
+
+    def read_text(self, ref: str) -> str:
+        return self.read_bytes(ref).decode("utf-8")
+
+    def read_json(self, ref: str) -> Any:
+        return json.loads(self.read_bytes(ref))
+
+    def size(self, ref: str) -> int:
+        return os.path.getsize(self.path(ref))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"open_maps": len(self._maps), "mapped_bytes": sum(len(m) for m in self._maps.values())}
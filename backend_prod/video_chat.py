@@ -0,0 +1,131 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from http_utils import content_hash
+
+
+FULL_TURNS = 3  # Most recent exchanges sent verbatim
+DIGEST_TURNS = 12  # Older exchanges kept as one-line digests; anything older is dropped
+DIGEST_ANSWER_CHARS = 240
+MAX_CHAT_SESSIONS = 2000
+CHAT_IDLE_SECONDS = 3600
+
+
+def digest_answer(answer: str, limit: int = DIGEST_ANSWER_CHARS) -> str:
+    """First sentences of an answer, without markdown, up to about limit characters"""
+    text = re.sub(r"[#*_`>|]+", "", answer)
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(". ", 0, limit)
+    return text[:cut + 1] if cut > limit // 2 else text[:limit].rstrip() + "..."
+
+
+class VideoChat:
+    """
+    One conversation about one video.
+
+    context is the transcript chosen on the first turn and kept byte-identical
+    afterwards, so every turn's prompt starts with the same prefix (system
+    prompt + context) and OpenAI's prompt cache can reuse it. turns holds the
+    question/answer pairs still sent (history() compresses them); turn_count
+    counts every turn, including ones trimmed from turns.
+    """
+
+    def __init__(self, session_id: str, video_id: str, context: str, context_source: str):
+        self.session_id = session_id
+        self.video_id = video_id
+        self.context = context
+        self.context_source = context_source
+        self.context_version = content_hash(context)
+        self.turns: List[Dict[str, Any]] = []
+        self.turn_count = 0
+        self.updated_at = time.time()
+        self.lock = threading.Lock()
+
+    def set_context(self, context: str, context_source: str) -> None:
+        """Replace the context (e.g. once the formatted transcript is ready); costs one cache miss"""
+        self.context = context
+        self.context_source = context_source
+        self.context_version = content_hash(context)
+
+    def history(self) -> List[Dict[str, str]]:
+        """
+        Earlier turns as chat messages: older ones folded into one digest
+        message, the last FULL_TURNS verbatim. Size is bounded however long
+        the conversation gets.
+        """
+        messages = []
+        older = self.turns[:-FULL_TURNS][-DIGEST_TURNS:] if len(self.turns) > FULL_TURNS else []
+        if older:
+            lines = [f"Q: {t['query']}\nA: {digest_answer(t['response'])}" for t in older]
+            messages.append({"role": "user", "content": "Earlier in this conversation:\n\n" + "\n\n".join(lines)})
+            messages.append({"role": "assistant", "content": "Noted."})
+        for turn in self.turns[-FULL_TURNS:]:
+            messages.append({"role": "user", "content": turn["question"]})
+            messages.append({"role": "assistant", "content": turn["response"]})
+        return messages
+
+    def add_turn(self, query: str, question: str, response: str, timestamp: Optional[float]) -> None:
+        """query is what the user typed; question is what was sent (with any time window)"""
+        self.turns.append({"query": query, "question": question, "response": response, "timestamp": timestamp})
+        self.turn_count += 1
+        # Only the digested tail is ever sent; don't keep more than that in memory
+        del self.turns[:-(FULL_TURNS + DIGEST_TURNS)]
+        self.updated_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "video_id": self.video_id,
+            "context_source": self.context_source,
+            "context_version": self.context_version,
+            "turn_count": self.turn_count,
+            "turns": [{"query": t["query"], "response": t["response"], "timestamp": t["timestamp"]} for t in self.turns],
+        }
+
+
+class VideoChatStore:
+    """(session_id, video_id) -> VideoChat, an LRU bounded in size that forgets idle chats"""
+
+    def __init__(self, max_sessions: int = MAX_CHAT_SESSIONS, idle_seconds: int = CHAT_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._chats: "OrderedDict[Tuple[str, str], VideoChat]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, video_id: str) -> Optional[VideoChat]:
+        with self._lock:
+            self._expire()
+            chat = self._chats.get((session_id, video_id))
+            if chat is not None:
+                self._chats.move_to_end((session_id, video_id))
+            return chat
+
+    def create(self, session_id: Optional[str], video_id: str, context: str, context_source: str) -> VideoChat:
+        chat = VideoChat(session_id or uuid.uuid4().hex, video_id, context, context_source)
+        with self._lock:
+            self._chats[(chat.session_id, video_id)] = chat
+            while len(self._chats) > self.max_sessions:
+                self._chats.popitem(last=False)
+        return chat
+
+    def delete(self, session_id: str, video_id: str) -> bool:
+        with self._lock:
+            return self._chats.pop((session_id, video_id), None) is not None
+
+    def _expire(self) -> None:
+        """Caller holds the lock. Least recently used first, so stop at the first fresh one."""
+        cutoff = time.time() - self.idle_seconds
+        while self._chats:
+            key, chat = next(iter(self._chats.items()))
+            if chat.updated_at >= cutoff:
+                break
+            del self._chats[key]
+
+    def __len__(self) -> int:
+        return len(self._chats)
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+import metrics
+
+
+DEFAULT_QUOTA_BYTES = 10 * 1024 ** 3  # 10 GiB
+INDEX_FILENAME = ".index.json"
+PARTIAL_DOWNLOAD_SUFFIX = ".part"  # Downloads in progress: {video_id}.mp4.part, renamed when complete
+INDEX_SAVE_INTERVAL = 30.0  # Seconds between index writes caused only by reads
+
+VIDEO_STORE_BYTES = metrics.registry.gauge("video_store_bytes", "Bytes of downloaded video kept on disk")
+VIDEO_STORE_FILES = metrics.registry.gauge("video_store_files", "Downloaded videos kept on disk")
+VIDEO_STORE_EVICTIONS = metrics.registry.counter("video_store_evictions_total", "Videos deleted to stay under the disk quota", ["policy"])
+
+
+class VideoStore:
+    """
+    Managed directory of downloaded videos with a byte quota and LRU/LFU eviction.
+
+    Files are stored as {video_id}.mp4 under root_dir; downloads are written
+    to {video_id}.mp4.part and renamed when complete. Access statistics are
+    persisted next to them so hot videos survive restarts, and the index is
+    rebuilt from disk on startup. Videos pinned with `in_use` (e.g. during frame
+    extraction) are never evicted.
+    """
+
+    def __init__(self, root_dir: str, quota_bytes: int = DEFAULT_QUOTA_BYTES, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.root_dir = root_dir
+        self.quota_bytes = quota_bytes
+        self.policy = policy
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._last_save = 0.0
+        os.makedirs(root_dir, exist_ok=True)
+
+    def path_for(self, video_id: str) -> str:
+        """Where the video for video_id lives (or will be downloaded to)"""
+        return os.path.join(self.root_dir, f"{video_id}.mp4")
+
+    def scan(self) -> int:
+        """
+        Rebuild the index from the files on disk, keeping saved access stats.
+        Leftover partial downloads (from a crash) are deleted. Returns the file count.
+        """
+        saved = {}
+        index_path = os.path.join(self.root_dir, INDEX_FILENAME)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ignoring unreadable video index {index_path}: {e}")
+
+        with self._lock:
+            self._entries = {}
+            for name in os.listdir(self.root_dir):
+                path = os.path.join(self.root_dir, name)
+                if name.endswith(PARTIAL_DOWNLOAD_SUFFIX):
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"Could not remove partial download {path}: {e}")
+                    continue
+                if not name.endswith(".mp4"):
+                    continue
+                video_id = name[:-len(".mp4")]
+                stat = os.stat(path)
+                entry = saved.get(video_id, {})
+                self._entries[video_id] = {
+                    "size": stat.st_size,
+                    "last_access": entry.get("last_access", stat.st_mtime),
+                    "hits": entry.get("hits", 0),
+                }
+            self._save_index(force=True)
+            self._enforce_quota()
+            return len(self._entries)
+
+    def get(self, video_id: str) -> Optional[str]:
+        """Path of a stored video, recording the access; None if it is not on disk"""
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return None
+            path = self.path_for(video_id)
+            if not os.path.exists(path):
+                # Deleted behind our back
+                del self._entries[video_id]
+                self._update_gauges()
+                return None
+            entry["last_access"] = time.time()
+            entry["hits"] += 1
+            self._save_index()
+            return path
+
+    def __contains__(self, video_id: str) -> bool:
+        with self._lock:
+            return video_id in self._entries and os.path.exists(self.path_for(video_id))
+
+    def add(self, video_id: str, path: str) -> str:
+        """Register a finished download, moving it into the store if needed, then enforce the quota"""
+        target = self.path_for(video_id)
+        if os.path.abspath(path) != os.path.abspath(target):
+            os.replace(path, target)
+        with self._lock:
+            self._entries[video_id] = {
+                "size": os.path.getsize(target),
+                "last_access": time.time(),
+                "hits": 1,
+            }
+            self._enforce_quota(keep=video_id)
+            self._save_index(force=True)
+        return target
+
+    @contextmanager
+    def in_use(self, video_id: str):
+        """Pin a video so eviction skips it while the block runs"""
+        with self._lock:
+            self._pins[video_id] = self._pins.get(video_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[video_id] -= 1
+                if not self._pins[video_id]:
+                    del self._pins[video_id]
+            # Pinned videos may have held the store over quota
+            self.enforce_quota()
+
+    def enforce_quota(self) -> int:
+        """Evict videos until the store fits its quota. Returns bytes freed."""
+        with self._lock:
+            freed = self._enforce_quota()
+            if freed:
+                self._save_index(force=True)
+            return freed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": sum(entry["size"] for entry in self._entries.values()),
+                "quota_bytes": self.quota_bytes,
+                "policy": self.policy,
+                "pinned": sorted(self._pins),
+            }
+
+    def _eviction_order(self, keep: Optional[str]):
+        candidates = [
+            video_id for video_id in self._entries
+            if video_id != keep and video_id not in self._pins
+        ]
+        if self.policy == "lfu":
+            key = lambda video_id: (self._entries[video_id]["hits"], self._entries[video_id]["last_access"])
+        else:
+            key = lambda video_id: self._entries[video_id]["last_access"]
+        return sorted(candidates, key=key)
+
+    def _enforce_quota(self, keep: Optional[str] = None) -> int:
+        """Evict coldest unpinned videos (never `keep`) until under quota. Caller holds the lock."""
+        used = sum(entry["size"] for entry in self._entries.values())
+        freed = 0
+        for video_id in self._eviction_order(keep):
+            if used <= self.quota_bytes:
+                break
+            size = self._entries[video_id]["size"]
+            try:
+                os.remove(self.path_for(video_id))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not evict video {video_id}: {e}")
+                continue
+            del self._entries[video_id]
+            used -= size
+            freed += size
+            VIDEO_STORE_EVICTIONS.inc(policy=self.policy)
+            print(f"Evicted video {video_id} ({size / (1024*1024):.1f} MB) to stay under quota")
+        self._update_gauges()
+        return freed
+
+    def _update_gauges(self) -> None:
+        VIDEO_STORE_FILES.set(len(self._entries))
+        VIDEO_STORE_BYTES.set(sum(entry["size"] for entry in self._entries.values()))
+
+    def _save_index(self, force: bool = False) -> None:
+        """Persist access stats, at most every INDEX_SAVE_INTERVAL unless forced. Caller holds the lock."""
+        now = time.time()
+        if not force and now - self._last_save < INDEX_SAVE_INTERVAL:
+            return
+        index_path = os.path.join(self.root_dir, INDEX_FILENAME)
+        tmp_path = f"{index_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, index_path)
+            self._last_save = now
+        except OSError as e:
+            print(f"Could not save video index: {e}")
@@ -1,53 +1,149 @@
 # youtube_backend.py - Simplified for DigitalOcean
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Response
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Response, Request
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi import UploadFile, File
 import shutil
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 import logging
 import re
 import os
+import json
 import cv2
 import uuid
 import uvicorn
 from youtube_utils import download_video, download_youtube_video, grab_youtube_frame, download_transcript_api, \
-    format_transcript_data, extract_youtube_id, download_transcript_api1
-from format_transcript import  create_formatted_transcript
+    format_transcript_data, extract_youtube_id, download_transcript_api1, rapidapi_get
+from format_transcript import format_time, format_transcript_segments, render_formatted_transcript
 from ml_models import OpenAIVisionClient
-from typing import Optional
+from typing import List, Optional
 import httpx
 import requests
 import asyncio
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 from ml_models import OpenAIQuizClient
+from quiz_bank import QuizBank
+from video_store import VideoStore, DEFAULT_QUOTA_BYTES
+from admission import AdmissionExecutor, QueueFull
+from resilience import UpstreamUnavailable
+from transcript_providers import fetch_transcript, transcript_fetcher
+from transcript_index import DEFAULT_WINDOW_AFTER, DEFAULT_WINDOW_BEFORE, TranscriptIndex
+from keyframes import INDEX_FILENAME as KEYFRAME_INDEX_FILENAME, KeyframeIndex, extract_keyframes, frame_signature
+from frame_cache import FrameAnswerCache
+from video_chat import VideoChatStore
+from metadata_cache import VideoMetadataCache, placeholder_title
+from http_utils import cached_json_response, conditional_file_response, content_hash, etag_matches, strong_etag
+from transcript_store import TranscriptStore
+from subtitle_export import SUBTITLE_EXPORT_VERSION, SUBTITLE_MEDIA_TYPES, cues_from_segments, cues_from_transcription, iter_subtitles
+import metrics
+from metrics import timed_stage
+import time
+from collections import OrderedDict
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create directories
-video_path = os.path.join(os.path.dirname(__file__), "videos")
-frames_path = os.path.join(os.path.dirname(__file__), "frames")
-output_path = os.path.join(os.path.dirname(__file__), "output")
+# Create directories (VIDYA_DATA_DIR relocates all on-disk state, e.g. for benchmarks)
+data_dir = os.environ.get("VIDYA_DATA_DIR", os.path.dirname(__file__))
+video_path = os.path.join(data_dir, "videos")
+frames_path = os.path.join(data_dir, "frames")
+keyframes_path = os.path.join(data_dir, "keyframes")
+output_path = os.path.join(data_dir, "output")
+quiz_bank_path = os.path.join(data_dir, "quiz_bank")
 download_status = {}  # Track download status
-download_executor = ThreadPoolExecutor(max_workers=3)  # Thread pool for downloads
+# Bounded pool for downloads; a full queue sheds prefetches in favour of downloads a user is waiting on
+download_executor = AdmissionExecutor(
+    "download", max_workers=3,
+    max_queue=int(os.environ.get("DOWNLOAD_QUEUE_SIZE", 20)),
+    max_per_client=int(os.environ.get("DOWNLOAD_QUEUE_PER_CLIENT", 5)),
+    policy=os.environ.get("DOWNLOAD_ADMISSION_POLICY", "shed")
+)
+DOWNLOAD_PRIORITY_PREFETCH = 0  # Started by /api/youtube/info
+DOWNLOAD_PRIORITY_WAITING = 1  # Started by an image query the user is waiting on
+DOWNLOAD_PRIORITY_BULK = -1  # Started by bulk ingestion; shed first when users need the slots
 
 # Add these global variables after your existing globals (around line 29)
 formatting_status = {}  # Track formatting status
-formatting_executor = ThreadPoolExecutor(max_workers=3)  # Thread pool for formatting
+formatting_executor = AdmissionExecutor(
+    "formatting", max_workers=3,
+    max_queue=int(os.environ.get("FORMATTING_QUEUE_SIZE", 20)),
+    max_per_client=int(os.environ.get("FORMATTING_QUEUE_PER_CLIENT", 5)),
+    policy=os.environ.get("FORMATTING_ADMISSION_POLICY", "reject")
+)
+
+# Bulk ingestion: videos of all batches go through one small pool, so a whole course
+# never floods the download/formatting queues ahead of interactive users
+ingest_batches = {}  # batch_id -> batch record with per-video progress
+ingest_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("INGEST_CONCURRENCY", 3)))
+INGEST_MAX_VIDEOS = int(os.environ.get("INGEST_MAX_VIDEOS", 500))
+INGEST_MAX_RETRIES = 5  # Admission/upstream refusals waited out per stage before giving up
+INGEST_POLL_SECONDS = 2.0  # How often ingestion checks on stages running elsewhere
+INGEST_STAGE_TIMEOUT = float(os.environ.get("INGEST_STAGE_TIMEOUT", 3600))
+
+# oEmbed endpoint used for video titles (overridable for offline benchmarks)
+YOUTUBE_OEMBED_URL = os.environ.get("YOUTUBE_OEMBED_URL", "https://www.youtube.com/oembed")
+video_metadata = VideoMetadataCache(os.path.join(data_dir, "metadata"))  # Titles by video_id, served stale while refreshing
+metadata_refreshes = {}  # video_id -> background oEmbed refresh task in flight
 
 # Global transcript storage
 transcript_cache = {}  # Store transcript data for each video_id
+transcript_status = {}  # Background transcript fetches started by /api/youtube/info
+transcript_job_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="transcript-job")
+transcript_jobs_lock = threading.Lock()
+TRANSCRIPT_STATUS_MAX_WAIT = 30.0  # Longest long-poll on /api/youtube/transcript-status
+# Completed formatted transcripts: video_id -> {version, title, duration, text_ref, segments_ref}.
+# Text and segments live in formatted_store (content-addressed, memory-mapped); only references stay here
+formatted_store = TranscriptStore(os.path.join(data_dir, "formatted"))
+formatted_segments = {}
+loaded_segments = OrderedDict()  # video_id -> (segments, TranscriptIndex), most recently used last
+loaded_segments_lock = threading.Lock()  # Used from the event loop, the threadpool and formatting workers
+# While formatting runs: video_id -> {title, duration, segments (formatted prefix), raw_offset (subtitles covered)}
+partial_formatted = {}
+LOADED_SEGMENTS_MAX = 32
+FORMATTED_PAGE_SIZE = 50
+FORMATTED_MAX_PAGE_SIZE = 500
+FORMAT_MAX_ATTEMPTS = 4  # Formatting runs per video: the first plus reruns for failed or unformatted chunks
+FORMAT_RETRY_BACKOFF = 300  # Seconds before the first rerun, doubled for each one after
+# Generated subtitle files: (video_id, format, source) -> {version, ref}; the files live in formatted_store
+subtitle_exports = {}
+
+VIDEO_CACHE_CONTROL = "public, max-age=86400"
+# Frames and keyframes are named by timestamp, not content, and rewritten when a video is downloaded again
+FRAME_CACHE_CONTROL = "public, no-cache"  # Always revalidated; unchanged files get a cheap 304
 
+# Pre-generated quiz questions per video/difficulty/language
+quiz_bank = QuizBank(quiz_bank_path)
+quiz_executor = ThreadPoolExecutor(max_workers=2)  # Thread pool for quiz bank generation
+quiz_bank_jobs = set()  # Bank keys with a generation job in flight
+quiz_bank_jobs_lock = threading.Lock()
+QUIZ_BANK_PREGENERATE = [("medium", "en")]  # Banks built right after transcript ingestion
 
-for path in [video_path, frames_path, output_path]:
+
+video_chats = VideoChatStore()  # Multi-turn video chats by (session_id, video_id)
+
+# Scene keyframes extracted after each download, so queries never decode video for them
+frame_cache = FrameAnswerCache(frames_path)  # Perceptual-hash groups of extracted frames with reusable vision results
+keyframe_status = {}  # Track keyframe extraction status
+keyframe_indexes = {}  # Loaded KeyframeIndex per video_id
+keyframe_executor = ThreadPoolExecutor(max_workers=1)  # Decoding is CPU-bound; one video at a time
+KEYFRAMES_PER_QUERY = 6
+
+for path in [video_path, frames_path, output_path, keyframes_path]:
     os.makedirs(path, exist_ok=True)
 
 video_cache = {}
-downloaded_videos = {}
+
+# Downloaded videos live in video_path under a disk quota; the index is rebuilt from disk on startup
+video_store = VideoStore(
+    video_path,
+    quota_bytes=int(os.environ.get("VIDEO_STORE_QUOTA_BYTES", DEFAULT_QUOTA_BYTES)),
+    policy=os.environ.get("VIDEO_STORE_POLICY", "lru")
+)
+video_store.scan()
 
 app = FastAPI(
     title="YouTube Backend API - DigitalOcean",
@@ -59,6 +155,31 @@ app = FastAPI(
 async def options_route(path: str):
     return Response(status_code=200)
 
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so per-video paths share one series
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start, method=request.method, path=path, status=status)
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    """OpenAI or RapidAPI refused locally (over quota or circuit open): fail fast with 503"""
+    logger.warning(f"Upstream unavailable for {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Service temporarily unavailable ({exc.reason}), please retry in {exc.retry_after}s"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.middleware("http")
 async def add_security_headers(request, call_next):
     response = await call_next(request)
@@ -85,11 +206,23 @@ app.add_middleware(
 class YouTubeRequest(BaseModel):
     url: str
 
+class IngestRequest(BaseModel):
+    videos: List[str]  # YouTube URLs or 11-character video ids
+    download: bool = True  # Also download the video and extract keyframes
+    format_transcript: bool = True
+
 class VideoQuery(BaseModel):
     video_id: str
     query: str
     timestamp: Optional[float] = None
     is_image_query: bool = False 
+    include_keyframes: bool = False  # Opt-in: attaches keyframes and answers with the (costlier) vision model
+
+class VideoChatRequest(BaseModel):
+    video_id: str
+    query: str
+    session_id: Optional[str] = None  # Omit on the first question; reuse the returned one for follow-ups
+    timestamp: Optional[float] = None
 
 class TranslationRequest(BaseModel):
     youtube_url: str
@@ -104,6 +237,77 @@ class QuizRequest(BaseModel):
     language: str = "en"
 
 # Add this function after your existing functions but before the endpoints
+def client_key(http_request: Request) -> str:
+    """Identify the caller for per-client queue fairness"""
+    client_id = http_request.headers.get("x-client-id")
+    if client_id:
+        return client_id
+    return http_request.client.host if http_request.client else "anonymous"
+
+def schedule_download(video_id: str, url: str, client_id: str, priority: int = DOWNLOAD_PRIORITY_PREFETCH):
+    """Queue a background download and return its future; raises QueueFull when the download pool is saturated"""
+    # Recorded before submitting so a fast worker's own status update is never overwritten
+    download_status[video_id] = {
+        "status": "downloading",
+        "message": "Video queued for download...",
+        "path": None
+    }
+    try:
+        return download_executor.submit(
+            download_video_background, video_id, url,
+            client_id=client_id, priority=priority,
+            # A shed job forgets its status so the next request queues it again
+            on_shed=lambda: download_status.pop(video_id, None)
+        )
+    except QueueFull:
+        download_status.pop(video_id, None)
+        raise
+
+def schedule_formatting(video_id: str, json_data: dict, client_id: str):
+    """
+    Queue background formatting and return its future; raises QueueFull when the
+    formatting pool is saturated. Rerunning a completed transcript that has
+    unformatted chunks keeps it "completed" (and served) while the rerun runs.
+    """
+    previous = formatting_status.get(video_id)
+    if previous and previous["status"] == "completed" and video_id in formatted_segments:
+        formatting_status[video_id] = {**previous, "retrying": True}
+        restore = lambda: formatting_status.__setitem__(video_id, previous)
+    else:
+        formatting_status[video_id] = {
+            "status": "formatting",
+            "message": "Queued for AI transcript formatting...",
+            "formatted_transcript": None,
+            "error": None,
+            "progress": 0,
+            "total_chunks": 0,
+            "current_chunk": 0,
+            "attempts": (previous or {}).get("attempts", 0)
+        }
+        restore = lambda: formatting_status.pop(video_id, None) if previous is None else formatting_status.__setitem__(video_id, previous)
+    try:
+        return formatting_executor.submit(
+            format_transcript_background, video_id, json_data,
+            client_id=client_id,
+            on_shed=restore
+        )
+    except QueueFull:
+        restore()
+        raise
+
+def formatting_rerun_due(status: dict) -> bool:
+    """
+    Whether a failed or partly formatted transcript should be formatted again:
+    at most FORMAT_MAX_ATTEMPTS runs per video, each retry waiting twice as long
+    as the one before, so a chunk that always fails is not retried on every view.
+    """
+    incomplete = status["status"] == "failed" or (status["status"] == "completed" and status.get("failed_chunks"))
+    if not incomplete or status.get("retrying"):
+        return False
+    attempts = status.get("attempts", 1)
+    backoff = FORMAT_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return attempts < FORMAT_MAX_ATTEMPTS and time.time() >= status.get("finished_at", 0) + backoff
+
 def download_video_background(video_id: str, url: str):
     """Background function to download video"""
     try:
@@ -114,16 +318,18 @@ def download_video_background(video_id: str, url: str):
         }
         
         logger.info(f"Starting background download for video: {video_id}")
-        video_path = download_video(url)
+        with timed_stage("download"):
+            video_path = download_video(url, output_path=video_store.root_dir)
         
         if video_path and os.path.exists(video_path):
-            downloaded_videos[video_id] = video_path
+            video_path = video_store.add(video_id, video_path)
             download_status[video_id] = {
                 "status": "completed",
                 "message": "Video download complete", 
                 "path": video_path
             }
             logger.info(f"Video download completed: {video_path}")
+            schedule_keyframes(video_id)
         else:
             download_status[video_id] = {
                 "status": "failed",
@@ -139,39 +345,278 @@ def download_video_background(video_id: str, url: str):
         }
         logger.error(f"Video download error for {video_id}: {str(e)}")
 
+def extract_keyframes_background(video_id: str):
+    """Background function to detect scene changes and store keyframe thumbnails"""
+    try:
+        keyframe_status[video_id] = {"status": "extracting", "message": "Keyframe extraction in progress...", "count": 0}
+        with video_store.in_use(video_id):
+            path = video_store.get(video_id)
+            if path is None:
+                raise RuntimeError("Video is no longer stored")
+            with timed_stage("keyframe_extraction"):
+                index = extract_keyframes(path, os.path.join(keyframes_path, video_id))
+        keyframe_indexes.pop(video_id, None)
+        keyframe_status[video_id] = {
+            "status": "completed",
+            "message": "Keyframe extraction complete",
+            "count": len(index["keyframes"])
+        }
+        logger.info(f"Extracted {len(index['keyframes'])} keyframes for video {video_id}")
+    except Exception as e:
+        keyframe_status[video_id] = {"status": "failed", "message": f"Keyframe extraction failed: {str(e)}", "count": 0}
+        logger.error(f"Keyframe extraction error for {video_id}: {str(e)}")
+
+def schedule_keyframes(video_id: str) -> bool:
+    """Queue keyframe extraction unless it already ran or is queued; False if nothing was queued"""
+    status = keyframe_status.get(video_id)
+    if status and status["status"] in ("queued", "extracting", "completed"):
+        return False
+    keyframe_status[video_id] = {"status": "queued", "message": "Keyframe extraction queued", "count": 0}
+    keyframe_executor.submit(extract_keyframes_background, video_id)
+    return True
+
+def get_keyframe_index(video_id: str) -> Optional[KeyframeIndex]:
+    """Keyframes for a video from memory or disk; queues extraction for stored videos without them"""
+    index = keyframe_indexes.get(video_id)
+    if index is None:
+        index = KeyframeIndex.load(os.path.join(keyframes_path, video_id))
+        if index is not None:
+            keyframe_indexes[video_id] = index
+            keyframe_status.setdefault(video_id, {"status": "completed", "message": "Keyframe extraction complete", "count": len(index)})
+        elif video_id in video_store:
+            schedule_keyframes(video_id)
+    return index
+
+def fill_quiz_bank_background(video_id: str, transcript_data: str, difficulty: str, language: str):
+    """Background function to generate questions into the quiz bank"""
+    job_key = (video_id, difficulty, language)
+    try:
+        logger.info(f"Generating quiz bank for video {video_id} ({difficulty}, {language})")
+        quiz_client = OpenAIQuizClient()
+        quiz_result = quiz_client.generate_quiz(
+            transcript=transcript_data,
+            num_questions=quiz_bank.bank_size,
+            difficulty=difficulty,
+            include_explanations=True,
+            language=language
+        )
+        added = quiz_bank.add_questions(video_id, difficulty, language, quiz_result.get("quiz", []))
+        logger.info(f"Added {added} questions to quiz bank for video {video_id} ({difficulty}, {language})")
+    except Exception as e:
+        logger.error(f"Quiz bank generation error for {video_id}: {str(e)}")
+    finally:
+        with quiz_bank_jobs_lock:
+            quiz_bank_jobs.discard(job_key)
+
+def schedule_quiz_bank_fill(video_id: str, transcript_data: str, difficulty: str, language: str) -> bool:
+    """Submit a quiz bank fill unless one is already running for this bank"""
+    job_key = (video_id, difficulty, language)
+    with quiz_bank_jobs_lock:
+        if job_key in quiz_bank_jobs:
+            return False
+        quiz_bank_jobs.add(job_key)
+    quiz_executor.submit(fill_quiz_bank_background, video_id, transcript_data, difficulty, language)
+    return True
+
+def ingest_stage_status(video_id: str) -> dict:
+    """State of each ingestion stage for a video (pending/running/completed/failed), from the live status records"""
+    stages = {"transcript": "completed" if (transcript_cache.get(video_id) or {}).get("transcript_data") else "pending"}
+    formatting = (formatting_status.get(video_id) or {}).get("status")
+    stages["formatting"] = {"formatting": "running", "completed": "completed", "failed": "failed"}.get(formatting, "pending")
+    if video_id in video_store:
+        stages["download"] = "completed"
+    else:
+        # A "completed" record for a video no longer stored means it was evicted
+        download = (download_status.get(video_id) or {}).get("status")
+        stages["download"] = {"downloading": "running", "failed": "failed"}.get(download, "pending")
+    keyframes = (keyframe_status.get(video_id) or {}).get("status")
+    if keyframes is None and os.path.exists(os.path.join(keyframes_path, video_id, KEYFRAME_INDEX_FILENAME)):
+        keyframes = "completed"
+    stages["keyframes"] = {"queued": "running", "extracting": "running", "completed": "completed", "failed": "failed"}.get(keyframes, "pending")
+    return stages
+
+def wait_for_stages(video_id: str, stages: List[str]) -> dict:
+    """Poll until none of stages is running (in flight elsewhere) or INGEST_STAGE_TIMEOUT passes; returns the last states"""
+    deadline = time.monotonic() + INGEST_STAGE_TIMEOUT
+    while True:
+        states = ingest_stage_status(video_id)
+        if not any(states[stage] == "running" for stage in stages) or time.monotonic() >= deadline:
+            return states
+        time.sleep(INGEST_POLL_SECONDS)
+
+def retry_refused(submit, what: str):
+    """Call submit(), waiting out QueueFull/UpstreamUnavailable refusals up to INGEST_MAX_RETRIES times"""
+    for attempt in range(INGEST_MAX_RETRIES):
+        try:
+            return submit()
+        except (QueueFull, UpstreamUnavailable) as e:
+            if attempt == INGEST_MAX_RETRIES - 1:
+                raise
+            logger.info(f"Ingestion {what} refused ({e}); retrying in {e.retry_after}s")
+            time.sleep(e.retry_after)
+
+def ingest_video_background(batch_id: str, item: dict, download: bool, format_transcript: bool):
+    """
+    Bulk ingestion of one video: transcript, then formatting and download in
+    parallel through their admission queues (keyframes follow the download).
+    Stages that already completed are skipped, and ones in flight elsewhere
+    are waited for rather than started again. Holds its ingest_executor slot
+    until every requested stage, keyframes included, has finished, which is
+    what bounds how much of a batch is in the queues at once.
+    """
+    video_id = item["video_id"]
+    client_id = f"ingest:{batch_id}"
+    item["state"] = "running"
+    errors = []
+    try:
+        stages = ingest_stage_status(video_id)
+        json_data = (transcript_cache.get(video_id) or {}).get("json_data")
+        if stages["transcript"] != "completed":
+            try:
+                with timed_stage("transcript_fetch"):
+                    transcript_data, json_data = retry_refused(lambda: fetch_transcript(video_id), "transcript fetch")
+                if transcript_data:
+                    cache_transcript(video_id, transcript_data, json_data)
+                else:
+                    errors.append("transcript: not available")
+            except Exception as e:
+                errors.append(f"transcript: {str(e)}")
+
+        jobs = {}
+        if format_transcript and json_data and stages["formatting"] in ("pending", "failed"):
+            try:
+                jobs["formatting"] = retry_refused(lambda: schedule_formatting(video_id, json_data, client_id), "formatting")
+            except QueueFull as e:
+                errors.append(f"formatting: {str(e)}")
+        if download and stages["download"] in ("pending", "failed"):
+            url = f"https://www.youtube.com/watch?v={video_id}"
+            for attempt in range(INGEST_MAX_RETRIES):
+                try:
+                    future = retry_refused(
+                        lambda: schedule_download(video_id, url, client_id, priority=DOWNLOAD_PRIORITY_BULK), "download")
+                    future.result()
+                    break
+                except CancelledError:
+                    # Shed for an interactive download; queue it again
+                    continue
+                except Exception as e:
+                    errors.append(f"download: {str(e)}")
+                    break
+            else:
+                errors.append(f"download: shed by interactive downloads {INGEST_MAX_RETRIES} times")
+        for stage, future in jobs.items():
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(f"{stage}: {str(e)}")
+
+        requested = {"download": download, "formatting": bool(format_transcript and json_data), "keyframes": download}
+        # Stages skipped above because another request is running them are waited for here
+        wait_for_stages(video_id, [stage for stage in ("download", "formatting") if requested[stage]])
+        if download and video_id in video_store:
+            # Downloads schedule their own extraction; this covers videos stored before keyframes existed
+            schedule_keyframes(video_id)
+        states = wait_for_stages(video_id, [stage for stage, wanted in requested.items() if wanted])
+        # A requested stage still pending was shed or never admitted, and one still running timed out
+        for stage, state in states.items():
+            if any(error.startswith(f"{stage}:") for error in errors):
+                continue
+            if state == "failed" or (state in ("pending", "running") and requested.get(stage)):
+                errors.append(f"{stage}: {state}")
+        item["state"] = "failed" if errors else "completed"
+    except Exception as e:
+        errors.append(str(e))
+        item["state"] = "failed"
+    finally:
+        item["errors"] = errors
+        item["finished_at"] = time.time()
+        logger.info(f"Ingestion of {video_id} in batch {batch_id} finished: {item['state']}")
+
 #REPLACE the existing format_transcript_background function with this:
 def format_transcript_background(video_id: str, json_data: dict):
-    """Background function to format transcript with progress tracking"""
+    """
+    Background function to format transcript with progress tracking.
+
+    A rerun over a completed transcript (to retry its unformatted chunks)
+    leaves the completed status and stored transcript in place until it
+    finishes, and does not publish partial segments.
+    """
+    previous = formatting_status.get(video_id) or {}
+    attempts = previous.get("attempts", 0) + 1
+    rerun = previous.get("retrying", False)
     try:
-        formatting_status[video_id] = {
-            "status": "formatting",
-            "message": "AI-based transcript formatting in progress...",
-            "formatted_transcript": None,
-            "error": None,
-            "progress": 0,          # ADD THIS LINE
-            "total_chunks": 0,      # ADD THIS LINE
-            "current_chunk": 0      # ADD THIS LINE
+        if not rerun:
+            formatting_status[video_id] = {
+                "status": "formatting",
+                "message": "AI-based transcript formatting in progress...",
+                "formatted_transcript": None,
+                "error": None,
+                "progress": 0,          # ADD THIS LINE
+                "total_chunks": 0,      # ADD THIS LINE
+                "current_chunk": 0,     # ADD THIS LINE
+                "attempts": attempts
+            }
+        
+        logger.info(f"Starting background transcript formatting for video: {video_id} (attempt {attempts})")
+        
+        # Each chunk is published as soon as it is formatted, for queries and the transcript UI
+        partial = {
+            "title": json_data[0].get("title"),
+            "duration": json_data[0].get("lengthInSeconds"),
+            "segments": [],
+            "raw_offset": 0
         }
+        if not rerun:
+            partial_formatted[video_id] = partial
+        failed_chunks = []
         
-        logger.info(f"Starting background transcript formatting for video: {video_id}")
+        def publish_segment(segment, subtitle_count, formatted):
+            partial["segments"].append(segment)
+            partial["raw_offset"] += subtitle_count
+            if not formatted:
+                failed_chunks.append(len(partial["segments"]) - 1)
         
-        # CHANGE THIS LINE: pass video_id to track progress
-        formatted_transcript_lines = create_formatted_transcript(json_data, video_id=video_id)
-        formatted_transcript_text = ''.join(formatted_transcript_lines)
-        logger.info(f"formatted transcript text {formatted_transcript_text}")
+        # CHANGE THIS LINE: pass video_id to track progress (not on reruns, whose status stays "completed")
+        with timed_stage("formatting"):
+            segments = format_transcript_segments(json_data, video_id=None if rerun else video_id, on_segment=publish_segment)
+        formatted_transcript_text = ''.join(render_formatted_transcript(json_data, segments))
+        text_ref = formatted_store.put_text(formatted_transcript_text)
+        formatted_segments[video_id] = {
+            "version": text_ref.split(".")[0],
+            "title": json_data[0].get("title"),
+            "duration": json_data[0].get("lengthInSeconds"),
+            "text_ref": text_ref,
+            "segments_ref": formatted_store.put_json(segments)
+        }
+        with loaded_segments_lock:
+            loaded_segments.pop(video_id, None)
+        logger.info(f"Formatted transcript for {video_id} stored as {text_ref} ({len(segments)} segments)")
         
+        # Chunks that failed keep their raw text; formatted chunks are checkpointed, so a rerun retries only those
         formatting_status[video_id] = {
             "status": "completed",
-            "message": "AI transcript formatting complete",
-            "formatted_transcript": formatted_transcript_text,
+            "message": (f"AI transcript formatting complete, {len(failed_chunks)} of {len(segments)} chunks left unformatted"
+                        if failed_chunks else "AI transcript formatting complete"),
+            "formatted_transcript": None,  # Read from formatted_store via formatted_transcript_text()
+            "formatted_transcript_ref": text_ref,
+            "failed_chunks": len(failed_chunks),
             "error": None,
             "progress": 100,        # ADD THIS LINE
-            "total_chunks": formatting_status[video_id].get("total_chunks", 0),    # ADD THIS LINE
-            "current_chunk": formatting_status[video_id].get("total_chunks", 0)    # ADD THIS LINE
+            "total_chunks": len(segments),    # ADD THIS LINE
+            "current_chunk": len(segments),   # ADD THIS LINE
+            "attempts": attempts,
+            "finished_at": time.time()
         }
+        partial_formatted.pop(video_id, None)
         logger.info(f"Transcript formatting completed for video: {video_id}")
         
     except Exception as e:
+        if rerun:
+            # The earlier result is still valid; count the attempt towards the rerun limit
+            formatting_status[video_id] = {**previous, "retrying": False, "attempts": attempts, "finished_at": time.time()}
+            logger.error(f"Transcript formatting rerun error for {video_id}: {str(e)}")
+            return
+        partial_formatted.pop(video_id, None)
         formatting_status[video_id] = {
             "status": "failed",
             "message": f"Transcript formatting failed: {str(e)}",
@@ -179,11 +624,18 @@ def format_transcript_background(video_id: str, json_data: dict):
             "error": str(e),
             "progress": 0,          # ADD THIS LINE
             "total_chunks": 0,      # ADD THIS LINE
-            "current_chunk": 0      # ADD THIS LINE
+            "current_chunk": 0,     # ADD THIS LINE
+            "attempts": attempts,
+            "finished_at": time.time()
         }
         logger.error(f"Transcript formatting error for {video_id}: {str(e)}")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"status": "YouTube backend is running on DigitalOcean"}
@@ -214,8 +666,8 @@ async def upload_cookies(cookie_file: UploadFile = File(...)):
 @app.get("/api/youtube/download-status/{video_id}")
 async def get_download_status(video_id: str):
     """Check the download status of a video"""
-    if video_id in downloaded_videos and os.path.exists(downloaded_videos[video_id]):
-        return {"status": "completed", "message": "Video download complete", "path": downloaded_videos[video_id]}
+    if video_id in video_store:
+        return {"status": "completed", "message": "Video download complete", "path": video_store.path_for(video_id)}
     
     if video_id in download_status:
         return download_status[video_id]
@@ -226,10 +678,181 @@ async def get_download_status(video_id: str):
           
 
 
+@app.post("/api/youtube/ingest")
+async def ingest_videos(request: IngestRequest):
+    """
+    Queue a list of YouTube URLs or video ids (a playlist or course) for
+    preprocessing: transcript, formatting, download and keyframes. Returns a
+    batch id at once; progress is at GET /api/youtube/ingest/{batch_id}.
+    Videos that are already fully processed are marked skipped.
+    """
+    if len(request.videos) > INGEST_MAX_VIDEOS:
+        raise HTTPException(status_code=400, detail=f"At most {INGEST_MAX_VIDEOS} videos per batch")
+    
+    batch_id = uuid.uuid4().hex
+    items, invalid, seen = [], [], set()
+    for entry in request.videos:
+        entry = entry.strip()
+        video_id = extract_youtube_id(entry) or (entry if re.fullmatch(r"[a-zA-Z0-9_-]{11}", entry) else None)
+        if not video_id:
+            invalid.append(entry)
+            continue
+        if video_id in seen:
+            continue
+        seen.add(video_id)
+        items.append({"video_id": video_id, "state": "queued", "errors": [], "finished_at": None})
+    
+    wanted = ["transcript"] + (["formatting"] if request.format_transcript else []) + \
+        (["download", "keyframes"] if request.download else [])
+    for item in items:
+        stages = ingest_stage_status(item["video_id"])
+        if all(stages[stage] == "completed" for stage in wanted):
+            item["state"] = "skipped"
+            item["finished_at"] = time.time()
+    
+    ingest_batches[batch_id] = {
+        "batch_id": batch_id,
+        "created_at": time.time(),
+        "download": request.download,
+        "format_transcript": request.format_transcript,
+        "invalid": invalid,
+        "items": items
+    }
+    # Keep the most recent batches only
+    while len(ingest_batches) > 100:
+        ingest_batches.pop(next(iter(ingest_batches)))
+    
+    for item in items:
+        if item["state"] == "queued":
+            ingest_executor.submit(ingest_video_background, batch_id, item, request.download, request.format_transcript)
+    
+    logger.info(f"Ingestion batch {batch_id}: {len(items)} videos, {len(invalid)} invalid")
+    return get_ingest_progress(batch_id)
+
+def get_ingest_progress(batch_id: str) -> dict:
+    batch = ingest_batches[batch_id]
+    counts = {"queued": 0, "running": 0, "completed": 0, "skipped": 0, "failed": 0}
+    stage_counts = {}
+    items = []
+    for item in batch["items"]:
+        counts[item["state"]] += 1
+        stages = ingest_stage_status(item["video_id"])
+        for stage, state in stages.items():
+            stage_counts.setdefault(stage, {}).setdefault(state, 0)
+            stage_counts[stage][state] += 1
+        items.append({**item, "stages": stages})
+    total = len(batch["items"])
+    finished = counts["completed"] + counts["skipped"] + counts["failed"]
+    return {
+        "batch_id": batch_id,
+        "created_at": batch["created_at"],
+        "total": total,
+        "finished": finished,
+        "progress": round(100 * finished / total) if total else 100,
+        "done": finished == total,
+        "counts": counts,
+        "stages": stage_counts,
+        "invalid": batch["invalid"],
+        "items": items
+    }
+
+@app.get("/api/youtube/ingest/{batch_id}")
+async def get_ingest_status(batch_id: str):
+    """Per-batch and per-video progress of a bulk ingestion"""
+    if batch_id not in ingest_batches:
+        raise HTTPException(status_code=404, detail="Ingestion batch not found")
+    return get_ingest_progress(batch_id)
+
+def start_transcript_jobs(video_id: str, transcript_data, json_data, client_id: str) -> str:
+    """Queue what follows a transcript (formatting, quiz bank); returns the formatting message"""
+    formatting_message = "Transcript not formatted"
+    status = formatting_status.get(video_id)
+    # Failed or partly formatted transcripts are redone now and then; per-chunk checkpoints make that cost only the missing chunks
+    if status and not formatting_rerun_due(status):
+        formatting_message = f"Formatting status: {status['status']} - {status['message']}"
+    else:
+        # Start background formatting if we have json_data
+        if json_data:
+            try:
+                schedule_formatting(video_id, json_data, client_id)
+                formatting_message = "AI transcript formatting started in background"
+            except QueueFull as e:
+                # Queries keep using the raw transcript until formatting is admitted
+                formatting_message = f"Server busy, AI transcript formatting deferred (retry in {e.retry_after}s)"
+        else:
+            formatting_message = "No JSON data available for formatting"
+
+    # Pre-generate the default quiz bank so the quiz panel opens instantly
+    if transcript_data:
+        for difficulty, language in QUIZ_BANK_PREGENERATE:
+            if quiz_bank.needs_refill(video_id, difficulty, language):
+                schedule_quiz_bank_fill(video_id, transcript_data, difficulty, language)
+    return formatting_message
+
+def fetch_transcript_background(video_id: str, client_id: str):
+    """
+    Background function to fetch a transcript for /api/youtube/info, then start
+    formatting. Providers usually supply the title too; oEmbed is asked only
+    when the title is still unknown afterwards.
+    """
+    try:
+        print(f"Downloading new transcript for video: {video_id}")
+        with timed_stage("transcript_fetch"):
+            transcript_data, json_data = fetch_transcript(video_id)
+        if not transcript_data:
+            transcript_status[video_id] = {"status": "failed", "message": "No transcript available for this video", "retry_after": None}
+            return
+        cache_transcript(video_id, transcript_data, json_data)
+        print(f"Cached transcript for video: {video_id}")
+        transcript_status[video_id] = {
+            "status": "completed",
+            "message": start_transcript_jobs(video_id, transcript_data, json_data, client_id),
+            "retry_after": None
+        }
+    except UpstreamUnavailable as e:
+        # The next /api/youtube/info call tries again
+        logger.warning(f"Transcript fetch skipped for {video_id}: {e}")
+        transcript_status[video_id] = {"status": "failed", "message": str(e), "retry_after": e.retry_after}
+    except Exception as e:
+        logger.error(f"Transcript fetch error for {video_id}: {str(e)}")
+        transcript_status[video_id] = {"status": "failed", "message": f"Transcript fetch failed: {str(e)}", "retry_after": None}
+    finally:
+        if video_metadata.title(video_id) is None:
+            # Worker thread, so the oEmbed call gets its own short-lived event loop
+            asyncio.run(fetch_video_metadata(video_id))
+
+def schedule_transcript_fetch(video_id: str, client_id: str) -> bool:
+    """Start a background transcript fetch unless one is running; False if nothing was started"""
+    with transcript_jobs_lock:
+        status = transcript_status.get(video_id)
+        if status and status["status"] == "fetching":
+            return False
+        transcript_status[video_id] = {"status": "fetching", "message": "Fetching transcript...", "retry_after": None}
+    transcript_job_executor.submit(fetch_transcript_background, video_id, client_id)
+    return True
+
+def job_handles(video_id: str) -> dict:
+    """Where the client follows each background job of a video"""
+    return {
+        "transcript": f"/api/youtube/transcript-status/{video_id}",
+        "formatting": f"/api/youtube/formatting-status/{video_id}",
+        "download": f"/api/youtube/download-status/{video_id}",
+        "keyframes": f"/api/youtube/keyframes/{video_id}"
+    }
+
 @app.post("/api/youtube/info")
-async def get_youtube_info(request: YouTubeRequest):
-    """Get information about a YouTube video from its URL"""
+async def get_youtube_info(request: YouTubeRequest, http_request: Request, response: Response):
+    """
+    Get information about a YouTube video from its URL.
+
+    Returns at once with the embed URL, the cached title (placeholder until
+    oEmbed answers in the background) and job handles. If the transcript is
+    cached it is included inline; otherwise it is fetched in the background and
+    delivered by GET /api/youtube/transcript-status/{video_id} (long-poll with
+    ?wait=seconds), transcript_status "fetching" until then.
+    """
     url = request.url
+    client_id = client_key(http_request)
     
     logger.info(f"Processing YouTube URL: {url}")
     
@@ -240,49 +863,44 @@ async def get_youtube_info(request: YouTubeRequest):
         raise HTTPException(status_code=400, detail="Invalid YouTube URL")
     
     try:
-        title = await get_video_title(video_id)
-        
         # Download video using yt-dlp (works great on DigitalOcean)
-        if video_id in downloaded_videos and os.path.exists(downloaded_videos[video_id]):
-            download_message = f"Video already downloaded: {downloaded_videos[video_id]}"
-        elif video_id in download_status:
+        if video_id in video_store:
+            download_message = f"Video already downloaded: {video_store.path_for(video_id)}"
+        elif video_id in download_status and download_status[video_id]["status"] != "completed":
+            # A completed download that is no longer stored was evicted and is fetched again below
             status = download_status[video_id]
             download_message = f"Download status: {status['status']} - {status['message']}"
         else:
             # Start background download
-            download_executor.submit(download_video_background, video_id, url)
-            download_message = "Video download started in background"
-            
-        # Get transcript and store in global cache
-        print("Downloading transcript for video ID:", video_id)
+            try:
+                schedule_download(video_id, url, client_id)
+                download_message = "Video download started in background"
+            except QueueFull as e:
+                # Downgrade to transcript-only; the client may retry the download later
+                response.headers["Retry-After"] = str(e.retry_after)
+                download_message = f"Server busy, video download deferred (retry in {e.retry_after}s). Transcript-only mode."
         
         # Check if transcript is already cached
         if video_id in transcript_cache:
             print(f"Using cached transcript for video: {video_id}")
             transcript_data = transcript_cache[video_id]["transcript_data"]
-            json_data = transcript_cache[video_id]["json_data"]
+            formatting_message = start_transcript_jobs(video_id, transcript_data, transcript_cache[video_id]["json_data"], client_id)
+            transcript_state = "completed"
         else:
-            print(f"Downloading new transcript for video: {video_id}")
-            transcript_data, json_data = download_transcript_api(video_id)
-            
-            # Store in global cache
-            transcript_cache[video_id] = {
-                "transcript_data": transcript_data,
-                "json_data": json_data
-            }
-            print(f"Cached transcript for video: {video_id}")
+            schedule_transcript_fetch(video_id, client_id)
+            transcript_data = None
+            formatting_message = "Waiting for transcript"
+            transcript_state = "fetching"
         
-        formatting_message = "Transcript not formatted"
-        if video_id in formatting_status:
-            status = formatting_status[video_id]
-            formatting_message = f"Formatting status: {status['status']} - {status['message']}"
+        # Never wait for oEmbed here: a cached (possibly stale) title, else a placeholder filled in later,
+        # by the transcript fetch (which falls back to oEmbed itself) or, with the transcript cached, by oEmbed
+        title = video_metadata.title(video_id)
+        if title is None:
+            title = placeholder_title(video_id)
+            if transcript_state == "completed" and video_id not in metadata_refreshes:
+                metadata_refreshes[video_id] = asyncio.create_task(refresh_video_metadata(video_id))
         else:
-            # Start background formatting if we have json_data
-            if json_data:
-                formatting_executor.submit(format_transcript_background, video_id, json_data)
-                formatting_message = "AI transcript formatting started in background"
-            else:
-                formatting_message = "No JSON data available for formatting"
+            title = await get_video_title(video_id)  # Cached, so at most schedules a refresh when stale
        
         logger.info(f"Video info: ID={video_id}, Title={title}")
         
@@ -292,21 +910,60 @@ async def get_youtube_info(request: YouTubeRequest):
             "title": title,
             "url": url,
             "transcript": transcript_data,
+            "transcript_status": transcript_state,
             "embed_url": f"https://www.youtube.com/embed/{video_id}?enablejsapi=1",
-            "download_status": download_message
+            "download_status": download_message,
+            "formatting_status": formatting_message,
+            "jobs": job_handles(video_id)
         }
         
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error processing YouTube URL: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/youtube/transcript-status/{video_id}")
+async def get_transcript_status(video_id: str, response: Response, wait: float = 0):
+    """
+    Transcript of a video loaded through /api/youtube/info, once fetched.
+
+    With wait (seconds, at most TRANSCRIPT_STATUS_MAX_WAIT) the request is held
+    while the fetch is still running, so clients long-poll instead of spinning.
+    """
+    deadline = time.monotonic() + min(max(wait, 0), TRANSCRIPT_STATUS_MAX_WAIT)
+    while (transcript_status.get(video_id) or {}).get("status") == "fetching" and time.monotonic() < deadline:
+        await asyncio.sleep(0.25)
+    
+    cached = transcript_cache.get(video_id)
+    if cached and cached.get("transcript_data"):
+        return {
+            "status": "completed",
+            "message": "Transcript available",
+            "title": video_metadata.title(video_id) or placeholder_title(video_id),
+            "transcript": cached["transcript_data"]
+        }
+    status = transcript_status.get(video_id)
+    if status is None:
+        return {"status": "not_found", "message": "No transcript fetch for this video", "transcript": None}
+    if status.get("retry_after"):
+        response.headers["Retry-After"] = str(status["retry_after"])
+    return {**status, "transcript": None}
+
 
 # Add this new endpoint to check formatting status
 @app.get("/api/youtube/formatting-status/{video_id}")
 async def get_formatting_status(video_id: str):
     """Check the formatting status of a video transcript"""
     if video_id in formatting_status:
-        return formatting_status[video_id]
+        status = formatting_status[video_id]
+        if status["status"] == "completed":
+            return {**status, "formatted_transcript": formatted_transcript_text(video_id)}
+        if status["status"] == "formatting":
+            # The chunks done so far, so the UI can show them before formatting finishes
+            segments = formatted_prefix(video_id)
+            return {**status, "formatted_prefix": render_prefix(video_id, segments), "formatted_segments": len(segments)}
+        return status
     
     return {
         "status": "not_found",
@@ -317,22 +974,65 @@ async def get_formatting_status(video_id: str):
 
 #Add this endpoint to get the formatted transcript
 @app.get("/api/youtube/formatted-transcript/{video_id}")
-async def get_formatted_transcript(video_id: str):
-    """Get the formatted transcript for a video"""
+async def get_formatted_transcript(video_id: str, http_request: Request, cursor: Optional[int] = None,
+                                   limit: Optional[int] = None, start: Optional[float] = None,
+                                   end: Optional[float] = None):
+    """
+    Get the formatted transcript for a video.
+
+    Without paging parameters the whole transcript text is returned as before.
+    With cursor/limit and/or start/end (seconds) a page of {start, end, text}
+    segments is returned with next_cursor for the following page. Completed
+    responses carry a strong ETag (If-None-Match answers 304) and are
+    gzip/brotli compressed when the client accepts it.
+    """
     if video_id in formatting_status:
         status = formatting_status[video_id]
-        print(f"Formatting status for video {video_id}: {status}")
-        if status["status"] == "completed":
-            return {
+        if status["status"] == "completed" and video_id in formatted_segments:
+            stored = formatted_segments[video_id]
+            paged = any(param is not None for param in (cursor, limit, start, end))
+            etag = strong_etag(stored["version"], cursor, limit, start, end)
+            segments, index = get_formatted_segments(video_id)
+            if not paged:
+                return cached_json_response(http_request, {
+                    "video_id": video_id,
+                    "status": "completed",
+                    "formatted_transcript": formatted_transcript_text(video_id),
+                    "total_segments": len(segments)
+                }, etag)
+
+            if start is not None or end is not None:
+                selected = index.range(start or 0.0, index.duration if end is None else end)
+            else:
+                selected = segments
+            offset = max(cursor or 0, 0)
+            page_size = min(max(limit or FORMATTED_PAGE_SIZE, 1), FORMATTED_MAX_PAGE_SIZE)
+            page = selected[offset:offset + page_size]
+            next_offset = offset + len(page)
+            return cached_json_response(http_request, {
                 "video_id": video_id,
                 "status": "completed",
-                "formatted_transcript": status["formatted_transcript"]
-            }
+                "title": stored["title"],
+                "duration": stored["duration"],
+                "segments": page,
+                "cursor": offset,
+                "next_cursor": next_offset if next_offset < len(selected) else None,
+                "total_segments": len(selected)
+            }, etag)
         elif status["status"] == "formatting":
+            segments = formatted_prefix(video_id)
+            offset = max(cursor or 0, 0)
+            page_size = min(max(limit or FORMATTED_PAGE_SIZE, 1), FORMATTED_MAX_PAGE_SIZE)
+            page = segments[offset:offset + page_size]
             return {
                 "video_id": video_id,
                 "status": "formatting",
-                "message": "Transcript is still being formatted. Please wait..."
+                "message": "Transcript is still being formatted. Please wait...",
+                "formatted_prefix": render_prefix(video_id, segments),
+                "segments": page,
+                "cursor": offset,
+                "next_cursor": offset + len(page),  # Segments published later continue from here
+                "total_segments": len(segments)
             }
         elif status["status"] == "failed":
             return {
@@ -344,21 +1044,147 @@ async def get_formatted_transcript(video_id: str):
     raise HTTPException(status_code=404, detail="Formatted transcript not found")
 
 
-async def get_video_title(video_id: str) -> str:
-    """Get the title of a YouTube video"""
+@app.api_route("/api/youtube/formatted-transcript/{video_id}/text", methods=["GET", "HEAD"])
+async def get_formatted_transcript_text(video_id: str, http_request: Request):
+    """The formatted transcript as plain text, sent straight from its stored file (Range/304 supported)"""
+    stored = formatted_segments.get(video_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Formatted transcript not found")
+    return conditional_file_response(http_request, formatted_store.path(stored["text_ref"]),
+                                     "text/plain; charset=utf-8", "no-cache")
+
+@app.api_route("/api/youtube/subtitles/{video_id}/{fmt}", methods=["GET", "HEAD"])
+async def get_subtitles(video_id: str, fmt: str, http_request: Request, source: str = "auto"):
+    """
+    Subtitles as SRT, WebVTT or segment JSON, for native player tracks.
+
+    source=auto uses the formatted transcript once it is complete and the raw
+    subtitles until then; formatted or raw pick one. The first request for a
+    format and transcript version streams the file as it is generated and
+    stores it; later ones are served from the stored file (Range/304).
+    """
+    if fmt not in SUBTITLE_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown subtitle format: {fmt} (use {', '.join(SUBTITLE_MEDIA_TYPES)})")
+    if source not in ("auto", "formatted", "raw"):
+        raise HTTPException(status_code=400, detail="source must be auto, formatted or raw")
+    stored = formatted_segments.get(video_id)
+    cached = transcript_cache.get(video_id)
+    if source == "formatted" or (source == "auto" and stored):
+        if not stored:
+            raise HTTPException(status_code=404, detail="Formatted transcript not found")
+        source, version = "formatted", stored["version"]
+        title, duration = stored["title"], stored["duration"]
+        load_cues = lambda: cues_from_segments(get_formatted_segments(video_id)[0])
+    else:
+        json_data = (cached or {}).get("json_data")
+        if not json_data or not json_data[0].get("transcription"):
+            raise HTTPException(status_code=404, detail="No timed transcript cached for this video")
+        if "version" not in cached:
+            cached["version"] = content_hash(json.dumps(json_data[0]["transcription"], sort_keys=True))
+        source, version = "raw", cached["version"]
+        title, duration = json_data[0].get("title"), json_data[0].get("lengthInSeconds")
+        transcription = json_data[0]["transcription"]
+        load_cues = lambda: cues_from_transcription(transcription)
+
+    media_type = SUBTITLE_MEDIA_TYPES[fmt]
+    etag = strong_etag(video_id, fmt, source, version, SUBTITLE_EXPORT_VERSION)
+    key = (video_id, fmt, source)
+    export = subtitle_exports.get(key)
+    if export and export["version"] == version and formatted_store.exists(export["ref"]):
+        return conditional_file_response(http_request, formatted_store.path(export["ref"]), media_type, "no-cache", etag=etag)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(http_request, etag):
+        return Response(status_code=304, headers=headers)
+    if http_request.method == "HEAD":
+        return Response(media_type=media_type, headers=headers)
+
+    header = {"video_id": video_id, "source": source, "version": version, "title": title, "duration": duration}
+
+    def generate():
+        parts = []
+        for text in iter_subtitles(fmt, load_cues(), header):
+            data = text.encode("utf-8")
+            parts.append(data)
+            yield data
+        # Only a fully sent file is stored; a disconnect leaves the next request to generate it again
+        subtitle_exports[key] = {"version": version, "ref": formatted_store.put(b"".join(parts), f".{fmt}")}
+
+    return StreamingResponse(generate(), media_type=media_type, headers=headers)
+
+@app.get("/api/youtube/transcript-range/{video_id}")
+async def get_transcript_range(video_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                               timestamp: Optional[float] = None, before: float = DEFAULT_WINDOW_BEFORE, after: float = DEFAULT_WINDOW_AFTER):
+    """
+    Transcript segments for a time range: either start/end seconds, or a
+    window of before/after seconds around timestamp.
+    """
+    index = get_transcript_index(video_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="No timed transcript cached for this video")
+    if timestamp is not None:
+        start, end = max(0.0, timestamp - before), timestamp + after
+    elif start is None and end is None:
+        raise HTTPException(status_code=400, detail="Provide start/end or timestamp")
+    start = start or 0.0
+    end = index.duration if end is None else end
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    return {
+        "video_id": video_id,
+        "start": start,
+        "end": end,
+        "segments": index.range(start, end)
+    }
+
+def cache_transcript(video_id: str, transcript_data, json_data):
+    """Keep a fetched transcript for later requests; its title and length prefill the metadata cache"""
+    transcript_cache[video_id] = {
+        "transcript_data": transcript_data,
+        "json_data": json_data
+    }
+    video_metadata.update_from_transcript(video_id, json_data)
+
+async def fetch_video_metadata(video_id: str) -> Optional[str]:
+    """Title (and author/thumbnail) from YouTube oEmbed into the metadata cache; None on failure"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://www.youtube.com/oembed?url=http://www.youtube.com/watch?v={video_id}&format=json")
+        with timed_stage("title_fetch"):
+            async with httpx.AsyncClient() as client:
+                response = await client.get(f"{YOUTUBE_OEMBED_URL}?url=http://www.youtube.com/watch?v={video_id}&format=json")
             if response.status_code == 200:
                 data = response.json()
-                return data.get("title", f"YouTube Video ({video_id})")
-    except Exception:
-        pass
+                title = data.get("title")
+                video_metadata.update(video_id, "oembed", title=title, author_name=data.get("author_name"),
+                                      thumbnail_url=data.get("thumbnail_url"))
+                return title
+    except Exception as e:
+        logger.warning(f"oEmbed lookup failed for {video_id}: {e}")
+    return None
+
+async def refresh_video_metadata(video_id: str):
+    try:
+        await fetch_video_metadata(video_id)
+    finally:
+        metadata_refreshes.pop(video_id, None)
+
+async def get_video_title(video_id: str) -> str:
+    """
+    Get the title of a YouTube video, stale-while-revalidate.
+
+    A cached title (from oEmbed or a transcript provider) is returned at once;
+    once older than the TTL it is still returned while a background oEmbed
+    call refreshes it. Only uncached videos wait for oEmbed.
+    """
+    entry, stale = video_metadata.lookup(video_id)
+    if entry and entry.get("title"):
+        if stale and video_id not in metadata_refreshes:
+            metadata_refreshes[video_id] = asyncio.create_task(refresh_video_metadata(video_id))
+        return entry["title"]
     
-    return f"YouTube Video ({video_id})"
+    return await fetch_video_metadata(video_id) or placeholder_title(video_id)
 
 @app.get("/api/youtube/download-info")
-async def get_download_info(videoId: str):
+def get_download_info(videoId: str):
     """Get YouTube video download info"""
     try:
         # Try yt-dlp first (works better on DigitalOcean)
@@ -401,7 +1227,7 @@ async def get_download_info(videoId: str):
                 'audios': 'auto'
             }
             
-            response = requests.get(
+            response = rapidapi_get(
                 "https://youtube-media-downloader.p.rapidapi.com/v2/video/details",
                 params=params,
                 headers=headers
@@ -417,11 +1243,40 @@ async def get_download_info(videoId: str):
                 "title": title,
                 "downloadUrl": download_url
             }
+        except UpstreamUnavailable:
+            raise
         except Exception as e2:
             raise HTTPException(status_code=500, detail=str(e2))
 
+def get_query_transcript(video_id: str):
+    """(transcript, source) for answering questions: the AI-formatted one when ready, else the plain one"""
+    # First check if we have a formatted transcript
+    if video_id in formatting_status and formatting_status[video_id]["status"] == "completed":
+        logger.info(f"Using AI-formatted transcript with timestamps for query processing: {video_id}")
+        return formatted_transcript_text(video_id), "formatted"
+    
+    # Formatting under way: formatted prefix plus the raw remainder
+    hybrid = hybrid_transcript(video_id)
+    if hybrid:
+        logger.info(f"Using partially formatted transcript for query processing: {video_id}")
+        return hybrid, "partial"
+    
+    # Get transcript from global cache instead of downloading again
+    if video_id in transcript_cache:
+        logger.info(f"Using regular cached transcript data for query processing: {video_id}")
+        return transcript_cache[video_id]["transcript_data"], "plain"
+    
+    logger.info(f"Transcript not cached for video {video_id}, downloading...")
+    # Fallback: download if not in cache (shouldn't happen if get_youtube_info was called first)
+    with timed_stage("transcript_fetch"):
+        transcript_data, json_data = fetch_transcript(video_id)
+    
+    # Cache it for future use
+    cache_transcript(video_id, transcript_data, json_data)
+    return transcript_data, "plain"
+
 @app.post("/api/query/video")
-async def process_query(query_request: VideoQuery):
+def process_query(query_request: VideoQuery, http_request: Request):
     """Process a query about a YouTube video - either text-only or image-based"""
     try:
         video_id = query_request.video_id
@@ -439,97 +1294,201 @@ async def process_query(query_request: VideoQuery):
         
         url = f"https://www.youtube.com/watch?v={video_id}"
         
-        # First check if we have a formatted transcript
-        transcript_to_use = None
-        if video_id in formatting_status and formatting_status[video_id]["status"] == "completed":
-            logger.info(f"Using AI-formatted transcript with timestamps for query processing: {video_id}")
-            transcript_to_use = formatting_status[video_id]["formatted_transcript"]
-        
-        # If no formatted transcript, fall back to regular transcript
-        if not transcript_to_use:
-            # Get transcript from global cache instead of downloading again
-            if video_id in transcript_cache:
-                logger.info(f"Using regular cached transcript data for query processing: {video_id}")
-                transcript_to_use = transcript_cache[video_id]["transcript_data"]
-            else:
-                logger.info(f"Transcript not cached for video {video_id}, downloading...")
-                # Fallback: download if not in cache (shouldn't happen if get_youtube_info was called first)
-                transcript_data, _ = download_transcript_api(video_id)
-                # Use original transcript data directly
-                transcript_to_use = transcript_data
-                
-                # Cache it for future use
-                transcript_cache[video_id] = {
-                    "transcript_data": transcript_data,
-                    "json_data": _
-                }
+        transcript_to_use, _ = get_query_transcript(video_id)
         
         response = ""
+        used_keyframes = []
         
         if is_image_query:
             if timestamp is None:
                 raise HTTPException(status_code=400, detail="Timestamp is required for image queries")
             
-            # Get video path
-            if video_id in downloaded_videos and os.path.exists(downloaded_videos[video_id]):
-                video_path_local = downloaded_videos[video_id]
-            else:
-                # Check download status instead of downloading synchronously
-                if video_id in download_status:
-                    status = download_status[video_id]
-                    if status["status"] == "downloading":
-                        # Return a special response instead of raising an exception
-                        return {
-                            "response": "🎬 Something amazing is being loaded! The video is still downloading in the background. Please continue to chat with the video content in the meantime, and try frame-specific questions again in a moment!",
-                            "video_id": video_id,
-                            "timestamp": timestamp,
-                            "query_type": "downloading",
-                            "is_downloading": True
-                        }
-                    elif status["status"] == "failed":
-                        raise HTTPException(status_code=500, detail=f"Video download failed: {status['message']}")
-                else:
-                    # Start download and ask user to wait
-                    download_executor.submit(download_video_background, video_id, url)
-                    return {
-                         "response": "🎬 Something amazing is being loaded! Video download has started in the background. Please continue to chat with the video content in the meantime, and try frame-specific questions again in a moment!",
-                        "video_id": video_id,
-                        "timestamp": timestamp,
-                        "query_type": "downloading",
-                        "is_downloading": True
-                    }
-            
             # Extract frame using simple method (since youtube_frame_extractor might not exist)
             frame_filename = f"frame_{video_id}_{int(timestamp)}.jpg"
             frame_path = os.path.join(frames_path, frame_filename)
             
-            try:
-                # Use the grab_youtube_frame function from your utils
-                output_file, frame = grab_youtube_frame(video_path_local, timestamp, frame_path)
+            # Frames extracted before are reused from disk with their recorded signature, without decoding video
+            signature = frame_cache.frame_signature(video_id, frame_filename) if os.path.exists(frame_path) else None
+            if signature is None:
+                # Pin the video so quota eviction cannot delete it mid-extraction
+                with video_store.in_use(video_id):
+                    video_path_local = video_store.get(video_id)
+                    if video_path_local is None:
+                        # Check download status instead of downloading synchronously
+                        status = download_status.get(video_id)
+                        if status and status["status"] == "downloading":
+                            # Return a special response instead of raising an exception
+                            return {
+                                "response": "🎬 Something amazing is being loaded! The video is still downloading in the background. Please continue to chat with the video content in the meantime, and try frame-specific questions again in a moment!",
+                                "video_id": video_id,
+                                "timestamp": timestamp,
+                                "query_type": "downloading",
+                                "is_downloading": True
+                            }
+                        elif status and status["status"] == "failed":
+                            raise HTTPException(status_code=500, detail=f"Video download failed: {status['message']}")
+                        else:
+                            # Never downloaded, or evicted: start download and ask user to wait
+                            try:
+                                schedule_download(video_id, url, client_key(http_request), priority=DOWNLOAD_PRIORITY_WAITING)
+                            except QueueFull as e:
+                                raise HTTPException(
+                                    status_code=503,
+                                    detail="Server busy, video download could not be queued. Please try again shortly.",
+                                    headers={"Retry-After": str(e.retry_after)}
+                                )
+                            return {
+                                 "response": "🎬 Something amazing is being loaded! Video download has started in the background. Please continue to chat with the video content in the meantime, and try frame-specific questions again in a moment!",
+                                "video_id": video_id,
+                                "timestamp": timestamp,
+                                "query_type": "downloading",
+                                "is_downloading": True
+                            }
+                
+                    try:
+                        # Use the grab_youtube_frame function from your utils
+                        with timed_stage("frame_extraction"):
+                            output_file, frame = grab_youtube_frame(video_path_local, timestamp, frame_path)
+                    except Exception as e:
+                        raise HTTPException(status_code=500, detail=f"Frame extraction failed: {str(e)}")
                 if not output_file:
-                    raise Exception("Failed to extract frame")
+                    raise HTTPException(status_code=500, detail="Frame extraction failed: Failed to extract frame")
+                signature = frame_signature(frame)
+                frame_cache.add_frame(video_id, frame_filename, signature)
+            
+            try:
+                # Focus the model on what was said around the frame; whole transcript if untimed
+                index = get_transcript_index(video_id)
+                image_context = index.window_text(timestamp) if index else ""
+                context = image_context or transcript_to_use
                 
-                # Use the image-based query function with formatted transcript when available
-                response = vision_client.ask_with_image(query, frame_path, transcript_to_use)
+                # Near-identical frames (same slide) share answers (per transcript window) and a reusable description
+                response = frame_cache.answer(video_id, signature, query, context)
+                if response is None:
+                    description = frame_cache.description(video_id, signature)
+                    if description is None and frame_cache.answer_count(video_id, signature) >= 1:
+                        # Second distinct question about this picture: describe it once for all later ones
+                        with timed_stage("llm_frame_description"):
+                            description = vision_client.describe_frame(frame_path)
+                        if description.startswith("Error:"):
+                            description = None
+                        else:
+                            frame_cache.store_description(video_id, signature, description)
+                    if description is not None:
+                        with timed_stage("llm_text_query"):
+                            response = vision_client.ask_text_only(
+                                query, f"Video frame at {timestamp}s (description): {description}\n\n{context}")
+                    else:
+                        with timed_stage("llm_image_query"):
+                            response = vision_client.ask_with_image(query, frame_path, context)
+                    if not response.startswith("Error:"):
+                        frame_cache.store_answer(video_id, signature, query, context, response)
                 
+            except UpstreamUnavailable:
+                raise
             except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Frame extraction failed: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Frame query failed: {str(e)}")
             
         else:
             # Text-only query about the video content - use formatted transcript when available
-            response = vision_client.ask_text_only(query, transcript_to_use)
+            keyframe_index = get_keyframe_index(video_id) if query_request.include_keyframes else None
+            if keyframe_index:
+                # Precomputed scene thumbnails: near the timestamp if given, else across the video
+                if timestamp is not None:
+                    selected = keyframe_index.nearest(timestamp, KEYFRAMES_PER_QUERY // 2)
+                else:
+                    selected = keyframe_index.spread(KEYFRAMES_PER_QUERY)
+                used_keyframes = [kf["timestamp"] for kf in selected]
+                with timed_stage("llm_keyframe_query"):
+                    response = vision_client.ask_with_keyframes(
+                        query, [keyframe_index.path(kf) for kf in selected], transcript_to_use)
+            else:
+                with timed_stage("llm_text_query"):
+                    response = vision_client.ask_text_only(query, transcript_to_use)
         
-        return {
+        result = {
             "response": response,
             "video_id": video_id,
             "timestamp": timestamp,
             "query_type": "image" if is_image_query else "text"
         }
+        if used_keyframes:
+            result["keyframes"] = used_keyframes
+        return result
         
+    except (HTTPException, UpstreamUnavailable):
+        # Re-raise HTTP exceptions (400/503) with their own status
+        raise
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process query: {str(e)}")
 
+@app.post("/api/query/video/chat")
+def video_chat_query(chat_request: VideoChatRequest):
+    """
+    Multi-turn question answering about one video.
+
+    The transcript context is chosen on the first turn of a session and reused
+    unchanged (it is only swapped once, when the formatted transcript becomes
+    ready), so follow-ups share a cached prompt prefix. Earlier turns are
+    carried over compressed: the last few verbatim, older ones as digests.
+    """
+    try:
+        video_id = chat_request.video_id
+        chat = video_chats.get(chat_request.session_id, video_id) if chat_request.session_id else None
+        if chat is None:
+            transcript_to_use, source = get_query_transcript(video_id)
+            if not transcript_to_use:
+                raise HTTPException(status_code=404, detail="No transcript available for this video")
+            chat = video_chats.create(chat_request.session_id, video_id, transcript_to_use, source)
+        elif chat.context_source != "formatted":
+            transcript_to_use, source = get_query_transcript(video_id)
+            if source == "formatted":
+                chat.set_context(transcript_to_use, source)
+        
+        # Point the model at the moment being watched without touching the shared prefix
+        question = chat_request.query
+        if chat_request.timestamp is not None:
+            index = get_transcript_index(video_id)
+            window = index.window_text(chat_request.timestamp) if index else ""
+            if window:
+                question = f"(Watching at {chat_request.timestamp:.0f}s. Transcript around this moment:\n{window})\n\n{question}"
+        
+        vision_client = OpenAIVisionClient()
+        with chat.lock:
+            with timed_stage("llm_chat_query"):
+                response = vision_client.ask_in_conversation(question, chat.context, chat.history())
+            if not response.startswith("Error:"):
+                chat.add_turn(chat_request.query, question, response, chat_request.timestamp)
+        
+        return {
+            "response": response,
+            "session_id": chat.session_id,
+            "video_id": video_id,
+            "timestamp": chat_request.timestamp,
+            "turn": chat.turn_count,
+            "context_source": chat.context_source,
+            "query_type": "chat"
+        }
+    except (HTTPException, UpstreamUnavailable):
+        raise
+    except Exception as e:
+        logger.error(f"Error processing chat query: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to process query: {str(e)}")
+
+@app.get("/api/query/video/chat/{session_id}/{video_id}")
+async def get_video_chat(session_id: str, video_id: str):
+    chat = video_chats.get(session_id, video_id)
+    if chat is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return chat.snapshot()
+
+@app.delete("/api/query/video/chat/{session_id}/{video_id}")
+async def delete_video_chat(session_id: str, video_id: str):
+    if not video_chats.delete(session_id, video_id):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return {"deleted": session_id, "video_id": video_id}
+
 # Simplified translation endpoint (without dub_video dependency)
 @app.post("/api/query/translate")
 async def translate_youtube_video(request: TranslationRequest, background_tasks: BackgroundTasks):
@@ -566,8 +1525,117 @@ async def get_translation_status(job_id: str):
     
     return translation_jobs[job_id]
 
+def formatted_transcript_text(video_id: str) -> Optional[str]:
+    """Full formatted transcript text, decoded from its memory-mapped file into a new str on every call"""
+    stored = formatted_segments.get(video_id)
+    return formatted_store.read_text(stored["text_ref"]) if stored else None
+
+def formatted_prefix(video_id: str) -> list:
+    """Segments formatted so far by a running formatting job (a copy; the job keeps appending)"""
+    partial = partial_formatted.get(video_id)
+    return list(partial["segments"]) if partial else []
+
+def render_prefix(video_id: str, segments: list) -> Optional[str]:
+    partial = partial_formatted.get(video_id)
+    if not partial or not segments:
+        return None
+    header = [{"title": partial["title"], "lengthInSeconds": partial["duration"]}]
+    return ''.join(render_formatted_transcript(header, segments))
+
+def hybrid_transcript(video_id: str) -> Optional[str]:
+    """
+    Context while formatting runs: the formatted, timestamped segments done so
+    far, then the raw subtitles they do not cover yet under one time range.
+    """
+    partial = partial_formatted.get(video_id)
+    cached = transcript_cache.get(video_id)
+    if not partial or not partial["segments"] or not cached:
+        return None
+    segments = list(partial["segments"])
+    raw_offset = partial["raw_offset"]
+    blocks = [f"{format_time(seg['start'])} - {format_time(seg['end'])}\n{seg['text']}" for seg in segments]
+    json_data = cached.get("json_data") or [{}]
+    remaining = (json_data[0].get("transcription") or [])[raw_offset:]
+    if remaining:
+        end = max(item["start"] + item["dur"] for item in remaining)
+        blocks.append(f"{format_time(remaining[0]['start'])} - {format_time(end)} (not yet formatted)\n"
+                      + " ".join(item["subtitle"] for item in remaining))
+    return "\n\n".join(blocks)
+
+def get_formatted_segments(video_id: str):
+    """(segments, TranscriptIndex) of a formatted transcript, loaded from the store into a small LRU"""
+    with loaded_segments_lock:
+        loaded = loaded_segments.get(video_id)
+        if loaded is not None:
+            loaded_segments.move_to_end(video_id)
+            return loaded
+    # Parsed outside the lock; a concurrent load of the same video just does the work twice
+    segments = formatted_store.read_json(formatted_segments[video_id]["segments_ref"])
+    loaded = (segments, TranscriptIndex(segments))
+    with loaded_segments_lock:
+        loaded_segments[video_id] = loaded
+        while len(loaded_segments) > LOADED_SEGMENTS_MAX:
+            loaded_segments.popitem(last=False)
+    return loaded
+
+def get_transcript_index(video_id: str) -> Optional[TranscriptIndex]:
+    """Timestamp index over the cached transcript, built on first use; None if not cached or untimed"""
+    cached = transcript_cache.get(video_id)
+    if not cached:
+        return None
+    if "index" not in cached:
+        cached["index"] = TranscriptIndex.from_transcript_json(cached.get("json_data"))
+    return cached["index"]
+
+def get_quiz_transcript(video_id: str) -> str:
+    """Return the cached plain transcript for quiz generation, fetching it if needed"""
+    # Check if transcript is cached
+    if video_id not in transcript_cache:
+        # Try to get transcript if not cached
+        try:
+            with timed_stage("transcript_fetch"):
+                transcript_data, json_data = fetch_transcript(video_id)
+            cache_transcript(video_id, transcript_data, json_data)
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=404, 
+                detail=f"Could not retrieve transcript for video {video_id}: {str(e)}"
+            )
+    
+    # Get transcript from cache
+    transcript_data = transcript_cache[video_id]["transcript_data"]
+    
+    if not transcript_data or transcript_data.strip() == "":
+        raise HTTPException(
+            status_code=400, 
+            detail="No transcript available for this video"
+        )
+    return transcript_data
+
+def format_quiz_question(question: dict, index: int, difficulty: str, include_explanations: bool) -> dict:
+    """Shape a quiz item the way the frontend expects"""
+    formatted_question = {
+        "id": f"q{index+1}",  # Add missing ID field
+        "question": question.get("question", ""),
+        "options": question.get("options", []),
+        "answer": question.get("answer", ""),
+        "difficulty": difficulty  # Add difficulty to each question
+    }
+    
+    # Add explanation if available and requested
+    if include_explanations and "explanation" in question:
+        formatted_question["explanation"] = question["explanation"]
+    
+    return formatted_question
+
+def sse_event(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/api/quiz/generate")
-async def generate_quiz(request: QuizRequest):
+def generate_quiz(request: QuizRequest):
     """
     Generate a structured quiz JSON from a video's transcript using OpenAI GPT-4o.
 
@@ -583,63 +1651,36 @@ async def generate_quiz(request: QuizRequest):
         
         logger.info(f"Generating quiz for video {video_id} with {num_questions} questions")
         
-        # Check if transcript is cached
-        if video_id not in transcript_cache:
-            # Try to get transcript if not cached
-            try:
-                transcript_data, json_data = download_transcript_api(video_id)
-                transcript_cache[video_id] = {
-                    "transcript_data": transcript_data,
-                    "json_data": json_data
-                }
-            except Exception as e:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"Could not retrieve transcript for video {video_id}: {str(e)}"
-                )
+        transcript_data = get_quiz_transcript(video_id)
         
-        # Get transcript from cache
-        transcript_data = transcript_cache[video_id]["transcript_data"]
-        
-        if not transcript_data or transcript_data.strip() == "":
-            raise HTTPException(
-                status_code=400, 
-                detail="No transcript available for this video"
+        # Serve from the pre-generated question bank when it has enough questions
+        questions = quiz_bank.sample(video_id, difficulty, language, num_questions)
+        if questions is None:
+            # Bank missing or too small: generate a full bank now and sample from it
+            logger.info(f"Quiz bank miss for video {video_id} ({difficulty}, {language}), generating")
+            quiz_client = OpenAIQuizClient()
+            quiz_result = quiz_client.generate_quiz(
+                transcript=transcript_data,
+                num_questions=max(num_questions, quiz_bank.bank_size),
+                difficulty=difficulty,
+                include_explanations=True,  # Banked questions serve both modes
+                language=language
             )
-        
-        # Initialize quiz client (using OpenAI instead of Gemini)
-        quiz_client = OpenAIQuizClient()
-        
-        # Generate quiz
-        quiz_result = quiz_client.generate_quiz(
-            transcript=transcript_data,
-            num_questions=num_questions,
-            difficulty=difficulty,
-            include_explanations=include_explanations,
-            language=language
-        )
+            quiz_bank.add_questions(video_id, difficulty, language, quiz_result.get("quiz", []), min_capacity=num_questions)
+            questions = quiz_bank.sample(video_id, difficulty, language, num_questions)
+            if questions is None:
+                # Model returned fewer questions than requested; serve what we have
+                questions = quiz_bank.sample(video_id, difficulty, language, quiz_bank.size(video_id, difficulty, language)) or []
+
+        # Top up in the background before the bank runs dry
+        if quiz_bank.needs_refill(video_id, difficulty, language, num_questions):
+            schedule_quiz_bank_fill(video_id, transcript_data, difficulty, language)
 
-        print("quiz result: ", quiz_result)
-        
-        # Transform the response to match frontend expectations
-        questions = quiz_result.get('questions', [])
-        
         # Add IDs to questions and ensure proper format
-        formatted_questions = []
-        for i, question in enumerate(questions):
-            formatted_question = {
-                "id": f"q{i+1}",  # Add missing ID field
-                "question": question.get("question", ""),
-                "options": question.get("options", []),
-                "answer": question.get("answer", ""),
-                "difficulty": difficulty  # Add difficulty to each question
-            }
-            
-            # Add explanation if available and requested
-            if include_explanations and "explanation" in question:
-                formatted_question["explanation"] = question["explanation"]
-            
-            formatted_questions.append(formatted_question)
+        formatted_questions = [
+            format_quiz_question(question, i, difficulty, include_explanations)
+            for i, question in enumerate(questions)
+        ]
         
         logger.info(f"Quiz generation completed for video {video_id}")
         
@@ -655,7 +1696,7 @@ async def generate_quiz(request: QuizRequest):
         
         return response
         
-    except HTTPException:
+    except (HTTPException, UpstreamUnavailable):
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
@@ -666,31 +1707,125 @@ async def generate_quiz(request: QuizRequest):
         )
 
 
+@app.post("/api/quiz/stream")
+def stream_quiz(request: QuizRequest):
+    """
+    Stream quiz questions as Server-Sent Events while they are generated.
+
+    Emits one `question` event per item (same shape as /api/quiz/generate),
+    then a `done` event, or an `error` event if generation fails midway.
+    Banked questions are sent straight away; otherwise the model output is
+    parsed incrementally and the generated items are added to the bank.
+    """
+    video_id = request.video_id
+    num_questions = request.num_questions
+    difficulty = request.difficulty
+    include_explanations = request.include_explanations
+    language = request.language
+
+    logger.info(f"Streaming quiz for video {video_id} with {num_questions} questions")
+    transcript_data = get_quiz_transcript(video_id)
+    banked = quiz_bank.sample(video_id, difficulty, language, num_questions)
+
+    def event_stream():
+        count = 0
+        try:
+            if banked is not None:
+                questions = iter(banked)
+                generated = None
+            else:
+                quiz_client = OpenAIQuizClient()
+                questions = quiz_client.stream_quiz(
+                    transcript=transcript_data,
+                    num_questions=num_questions,
+                    difficulty=difficulty,
+                    include_explanations=True,  # Banked questions serve both modes
+                    language=language
+                )
+                generated = []
+
+            for question in questions:
+                if count >= num_questions:
+                    break
+                if generated is not None:
+                    generated.append(dict(question))
+                yield sse_event("question", format_quiz_question(question, count, difficulty, include_explanations))
+                count += 1
+
+            if generated:
+                quiz_bank.add_questions(video_id, difficulty, language, generated, min_capacity=num_questions)
+            if quiz_bank.needs_refill(video_id, difficulty, language, num_questions):
+                schedule_quiz_bank_fill(video_id, transcript_data, difficulty, language)
+
+            yield sse_event("done", {"video_id": video_id, "count": count})
+            logger.info(f"Quiz stream completed for video {video_id}")
+        except Exception as e:
+            logger.error(f"Error streaming quiz for video {video_id}: {str(e)}")
+            yield sse_event("error", {"video_id": video_id, "count": count, "detail": f"Failed to generate quiz: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # Optional: Serve video files directly
-@app.get("/api/videos/{video_id}")
-async def serve_video(video_id: str):
-    """Serve downloaded video files"""
-    if video_id in downloaded_videos:
-        video_path = downloaded_videos[video_id]
-        if os.path.exists(video_path):
-            return FileResponse(video_path, media_type="video/mp4")
+@app.api_route("/api/videos/{video_id}", methods=["GET", "HEAD"])
+async def serve_video(video_id: str, http_request: Request):
+    """Serve downloaded video files with byte ranges for seeking and conditional requests"""
+    video_path = video_store.get(video_id)
+    if video_path:
+        # A re-download after eviction gets a new ETag, so keep max-age modest
+        return conditional_file_response(http_request, video_path, "video/mp4", VIDEO_CACHE_CONTROL)
     
     raise HTTPException(status_code=404, detail="Video not found")
 
 # Optional: Serve frame images
-@app.get("/api/frames/{frame_filename}")
-async def serve_frame(frame_filename: str):
+@app.api_route("/api/frames/{frame_filename}", methods=["GET", "HEAD"])
+async def serve_frame(frame_filename: str, http_request: Request):
     """Serve extracted frame images"""
-    frame_path = os.path.join(frames_path, frame_filename)
+    frame_path = os.path.join(frames_path, os.path.basename(frame_filename))
     if os.path.exists(frame_path):
-        return FileResponse(frame_path, media_type="image/jpeg")
+        return conditional_file_response(http_request, frame_path, "image/jpeg", FRAME_CACHE_CONTROL)
     
     raise HTTPException(status_code=404, detail="Frame not found")
 
 
+@app.get("/api/youtube/keyframes/{video_id}")
+async def get_keyframes(video_id: str):
+    """Scene keyframes for a video with thumbnail URLs, or the extraction status"""
+    index = get_keyframe_index(video_id)
+    status = keyframe_status.get(video_id, {"status": "not_found", "message": "No keyframes for this video", "count": 0})
+    return {
+        "video_id": video_id,
+        **status,
+        "keyframes": [
+            {**kf, "url": f"/api/keyframes/{video_id}/{kf['thumbnail']}"}
+            for kf in (index.keyframes if index else [])
+        ]
+    }
+
+@app.api_route("/api/keyframes/{video_id}/{filename}", methods=["GET", "HEAD"])
+async def serve_keyframe(video_id: str, filename: str, http_request: Request):
+    """Serve a keyframe thumbnail"""
+    path = os.path.join(keyframes_path, os.path.basename(video_id), os.path.basename(filename))
+    if filename.endswith(".jpg") and os.path.exists(path):
+        return conditional_file_response(http_request, path, "image/jpeg", FRAME_CACHE_CONTROL)
+    raise HTTPException(status_code=404, detail="Keyframe not found")
+
+
+@app.get("/api/debug/transcript-providers")
+async def debug_transcript_providers():
+    """Per-provider transcript latency and success rate, in the order they will be tried"""
+    return {
+        "order": [provider.name for provider in transcript_fetcher.ranked_providers()],
+        "providers": transcript_fetcher.snapshot()
+    }
+
 #ADD THE DEBUG ENDPOINT HERE:
 @app.get("/api/debug/transcript-raw/{video_id}")
-async def debug_transcript_raw(video_id: str):
+def debug_transcript_raw(video_id: str):
     """Debug endpoint to see raw transcript API response"""
     try:
         print(f"DEBUG: Testing transcript API for video: {video_id}")
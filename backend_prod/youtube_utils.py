@@ -7,10 +7,56 @@ import cv2
 #import threading
 from youtube_transcript_api import YouTubeTranscriptApi
 import http.client
+import time
 import requests
 from fastapi import HTTPException
+from urllib.parse import urlsplit
+from metrics import observe_rapidapi
+from resilience import get_upstream, parse_retry_after
+from video_store import PARTIAL_DOWNLOAD_SUFFIX
 
 
+# Redirects every RapidAPI call to {base}/{host}/{path}, e.g. a local stand-in for benchmarks
+RAPIDAPI_BASE_URL = os.environ.get("RAPIDAPI_BASE_URL")
+# Per-host quota; calls beyond it fail fast with RateLimited instead of collecting 429s
+RAPIDAPI_RATE_PER_SEC = float(os.environ.get("RAPIDAPI_RATE_PER_SEC", "5"))
+RAPIDAPI_BURST = float(os.environ.get("RAPIDAPI_BURST", "10"))
+RAPIDAPI_TIMEOUT = float(os.environ.get("RAPIDAPI_TIMEOUT", "30"))
+
+
+def rapidapi_get(url, headers, **kwargs):
+    """
+    requests.get for a RapidAPI host, recording latency and status per host.
+
+    Calls go through the host's shared rate limiter and circuit breaker, so this
+    raises resilience.UpstreamUnavailable right away when the host is over quota
+    or failing. 429s and 5xx responses count as failures; other 4xx leave the
+    breaker unchanged. Blocks (rate limiting, the request itself), so call it
+    from worker threads, not the event loop.
+    """
+    host = headers.get('x-rapidapi-host', 'unknown')
+    upstream = get_upstream(f"rapidapi:{host}", RAPIDAPI_RATE_PER_SEC, RAPIDAPI_BURST)
+    upstream.admit()
+    if RAPIDAPI_BASE_URL:
+        parts = urlsplit(url)
+        url = f"{RAPIDAPI_BASE_URL.rstrip('/')}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+    kwargs.setdefault('timeout', RAPIDAPI_TIMEOUT)
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, headers=headers, **kwargs)
+    except Exception:
+        observe_rapidapi(host, time.perf_counter() - start)
+        upstream.record_failure()
+        raise
+    observe_rapidapi(host, time.perf_counter() - start, response.status_code)
+    if response.status_code == 429 or response.status_code >= 500:
+        upstream.record_failure(parse_retry_after(response.headers.get('Retry-After')))
+    elif response.status_code >= 400:
+        upstream.release()
+    else:
+        upstream.record_success()
+    return response
+
 
 def download_youtube_video(youtube_url) : #, output_path="videos", output_filename="video65", resolution="720"):
     try:
@@ -32,7 +78,7 @@ def download_youtube_video(youtube_url) : #, output_path="videos", output_filena
             'audios': 'auto'
         }
         
-        response = requests.get(
+        response = rapidapi_get(
             "https://youtube-media-downloader.p.rapidapi.com/v2/video/details",
             params=params,
             headers=headers
@@ -102,7 +148,7 @@ def download_url(youtube_url) : #, output_path="videos", output_filename="video6
             'audios': 'auto'
         }
         
-        response = requests.get(
+        response = rapidapi_get(
             "https://youtube-media-downloader.p.rapidapi.com/v2/video/details",
             params=params,
             headers=headers
@@ -188,7 +234,7 @@ def download_video(youtube_url, output_path=".", debug=False):
     try:
         # Get initial response
         log(f"Requesting video info for: {youtube_url}")
-        response = requests.get(url, headers=headers)
+        response = rapidapi_get(url, headers=headers)
         
         if response.status_code == 200:
             data = response.json()
@@ -246,7 +292,11 @@ def download_video(youtube_url, output_path=".", debug=False):
 
 
 def download_file_to_path(download_url, file_path, debug=False):
-    """Download file from URL to specific path"""
+    """
+    Download file from URL to specific path. The data goes to file_path + ".part"
+    and is renamed into place only when complete, so a crash mid-download never
+    leaves a truncated file_path behind.
+    """
     
     def log(msg):
         if debug:
@@ -258,11 +308,12 @@ def download_file_to_path(download_url, file_path, debug=False):
         'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     }
     
+    part_path = file_path + PARTIAL_DOWNLOAD_SUFFIX
     try:
         video_response = requests.get(download_url, stream=True, headers=headers, timeout=300)
         
         if video_response.status_code == 200:
-            with open(file_path, 'wb') as f:
+            with open(part_path, 'wb') as f:
                 downloaded = 0
                 for chunk in video_response.iter_content(chunk_size=1024*1024):
                     if chunk:
@@ -271,19 +322,21 @@ def download_file_to_path(download_url, file_path, debug=False):
                         if downloaded % (5*1024*1024) == 0:
                             log(f"Downloaded: {downloaded / (1024*1024):.1f} MB")
             
-            file_size = os.path.getsize(file_path)
+            file_size = os.path.getsize(part_path)
             if file_size > 1000:
+                os.replace(part_path, file_path)
                 print(f"✅ Downloaded: {file_path} ({file_size / (1024*1024):.1f} MB)")
                 return file_path
             else:
                 print(f"❌ File too small: {file_size} bytes")
-                os.remove(file_path)
         else:
             print(f"❌ Download failed: {video_response.status_code}")
     
     except Exception as e:
         print(f"❌ Download error: {e}")
     
+    if os.path.exists(part_path):
+        os.remove(part_path)
     return None
 
 
@@ -506,7 +559,7 @@ def download_transcript_api1(video_id):
 
     url = "https://youtube-transcript3.p.rapidapi.com/api/transcript"
     querystring = {"videoId": video_id}
-    response = requests.get(url, headers=headers, params=querystring)
+    response = rapidapi_get(url, headers=headers, params=querystring)
 
     if response.status_code == 200:
         transcript_data = response.json()
@@ -536,7 +589,7 @@ def download_transcript_api(video_id):
 
     url = "https://youtube-transcriptor.p.rapidapi.com/transcript"
     querystring = {"video_id":video_id,"lang":"en"}
-    response = requests.get(url, headers=headers, params=querystring)
+    response = rapidapi_get(url, headers=headers, params=querystring)
 
     if response.status_code == 200:
         transcript_data = response.json()
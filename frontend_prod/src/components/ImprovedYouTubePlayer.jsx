@@ -31,6 +31,7 @@ const ImprovedYoutubePlayer = ({ onNavigateToTranslate, onNavigateToHome }) => {
   const [systemMessages, setSystemMessages] = useState([]);
   
   const menuRef = useRef(null);
+  const transcriptVideoRef = useRef(null); // Video whose transcript is being waited for
 
   const handleYoutubeSubmit = async (e) => {
     e.preventDefault();
@@ -93,6 +94,10 @@ const ImprovedYoutubePlayer = ({ onNavigateToTranslate, onNavigateToHome }) => {
       
       if (response.data.transcript) {
         setTranscript(response.data.transcript);
+      } else if (response.data.transcript_status === 'fetching') {
+        // The player renders now; the transcript arrives from a background fetch
+        setTranscript("Loading transcript...");
+        waitForTranscript(videoId);
       } else {
         setTranscript("No transcript available for this video.");
       }
@@ -119,6 +124,38 @@ const ImprovedYoutubePlayer = ({ onNavigateToTranslate, onNavigateToHome }) => {
     }
   };
 
+  const waitForTranscript = async (videoId) => {
+    // Long-poll: the server holds each request until the transcript is ready or `wait` seconds pass
+    transcriptVideoRef.current = videoId;
+    for (let attempt = 0; attempt < 10; attempt++) {
+      if (transcriptVideoRef.current !== videoId) return; // Another video was loaded meanwhile
+      try {
+        const statusResponse = await axios.get(`${API_URL}/api/youtube/transcript-status/${videoId}`, {
+          params: { wait: 25 },
+          timeout: 35000,
+          headers: { 'ngrok-skip-browser-warning': 'true' }
+        });
+        const { status, transcript: fetchedTranscript, title } = statusResponse.data;
+        if (transcriptVideoRef.current !== videoId) return;
+        if (status === 'completed') {
+          setTranscript(fetchedTranscript);
+          setCurrentVideo(prev => prev.videoId === videoId && title ? { ...prev, title } : prev);
+          return;
+        }
+        if (status !== 'fetching') {
+          setTranscript("No transcript available for this video.");
+          return;
+        }
+      } catch (error) {
+        console.error("Error waiting for transcript:", error);
+        await new Promise(resolve => setTimeout(resolve, 2000));
+      }
+    }
+    if (transcriptVideoRef.current === videoId) {
+      setTranscript("No transcript available for this video.");
+    }
+  };
+
   const handlePlayerReady = (playerInstance) => {
     setPlayer(playerInstance);
   };
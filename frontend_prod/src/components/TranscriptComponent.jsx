@@ -131,6 +131,11 @@ const TranscriptComponent = ({
           });
         }
         
+        if (statusResponse.data.formatted_prefix) {
+          setTimestampedTranscript(statusResponse.data.formatted_prefix);
+          setShowTimestampedVersion(true);
+        }
+        
         const pollForCompletionWithProgress = async () => {
           let attempts = 0;
           const maxAttempts = 120;
@@ -153,6 +158,12 @@ const TranscriptComponent = ({
                 console.log(`📈 Progress updated: ${pollResponse.data.progress}% (${pollResponse.data.current_chunk}/${pollResponse.data.total_chunks})`);
               }
               
+              // Show the chunks formatted so far while the rest is still being processed
+              if (pollResponse.data.formatted_prefix) {
+                setTimestampedTranscript(pollResponse.data.formatted_prefix);
+                setShowTimestampedVersion(true);
+              }
+              
               if (pollResponse.data.status === 'completed') {
                 setTimestampedTranscript(pollResponse.data.formatted_transcript);
                 setShowTimestampedVersion(true);